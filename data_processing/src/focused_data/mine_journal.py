@@ -0,0 +1,84 @@
+"""Places mine journal.
+
+Append-only record of the progress of a Places mine, stored in a SQLite database in
+WAL mode so that every entry survives a crash or a kill as soon as it is committed.
+It records each finished circle (with its filtered results) and each finished OA.
+Pages are recorded as they arrive by the response cache (see "places_cache.py").
+
+A mine can be stopped at any point and restarted: finished OAs are skipped, the
+finished circles of a partially mined OA are read back from the journal and only the
+remaining circles are mined, their already fetched pages coming from the cache.
+
+Input datasets:
+- None
+
+Output datasets:
+- mine_journal.sqlite
+"""
+
+import sqlite3
+import json
+import time
+
+# Open (and create if necessary) a journal database. Connections must not be shared
+# across processes, each process opens its own. WAL mode does not work on network
+# filesystems, use the "DELETE" journal mode there.
+def open_journal(path, journal_mode="WAL"):
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS circles (
+            oa TEXT NOT NULL,
+            circle TEXT NOT NULL,
+            result_count INTEGER NOT NULL,
+            results TEXT NOT NULL,
+            finished_at REAL NOT NULL,
+            PRIMARY KEY (oa, circle)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS oas (
+            oa TEXT PRIMARY KEY,
+            place_count INTEGER NOT NULL,
+            finished_at REAL NOT NULL
+        )""")
+    conn.commit()
+    return conn
+
+# Return the key identifying a circle in the journal.
+def get_circle_key(location, radius):
+    return f"{location[0]:.7f},{location[1]:.7f},{radius}"
+
+# Return the filtered results and raw result count of a finished circle, or None
+# if the circle is not finished.
+def get_circle(conn, oa, circle):
+    row = conn.execute(
+        "SELECT results, result_count FROM circles WHERE oa = ? AND circle = ?",
+        (oa, circle)
+    ).fetchone()
+
+    if row is None:
+        return None
+    return (json.loads(row[0]), row[1])
+
+# Record a finished circle.
+def finish_circle(conn, oa, circle, results, result_count):
+    conn.execute(
+        "INSERT OR REPLACE INTO circles (oa, circle, result_count, results, finished_at) VALUES (?, ?, ?, ?, ?)",
+        (oa, circle, result_count, json.dumps(results), time.time())
+    )
+    conn.commit()
+
+# Record a finished OA. Its circles are no longer needed and are discarded.
+def finish_oa(conn, oa, place_count):
+    conn.execute(
+        "INSERT OR REPLACE INTO oas (oa, place_count, finished_at) VALUES (?, ?, ?)",
+        (oa, place_count, time.time())
+    )
+    conn.commit()
+    discard_circles(conn, oa)
+
+# Discard the finished circles of an OA, or of any other group of circles.
+def discard_circles(conn, oa):
+    conn.execute("DELETE FROM circles WHERE oa = ?", (oa,))
+    conn.commit()
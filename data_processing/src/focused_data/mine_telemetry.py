@@ -0,0 +1,156 @@
+"""Places mine telemetry.
+
+Low overhead instrumentation of a Places mine: counters and histograms kept in
+memory by each worker process, for metrics such as request latency, pages per
+circle, saturated circles, results kept and dropped by the field filter, duplicate
+places or requests and cost. Each process periodically writes a snapshot of its
+metrics to the run's directory and rewrites the aggregate of every snapshot as a
+JSON file and as a Prometheus text file, along with the derived rates.
+
+Input datasets:
+- None
+
+Output datasets:
+- mine_telemetry.json
+- mine_telemetry.prom
+"""
+
+import bisect
+import json
+import os
+import time
+from os import listdir
+
+# Histogram bucket upper bounds.
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]   # Seconds.
+PAGES_BUCKETS = [1, 2, 3]
+RATE_BUCKETS = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]
+
+# Create the telemetry state of a process. Snapshots of every process of a run are
+# written to "run_dir" and aggregated into "output_dir".
+def create_telemetry(run_dir, output_dir, flush_interval=10):
+    os.makedirs(run_dir, exist_ok=True)
+    return {
+        "run_dir": run_dir,
+        "output_dir": output_dir,
+        "pid": os.getpid(),
+        "started_at": time.time(),
+        "flush_interval": flush_interval,
+        "last_flush": time.monotonic(),
+        "counters": {},
+        "histograms": {}
+    }
+
+# Add a value to a counter.
+def count(telemetry, name, value=1):
+    telemetry["counters"][name] = telemetry["counters"].get(name, 0) + value
+
+# Record an observation in a histogram.
+def observe(telemetry, name, value, buckets):
+    histogram = telemetry["histograms"].get(name)
+    if histogram is None:
+        histogram = {"buckets": buckets, "counts": [0] * (len(buckets) + 1), "sum": 0, "count": 0}
+        telemetry["histograms"][name] = histogram
+
+    histogram["counts"][bisect.bisect_left(buckets, value)] += 1
+    histogram["sum"] = histogram["sum"] + value
+    histogram["count"] = histogram["count"] + 1
+
+# Write the snapshot of the process and rewrite the aggregate files, at most once
+# every "flush_interval" seconds unless forced.
+def flush(telemetry, force=False):
+    now = time.monotonic()
+    if not force and now - telemetry["last_flush"] < telemetry["flush_interval"]:
+        return
+    telemetry["last_flush"] = now
+
+    snapshot = {
+        "started_at": telemetry["started_at"],
+        "counters": telemetry["counters"],
+        "histograms": telemetry["histograms"]
+    }
+    write_file(telemetry["run_dir"], f"{telemetry['pid']}.json", json.dumps(snapshot))
+
+    aggregate = merge_snapshots(read_snapshots(telemetry["run_dir"]))
+    write_file(telemetry["output_dir"], "mine_telemetry.json", json.dumps(aggregate, indent=4))
+    write_file(telemetry["output_dir"], "mine_telemetry.prom", to_prometheus(aggregate))
+
+# Write a file atomically, so that readers never see a partial file. The temporary
+# name is unique to the process, as every process rewrites the aggregate files.
+def write_file(dir, name, content):
+    tmp = dir + name + f".{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+    os.replace(tmp, dir + name)
+
+# Return the snapshots of every process of a run.
+def read_snapshots(run_dir):
+    snapshots = []
+    for name in listdir(run_dir):
+        if name.endswith(".json"):
+            with open(run_dir + name) as f:
+                snapshots.append(json.load(f))
+    return snapshots
+
+# Sum the snapshots of every process and derive the rates of the run.
+def merge_snapshots(snapshots):
+    counters = {}
+    histograms = {}
+    started_at = min([x["started_at"] for x in snapshots])
+
+    for snapshot in snapshots:
+        for name, value in snapshot["counters"].items():
+            counters[name] = counters.get(name, 0) + value
+        for name, histogram in snapshot["histograms"].items():
+            if name not in histograms:
+                histograms[name] = {"buckets": histogram["buckets"], "counts": [0] * len(histogram["counts"]), "sum": 0, "count": 0}
+            merged = histograms[name]
+            merged["counts"] = [a + b for a, b in zip(merged["counts"], histogram["counts"])]
+            merged["sum"] = merged["sum"] + histogram["sum"]
+            merged["count"] = merged["count"] + histogram["count"]
+
+    elapsed = max(time.time() - started_at, 1e-9)
+    derived = {
+        "elapsed_seconds": elapsed,
+        "requests_per_second": counters.get("requests", 0) / elapsed,
+        "cost_per_second": counters.get("cost_dollars", 0) / elapsed,
+        "saturated_circle_fraction": ratio(counters.get("circles_saturated", 0), counters.get("circles", 0)),
+        "kept_result_fraction": ratio(counters.get("results_kept", 0), counters.get("results_kept", 0) + counters.get("results_dropped", 0)),
+        "duplicate_place_fraction": ratio(counters.get("places_duplicate", 0), counters.get("places_received", 0)),
+        "cache_hit_fraction": ratio(counters.get("cache_hits", 0), counters.get("cache_hits", 0) + counters.get("requests", 0))
+    }
+
+    return {
+        "processes": len(snapshots),
+        "counters": counters,
+        "histograms": histograms,
+        "derived": derived
+    }
+
+# Return a fraction, or 0 if the denominator is 0.
+def ratio(a, b):
+    if b == 0:
+        return 0
+    return a / b
+
+# Render an aggregate in the Prometheus text exposition format.
+def to_prometheus(aggregate):
+    lines = []
+    for name, value in sorted(aggregate["counters"].items()):
+        lines.append(f"# TYPE places_mine_{name}_total counter")
+        lines.append(f"places_mine_{name}_total {value}")
+
+    for name, histogram in sorted(aggregate["histograms"].items()):
+        lines.append(f"# TYPE places_mine_{name} histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(histogram["buckets"] + ["+Inf"], histogram["counts"]):
+            cumulative = cumulative + bucket_count
+            lines.append(f'places_mine_{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"places_mine_{name}_sum {histogram['sum']}")
+        lines.append(f"places_mine_{name}_count {histogram['count']}")
+
+    for name, value in sorted(aggregate["derived"].items()):
+        lines.append(f"# TYPE places_mine_{name} gauge")
+        lines.append(f"places_mine_{name} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,81 @@
+"""Place details side table.
+
+Turns the Place Details responses fetched by "run_place_details.py" into a compact
+columnar side table, joined to the places by "place_id". Each attribute is stored as
+a typed array in a compressed NumPy archive:
+- price_level: int8, -1 if unknown.
+- business_status: int8 code into BUSINESS_STATUSES, -1 if unknown.
+- weekly_open_hours: float32, NaN if unknown.
+- open_days: uint8 bitmask of the days with opening hours (bit 0 is Sunday).
+
+Input datasets:
+- None
+
+Output datasets:
+- place_details.npz
+"""
+
+import numpy as np
+import pandas as pd
+
+BUSINESS_STATUSES = ["OPERATIONAL", "CLOSED_TEMPORARILY", "CLOSED_PERMANENTLY"]
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+# Return the minute of the week of an opening hours period point.
+def get_week_minute(point):
+    return point["day"] * 24 * 60 + int(point["time"][:2]) * 60 + int(point["time"][2:])
+
+# Return the weekly open hours and the open days bitmask of an "opening_hours" field.
+def parse_opening_hours(opening_hours):
+    periods = opening_hours.get("periods")
+    if not periods:
+        return (np.nan, 0)
+
+    open_minutes = 0
+    open_days = 0
+    for period in periods:
+        open_days = open_days | (1 << period["open"]["day"])
+        # A period without a close time means always open.
+        if "close" not in period:
+            return (168.0, 0b1111111)
+        duration = get_week_minute(period["close"]) - get_week_minute(period["open"])
+        open_minutes = open_minutes + duration % MINUTES_PER_WEEK
+
+    return (open_minutes / 60, open_days)
+
+# Return the row of the side table of a details result.
+def parse_details(result):
+    price_level = result.get("price_level", -1)
+    business_status = result.get("business_status")
+    status_code = BUSINESS_STATUSES.index(business_status) if business_status in BUSINESS_STATUSES else -1
+    weekly_open_hours, open_days = parse_opening_hours(result.get("opening_hours", {}))
+    return (result["place_id"], price_level, status_code, weekly_open_hours, open_days)
+
+# Build the side table of a list of details results.
+def build_details_table(results):
+    rows = [parse_details(x) for x in results]
+    return {
+        "place_id": np.array([x[0] for x in rows], dtype=str),
+        "price_level": np.array([x[1] for x in rows], dtype=np.int8),
+        "business_status": np.array([x[2] for x in rows], dtype=np.int8),
+        "weekly_open_hours": np.array([x[3] for x in rows], dtype=np.float32),
+        "open_days": np.array([x[4] for x in rows], dtype=np.uint8)
+    }
+
+# Save a side table.
+def save_details_table(out_dir, table, name):
+    np.savez_compressed(out_dir + name, business_statuses=np.array(BUSINESS_STATUSES), **table)
+
+# Load a side table as a dataframe indexed by "place_id", ready to be joined.
+def load_details_table(path):
+    archive = np.load(path)
+    statuses = list(archive["business_statuses"]) + [None]
+
+    df = pd.DataFrame({
+        "price_level": archive["price_level"],
+        "business_status": [statuses[x] for x in archive["business_status"]],
+        "weekly_open_hours": archive["weekly_open_hours"],
+        "open_days": archive["open_days"]
+    }, index=pd.Index(archive["place_id"], name="place_id"))
+    df["price_level"] = df["price_level"].replace(-1, np.nan)
+    return df
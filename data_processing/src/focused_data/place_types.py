@@ -13,7 +13,7 @@ to assign the demographic distributions in each case.
 
 Input datasets:
 - Postcodes_OAs_classifications.csv
-- OA_places.json
+- OA_places_store
 - place_types.csv
 
 Output datasets:
@@ -24,8 +24,9 @@ Output datasets:
 """
 
 import src.common as common
+import src.place_vocabulary as place_vocabulary
 import pandas as pd
-import json
+import src.focused_data.places_store as places_store
 
 ################################################################################
 # Constants.
@@ -277,19 +278,12 @@ def get_oas():
 
 # Get place types present in the Westminster.
 def get_OA_place_types(possible_place_types, oas):
-    types = set()
-
-    f = open(DATA_DIR + "focused_data/places/" + "OA_places.json")
-    data = json.load(f)
-
-    for oa in oas:
-        for k in data[oa].keys():
-            types_list = data[oa][k]["types"]
-            
-            for t in types_list:
-                if t in possible_place_types:    
-                    types.add(t)
-                
+    columns = ["oa_codes", "oa_offsets", "type_offsets", "type_indices", "type_codes"]
+    store = places_store.load_store(DATA_DIR + "focused_data/places/" + "OA_places_store", columns)
+    vocabulary = place_vocabulary.load_vocabulary(DATA_DIR)
+    codes = place_vocabulary.translate(vocabulary, store["type_codes"])[places_store.get_type_codes_in_oas(store, oas)]
+    possible = place_vocabulary.get_mask(vocabulary, possible_place_types)
+    types = set(place_vocabulary.decode(vocabulary, codes[possible[codes]]))
     return types
 
 ###########################################################################
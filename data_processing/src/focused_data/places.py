@@ -1,22 +1,51 @@
 """Consolidate the mined places datasets.
 
 Consolidates the 783 independent OA places files from the Places API mine into a 
+single columnar places store (see "places_store.py"), and optionally the former
 single JSON file. It also filters the types of each place to discard unnecessary
-labels.
+labels, as a vectorized operation on the type codes of the place type vocabulary
+(see "place_vocabulary.py") of all the places of an OA at once. The OA files are
+parsed and filtered by a pool of processes, and each OA is streamed to the output as
+soon as it is ready.
+
+As the search areas of the mine are buffered, the same place is found in the files
+of several neighbouring OAs. If "deduplicate" is set, each unique place is instead
+assigned to the single OA whose polygon contains it, with a bulk point-in-polygon
+query against an STRtree of the OA polygons. Places found outside every OA polygon
+are discarded. This holds every unique place in memory until all the OAs are parsed,
+whereas otherwise only the OAs in flight are.
 
 Input datasets:
 - Postcodes_OAs_classifications.csv
-- 783 files stored in "raw_data/places"
+- place_types.csv
+- 783 files stored in "raw_data/places" (NDJSON shards or legacy JSON files)
+- OAs_geojson_wgs84.json (only if "deduplicate" is set)
 
 Output datasets:
-- OA_places.json
+- OA_places_store
+- OA_places.json (if "write_json" is set)
 """
 
 import src.common as common
+import src.place_vocabulary as place_vocabulary
 import pandas as pd
 import json
+import os
+import multiprocessing
+import time
+from functools import partial
+import numpy as np
+import shapely
+from shapely.geometry import shape
+import src.focused_data.places_shards as places_shards
+import src.focused_data.places_store as places_store
 
 DATA_DIR = ""
+processes = os.cpu_count()
+chunk_size = 8  # OAs handed to a process at once.
+write_json = False
+deduplicate = False     # Assign each unique place to the one OA containing it.
+polygons_file = "OAs_geojson_wgs84.json"
 
 # Exector method.
 def process_places(in_DATA_DIR):
@@ -33,29 +62,109 @@ def get_oas():
 
 # Place type class label filtering function to be applied to each place record.
 def filter_func(e):
-    filter_mask = ["route", "locality", "sublocality", "sublocality_level_1", "neighborhood", "political"]
-    if e in filter_mask:
-        return False
-    else:
-        return True
+    return e not in place_vocabulary.FILTERED_TYPES
 
 # Apply the filtering functionality to each OA and consolidate the results.
 def filter_places(oas):
-    # Save all OAs in the same file. Filter the [types] field
-    filtered_map = {}
-
-    for oa in oas:
-        oa_map = {}
-        f = open(DATA_DIR + "raw_data/places/" + f"{oa}_places.json")
-        data = json.load(f)
-        for k in data[oa].keys():
-            types_list = data[oa][k]["types"]
-            filtered_types_list = list(filter(filter_func, types_list)) 
-            if len(filtered_types_list) > 0: # or True == True:
-                data[oa][k]["types"] = filtered_types_list
-                oa_map[k] = data[oa][k]
-
-        filtered_map[oa] = oa_map
-    
-    output_map = json.dumps(filtered_map, indent=4)
-    common.save_json_to_file(DATA_DIR + "focused_data/places/", output_map, "OA_places.json")
+    vocabulary = place_vocabulary.load_vocabulary(DATA_DIR)
+
+    with multiprocessing.Pool(processes) as pool:
+        for oa, oa_map in save_places(iter_oa_places(pool, oas, vocabulary), vocabulary, True, write_json):
+            pass
+
+# Yield the filtered places of each OA in code order, as parsed by a pool of
+# processes, deduplicated if requested.
+def iter_oa_places(pool, oas, vocabulary):
+    filter_oa = partial(filter_oa_places, DATA_DIR + "raw_data/places/", vocabulary)
+    oa_maps = pool.imap(filter_oa, sorted(oas), chunk_size)
+    if deduplicate:
+        oa_maps = assign_places(oas, oa_maps)
+    yield from oa_maps
+
+# Write the places of each OA to the requested outputs, in a stable order, under a
+# temporary name, passing them through. The outputs are complete once every OA has
+# been passed through.
+def save_places(oa_maps, vocabulary, store, json_file):
+    out_dir = DATA_DIR + "focused_data/places/"
+    tmp_path = out_dir + "OA_places.json.tmp"
+    writer = places_store.create_writer(vocabulary, out_dir, "OA_places_store") if store else None
+
+    out = None
+    if json_file:
+        out = open(tmp_path, "w")
+        out.write("{\n")
+
+    first = True
+    for oa, oa_map in oa_maps:
+        if writer is not None:
+            places_store.add_oa(writer, oa, oa_map.values())
+        if out is not None:
+            out.write(("" if first else ",\n") + f"{json.dumps(oa)}: {json.dumps(oa_map)}")
+        first = False
+        yield (oa, oa_map)
+
+    if writer is not None:
+        places_store.write_store(writer)
+    if out is not None:
+        out.write("\n}\n")
+        out.close()
+        os.replace(tmp_path, out_dir + "OA_places.json")
+
+# Filter the [types] field of the places of an OA. The types of all the places are
+# encoded at once and the filtered labels are masked out of them.
+def filter_oa_places(places_dir, vocabulary, oa):
+    shard = places_shards.find_shard(places_dir, oa)
+    if shard is None:
+        raise FileNotFoundError(f"No places file for OA {oa} in {places_dir}")
+    places = list(places_shards.read_places(shard))
+    codes, offsets = place_vocabulary.encode_lists(vocabulary, [x["types"] for x in places])
+    kept = ~place_vocabulary.get_mask(vocabulary, place_vocabulary.FILTERED_TYPES)[codes]
+    kept_before = np.concatenate([[0], np.cumsum(kept)])
+    kept_counts = kept_before[offsets[1:]] - kept_before[offsets[:-1]]
+
+    oa_map = {}
+    for i in np.nonzero(kept_counts > 0)[0].tolist():
+        place = places[i]
+        place_codes = codes[offsets[i]:offsets[i + 1]]
+        place["types"] = place_vocabulary.decode(vocabulary, place_codes[kept[offsets[i]:offsets[i + 1]]])
+        oa_map[place["place_id"]] = place
+
+    return (oa, oa_map)
+
+# Return the polygon of each of the given OAs, in the order of the OAs.
+def get_oa_polygons(oas):
+    f = open(DATA_DIR + "focused_data/geodata/" + polygons_file)
+    features = json.load(f)["features"]
+    polygons = {x["properties"]["geo_code"]:shape(x["geometry"]) for x in features}
+    return [polygons[oa] for oa in oas]
+
+# Deduplicate the places of every OA and assign each to the OA whose polygon contains
+# it. All the points are queried at once against an STRtree of the polygons. A point
+# on the boundary of several OAs goes to the first of them in code order. Returns the
+# places of every OA, in code order.
+def assign_places(oas, oa_maps):
+    start = time.time()
+    oas = sorted(oas)
+    places = {}
+    copies = 0
+    for oa, oa_map in oa_maps:
+        copies = copies + len(oa_map)
+        for place_id, place in oa_map.items():
+            places.setdefault(place_id, place)
+
+    place_ids = list(places.keys())
+    lats = np.array([places[x]["geometry"]["location"]["lat"] for x in place_ids])
+    lngs = np.array([places[x]["geometry"]["location"]["lng"] for x in place_ids])
+    tree = shapely.STRtree(get_oa_polygons(oas))
+    point_indices, oa_indices = tree.query(shapely.points(lngs, lats), predicate="intersects")
+
+    order = np.lexsort((oa_indices, point_indices))
+    point_indices, first = np.unique(point_indices[order], return_index=True)
+    oa_indices = oa_indices[order][first]
+
+    assigned = {oa:{} for oa in oas}
+    for i, j in zip(point_indices.tolist(), oa_indices.tolist()):
+        assigned[oas[j]][place_ids[i]] = places[place_ids[i]]
+
+    print(f"Places: {copies} copies - {len(places)} unique - {len(places) - len(point_indices)} outside every OA - {round(time.time() - start, 2)}s")
+    return [(oa, assigned[oa]) for oa in oas]
@@ -0,0 +1,215 @@
+"""Places API response cache.
+
+Persists every Nearby Search response on disk so that no request is ever paid for
+twice. Responses are stored in a SQLite database keyed by the request that produced
+them: the circle location, its radius and the page index. Page tokens expire and are
+not part of the key, the page index within the circle is used instead.
+
+The cache makes mines resumable at the circle level and allows the raw places
+files to be rebuilt offline, e.g. after changing the fields or types kept.
+
+The same database records the result count of every cell mined by the adaptive
+search unit strategy. It acts as a density prior for the following mines. It also
+records how much the results of each circle changed when it was last refreshed, so
+that volatile circles can be refreshed more often. Place Details responses are
+cached by "place_id" in a table of their own.
+
+Input datasets:
+- None
+
+Output datasets:
+- places_responses.sqlite
+"""
+
+import sqlite3
+import json
+import time
+
+# Number of decimal places used to build location keys (around 1 cm).
+KEY_DPs = 7
+
+# Open (and create if necessary) a cache database. Connections must not be shared
+# across processes, each process opens its own. WAL mode does not work on network
+# filesystems, use the "DELETE" journal mode there.
+def open_cache(path, journal_mode="WAL"):
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            radius REAL NOT NULL,
+            page INTEGER NOT NULL,
+            response TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (lat, lng, radius, page)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cell_counts (
+            level INTEGER NOT NULL,
+            i INTEGER NOT NULL,
+            j INTEGER NOT NULL,
+            result_count INTEGER NOT NULL,
+            saturated INTEGER NOT NULL,
+            PRIMARY KEY (level, i, j)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS circle_changes (
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            radius REAL NOT NULL,
+            change_fraction REAL NOT NULL,
+            refreshed_at REAL NOT NULL,
+            PRIMARY KEY (lat, lng, radius)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS details (
+            place_id TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        )""")
+    conn.commit()
+    return conn
+
+# Return the normalized key of a request.
+def get_key(location, radius, page):
+    return (round(location[0], KEY_DPs), round(location[1], KEY_DPs), float(radius), page)
+
+# Return the cached response of a request or None if it was never fetched.
+def get_response(conn, location, radius, page):
+    row = conn.execute(
+        "SELECT response FROM responses WHERE lat = ? AND lng = ? AND radius = ? AND page = ?",
+        get_key(location, radius, page)
+    ).fetchone()
+
+    if row is None:
+        return None
+    return json.loads(row[0])
+
+# Store the response of a request, replacing any previous one.
+def put_response(conn, location, radius, page, response):
+    conn.execute(
+        "INSERT OR REPLACE INTO responses (lat, lng, radius, page, response, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+        get_key(location, radius, page) + (json.dumps(response), time.time())
+    )
+    conn.commit()
+
+# Remove every cached page of a circle.
+def delete_circle(conn, location, radius):
+    key = get_key(location, radius, 0)
+    conn.execute("DELETE FROM responses WHERE lat = ? AND lng = ? AND radius = ?", key[:3])
+    conn.commit()
+
+# Return the number of cached responses.
+def count_responses(conn):
+    return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+# Return whether a cell was saturated when last mined or None if it never was.
+def get_cell_saturated(conn, cell):
+    row = conn.execute(
+        "SELECT saturated FROM cell_counts WHERE level = ? AND i = ? AND j = ?",
+        (cell["level"], cell["i"], cell["j"])
+    ).fetchone()
+
+    if row is None:
+        return None
+    return row[0] == 1
+
+# Record the number of results returned by a cell and whether it was saturated.
+def put_cell_count(conn, cell, result_count, saturated):
+    conn.execute(
+        "INSERT OR REPLACE INTO cell_counts (level, i, j, result_count, saturated) VALUES (?, ?, ?, ?, ?)",
+        (cell["level"], cell["i"], cell["j"], result_count, int(saturated))
+    )
+    conn.commit()
+
+# Return whether the response of a request is cached, without parsing it.
+def has_response(conn, location, radius, page):
+    row = conn.execute(
+        "SELECT 1 FROM responses WHERE lat = ? AND lng = ? AND radius = ? AND page = ?",
+        get_key(location, radius, page)
+    ).fetchone()
+    return row is not None
+
+# Return the average number of pages of the cached circles of a radius, or None if
+# no circle of that radius was ever cached.
+def get_pages_per_circle(conn, radius):
+    row = conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT lat || ',' || lng) FROM responses WHERE radius = ?",
+        (float(radius),)
+    ).fetchone()
+
+    if row[1] == 0:
+        return None
+    return row[0] / row[1]
+
+# Return the number of results returned by a cell when last mined or None if it
+# never was.
+def get_cell_count(conn, cell):
+    row = conn.execute(
+        "SELECT result_count FROM cell_counts WHERE level = ? AND i = ? AND j = ?",
+        (cell["level"], cell["i"], cell["j"])
+    ).fetchone()
+
+    if row is None:
+        return None
+    return row[0]
+
+# Return when the first page of a circle was fetched or None if it never was.
+def get_fetched_at(conn, location, radius):
+    row = conn.execute(
+        "SELECT fetched_at FROM responses WHERE lat = ? AND lng = ? AND radius = ? AND page = ?",
+        get_key(location, radius, 0)
+    ).fetchone()
+
+    if row is None:
+        return None
+    return row[0]
+
+# Remove the cached pages of a circle after the given one, left behind when a
+# refreshed circle has fewer pages than before.
+def delete_pages_after(conn, location, radius, page):
+    key = get_key(location, radius, page)
+    conn.execute("DELETE FROM responses WHERE lat = ? AND lng = ? AND radius = ? AND page > ?", key)
+    conn.commit()
+
+# Return the fraction of the results of a circle that changed when it was last
+# refreshed, or None if it never was.
+def get_circle_change(conn, location, radius):
+    row = conn.execute(
+        "SELECT change_fraction FROM circle_changes WHERE lat = ? AND lng = ? AND radius = ?",
+        get_key(location, radius, 0)[:3]
+    ).fetchone()
+
+    if row is None:
+        return None
+    return row[0]
+
+# Record the fraction of the results of a circle that changed when refreshed.
+def put_circle_change(conn, location, radius, change_fraction):
+    conn.execute(
+        "INSERT OR REPLACE INTO circle_changes (lat, lng, radius, change_fraction, refreshed_at) VALUES (?, ?, ?, ?, ?)",
+        get_key(location, radius, 0)[:3] + (change_fraction, time.time())
+    )
+    conn.commit()
+
+# Return the set of place ids whose details are cached.
+def get_cached_detail_ids(conn):
+    return set([row[0] for row in conn.execute("SELECT place_id FROM details")])
+
+# Return the cached details responses of the given place ids, if any.
+def get_details(conn, place_ids):
+    responses = []
+    for place_id in place_ids:
+        row = conn.execute("SELECT response FROM details WHERE place_id = ?", (place_id,)).fetchone()
+        if row is not None:
+            responses.append(json.loads(row[0]))
+    return responses
+
+# Store the details response of a place, replacing any previous one.
+def put_details(conn, place_id, response):
+    conn.execute(
+        "INSERT OR REPLACE INTO details (place_id, response, fetched_at) VALUES (?, ?, ?)",
+        (place_id, json.dumps(response), time.time())
+    )
+    conn.commit()
@@ -0,0 +1,295 @@
+"""Places API emulator.
+
+Local stand-in for the Nearby Search and Place Details endpoints of the Places API.
+It allows changes to "run_scrape_places.py" and "run_place_details.py" to be
+benchmarked and regression tested offline, for free and reproducibly. Point them at
+it by setting "emulator_url" in those scripts.
+
+The emulated places are read from the mined places files, or generated at random
+within a bounding box. A request returns the places within its radius, nearest first,
+in pages of 20 results and at most 3 pages, like the real API. The emulator also
+reproduces the behaviour the mine has to cope with:
+- A "next_page_token" is only valid "page_token_delay" seconds after it is issued
+and expires after "page_token_ttl" seconds. Both cases answer INVALID_REQUEST.
+- Every response is delayed by a latency drawn from a lognormal distribution.
+- Place Details are generated at random for every place, but always the same for a
+given "place_id", unless the place record already holds them.
+- Requests beyond "quota_queries_per_second" (a token bucket), and a random fraction
+"error_rate" of all requests, answer OVER_QUERY_LIMIT.
+
+Input datasets:
+- Files stored in "raw_data/places" (unless synthetic places are used)
+
+Output datasets:
+- None
+"""
+
+import sys
+import os
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(PROJECT_ROOT)
+from os import listdir
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import numpy as np
+import src.common as common
+import src.focused_data.places_shards as places_shards
+
+################################################################################
+# Globals.
+################################################################################
+
+INPUT_DATA_DIR = common.CWD + "/data/raw_data/" + "places/"
+NEARBY_SEARCH_PATH = "/maps/api/place/nearbysearch/json"
+PLACE_DETAILS_PATH = "/maps/api/place/details/json"
+host = "localhost"
+port = 8765
+
+page_size = 20
+max_pages = 3
+page_token_delay = 2        # Seconds before a "next_page_token" becomes valid.
+page_token_ttl = 300        # Seconds before a "next_page_token" expires.
+latency_median = 0.3        # Seconds.
+latency_sigma = 0.5         # Spread of the lognormal latency distribution.
+quota_queries_per_second = 50
+error_rate = 0              # Fraction of requests answered OVER_QUERY_LIMIT at random.
+
+synthetic_places = 0        # Number of random places served instead of the mined ones.
+synthetic_bounds = {"lat_min": 51.484, "lat_max": 51.540, "lng_min": -0.216, "lng_max": -0.111}
+seed = 0
+
+METERS_PER_DEGREE = 111320
+
+################################################################################
+# Functions.
+################################################################################
+
+# Executer method. Serves until interrupted.
+def run_emulator():
+    emulator = create_emulator(get_places())
+    server = ThreadingHTTPServer((host, port), EmulatorHandler)
+    server.emulator = emulator
+    print(f"Emulating the Places API with {len(emulator['places'])} places on http://{host}:{port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    print(get_stats(emulator))
+
+# Starts the emulator in a background thread, e.g. from a benchmark script. Returns
+# the server, to be passed to "stop_emulator".
+def start_emulator(places=None):
+    if places is None:
+        places = get_places()
+    server = ThreadingHTTPServer((host, port), EmulatorHandler)
+    server.emulator = create_emulator(places)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Stops an emulator started with "start_emulator" and returns its statistics.
+def stop_emulator(server):
+    server.shutdown()
+    server.server_close()
+    return get_stats(server.emulator)
+
+# Return the places to serve: synthetic ones if requested, the mined ones otherwise.
+def get_places():
+    if synthetic_places > 0:
+        return generate_places(synthetic_places, synthetic_bounds, random.Random(seed))
+    return load_places(INPUT_DATA_DIR)
+
+# Read every mined place once, whatever the number of OAs it was found in.
+def load_places(dir):
+    places = {}
+    for f in sorted(listdir(dir)):
+        if f.endswith(places_shards.SUFFIXES):
+            for place in places_shards.read_places(dir + f):
+                places[place["place_id"]] = place
+    return list(places.values())
+
+# Generate random places, uniformly distributed within the bounds.
+def generate_places(n, bounds, rng):
+    types = ["restaurant", "cafe", "bar", "store", "clothing_store", "bank", "pharmacy", "gym", "school", "lodging"]
+    places = []
+    for i in range(n):
+        places.append({
+            "geometry": {"location": {
+                "lat": rng.uniform(bounds["lat_min"], bounds["lat_max"]),
+                "lng": rng.uniform(bounds["lng_min"], bounds["lng_max"])
+            }},
+            "name": f"Synthetic place {i}",
+            "place_id": f"synthetic_{i}",
+            "types": [rng.choice(types), "point_of_interest", "establishment"],
+            "rating": round(rng.uniform(1, 5), 1),
+            "user_ratings_total": rng.randint(0, 2000)
+        })
+    return places
+
+# Create an emulator state.
+def create_emulator(places):
+    return {
+        "places": places,
+        "by_id": {x["place_id"]:x for x in places},
+        "lats": np.array([x["geometry"]["location"]["lat"] for x in places]),
+        "lngs": np.array([x["geometry"]["location"]["lng"] for x in places]),
+        "tokens": {},   # Page token -> (remaining results, valid from, expires at), in issue order.
+        "token_sequence": itertools.count(),
+        "random": random.Random(seed),
+        "bucket": quota_queries_per_second,
+        "last_refill": time.monotonic(),
+        "lock": threading.Lock(),
+        "stats": {"requests": 0, "OK": 0, "ZERO_RESULTS": 0, "INVALID_REQUEST": 0, "NOT_FOUND": 0, "OVER_QUERY_LIMIT": 0}
+    }
+
+# Return the places within the radius of a location, nearest first, up to the
+# number of results the API returns for a single search.
+def search(emulator, lat, lng, radius):
+    if len(emulator["places"]) == 0:
+        return []
+    dlat = (emulator["lats"] - lat) * METERS_PER_DEGREE
+    dlng = (emulator["lngs"] - lng) * METERS_PER_DEGREE * math.cos(math.radians(lat))
+    distances = np.sqrt(dlat ** 2 + dlng ** 2)
+    inside = np.nonzero(distances <= radius)[0]
+    nearest = inside[np.argsort(distances[inside], kind="stable")][:page_size * max_pages]
+    return [emulator["places"][i] for i in nearest]
+
+# Take a token from the quota bucket. Returns False if the quota is exceeded.
+def take_quota(emulator):
+    now = time.monotonic()
+    elapsed = now - emulator["last_refill"]
+    emulator["bucket"] = min(quota_queries_per_second, emulator["bucket"] + elapsed * quota_queries_per_second)
+    emulator["last_refill"] = now
+
+    if emulator["bucket"] < 1:
+        return False
+    emulator["bucket"] = emulator["bucket"] - 1
+    return True
+
+# Forget the expired page tokens. Tokens expire in the order they are issued, so only
+# the oldest ones are visited.
+def purge_tokens(emulator, now):
+    tokens = emulator["tokens"]
+    while len(tokens) > 0:
+        oldest = next(iter(tokens))
+        if tokens[oldest][2] >= now:
+            return
+        del tokens[oldest]
+
+# Answer a Nearby Search request. Returns the response and its latency.
+def nearby_search(emulator, params):
+    with emulator["lock"]:
+        emulator["stats"]["requests"] = emulator["stats"]["requests"] + 1
+        latency = emulator["random"].lognormvariate(math.log(latency_median), latency_sigma)
+
+        if not take_quota(emulator) or emulator["random"].random() < error_rate:
+            return (get_response(emulator, "OVER_QUERY_LIMIT"), latency)
+
+        now = time.monotonic()
+        purge_tokens(emulator, now)
+
+        if "pagetoken" in params:
+            token = emulator["tokens"].get(params["pagetoken"][0])
+            if token is None or now < token[1] or now > token[2]:
+                return (get_response(emulator, "INVALID_REQUEST"), latency)
+            results = token[0]
+        elif "location" in params and "radius" in params:
+            lat, lng = [float(x) for x in params["location"][0].split(",")]
+            results = search(emulator, lat, lng, float(params["radius"][0]))
+        else:
+            return (get_response(emulator, "INVALID_REQUEST"), latency)
+
+        if len(results) == 0:
+            return (get_response(emulator, "ZERO_RESULTS"), latency)
+
+        response = get_response(emulator, "OK", results[:page_size])
+        if len(results) > page_size:
+            token = f"emulated_{next(emulator['token_sequence'])}"
+            emulator["tokens"][token] = (results[page_size:], now + page_token_delay, now + page_token_ttl)
+            response["next_page_token"] = token
+        return (response, latency)
+
+# Answer a Place Details request. Returns the response and its latency.
+def place_details(emulator, params):
+    with emulator["lock"]:
+        emulator["stats"]["requests"] = emulator["stats"]["requests"] + 1
+        latency = emulator["random"].lognormvariate(math.log(latency_median), latency_sigma)
+
+        if not take_quota(emulator) or emulator["random"].random() < error_rate:
+            return (get_response(emulator, "OVER_QUERY_LIMIT"), latency)
+
+        if "place_id" not in params:
+            return (get_response(emulator, "INVALID_REQUEST"), latency)
+        place = emulator["by_id"].get(params["place_id"][0])
+        if place is None:
+            return (get_response(emulator, "NOT_FOUND"), latency)
+
+        response = get_response(emulator, "OK")
+        response.pop("results")
+        response["result"] = generate_details(place)
+        return (response, latency)
+
+# Generate the details of a place, always the same for a given "place_id".
+def generate_details(place):
+    rng = random.Random(f"{seed}-{place['place_id']}")
+    details = {
+        "place_id": place["place_id"],
+        "business_status": rng.choices(["OPERATIONAL", "CLOSED_TEMPORARILY", "CLOSED_PERMANENTLY"], [0.9, 0.05, 0.05])[0]
+    }
+    if rng.random() < 0.6:
+        details["price_level"] = rng.randint(0, 4)
+    if rng.random() < 0.8:
+        opening, closing = rng.randint(6, 11), rng.randint(17, 23)
+        details["opening_hours"] = {"periods": [
+            {"open": {"day": day, "time": f"{opening:02d}00"}, "close": {"day": day, "time": f"{closing:02d}00"}} for day in range(7) if rng.random() < 0.9
+        ]}
+
+    for f in ["business_status", "price_level", "opening_hours"]:
+        if f in place:
+            details[f] = place[f]
+    return details
+
+# Build a response and count its status.
+def get_response(emulator, status, results=[]):
+    emulator["stats"][status] = emulator["stats"][status] + 1
+    return {"html_attributions": [], "results": results, "status": status}
+
+# Return the request statistics of an emulator.
+def get_stats(emulator):
+    with emulator["lock"]:
+        return dict(emulator["stats"])
+
+# HTTP handler serving the Nearby Search endpoint.
+class EmulatorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == NEARBY_SEARCH_PATH:
+            response, latency = nearby_search(self.server.emulator, parse_qs(url.query))
+        elif url.path == PLACE_DETAILS_PATH:
+            response, latency = place_details(self.server.emulator, parse_qs(url.query))
+        else:
+            self.send_error(404)
+            return
+
+        time.sleep(latency)
+
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Script executer.
+if __name__ == "__main__":
+    run_emulator()
@@ -0,0 +1,166 @@
+"""Places shards.
+
+Append-only NDJSON files holding the places mined for an OA, one place record per
+line. Records are streamed to the shard as soon as each circle is mined and repeated
+places are dropped by "place_id", so the memory used by a mine stays flat whatever
+the size of the OAs. Shards can optionally be gzip compressed.
+
+A shard is written under a temporary name, unique to the machine and process, and
+only renamed once its OA is finished, so a killed mine never leaves a partial shard
+behind and two workers never write to the same file. The temporary files left by a
+killed mine are deleted when the OA's shard is opened again: those of a dead process
+of this machine straight away, and those of other machines once they have not been
+written for "stale_seconds", as their process may still be alive. The readers also
+accept the legacy format (a single JSON document per OA) and yield the records one
+by one.
+
+Input datasets:
+- None
+
+Output datasets:
+- {oa}_places.ndjson (or {oa}_places.ndjson.gz)
+"""
+
+import glob
+import gzip
+import json
+import os
+import socket
+import time
+
+SHARD_SUFFIX = "_places.ndjson"
+COMPRESSED_SHARD_SUFFIX = "_places.ndjson.gz"
+LEGACY_SUFFIX = "_places.json"
+SUFFIXES = (SHARD_SUFFIX, COMPRESSED_SHARD_SUFFIX, LEGACY_SUFFIX)
+stale_seconds = 300     # Age of an abandoned temporary file of another machine.
+
+# Open a new shard for an OA, deleting any unfinished shard left by a stopped mine in
+# either format.
+def open_shard(dir, oa, compress=False):
+    remove_temporary_files(dir + oa + (SHARD_SUFFIX if compress else COMPRESSED_SHARD_SUFFIX))
+    return open_path(dir + oa + (COMPRESSED_SHARD_SUFFIX if compress else SHARD_SUFFIX), oa)
+
+# Open a new shard at the given path, deleting any unfinished shard left at that path
+# by a stopped mine. Compressed if the path ends in ".gz".
+def open_path(path, oa):
+    remove_temporary_files(path)
+    tmp = path + f".{socket.gethostname()}.{os.getpid()}.tmp"
+    if path.endswith(".gz"):
+        f = gzip.open(tmp, "wt", encoding="utf-8")
+    else:
+        f = open(tmp, "w", encoding="utf-8")
+
+    return {
+        "oa": oa,
+        "path": path,
+        "tmp": tmp,
+        "file": f,
+        "seen": set(),
+        "received": 0
+    }
+
+# Delete the temporary files of the abandoned shards of a path.
+def remove_temporary_files(path):
+    for tmp in glob.glob(glob.escape(path) + ".*.tmp"):
+        if is_abandoned(path, tmp):
+            os.remove(tmp)
+
+# Return whether the temporary file of a shard was abandoned: written by this process
+# or by a dead process of this machine, or not written for "stale_seconds".
+def is_abandoned(path, tmp):
+    hostname, pid = tmp[len(path) + 1:-len(".tmp")].rsplit(".", 1)
+    if hostname == socket.gethostname() and pid.isdigit():
+        return int(pid) == os.getpid() or not is_process_alive(int(pid))
+    return time.time() - os.path.getmtime(tmp) > stale_seconds
+
+# Return whether a process of this machine is running.
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Append the places never written to the shard before. Returns the number written.
+def write_places(shard, places):
+    written = 0
+    for place in places:
+        if place:
+            shard["received"] = shard["received"] + 1
+        if place and place["place_id"] not in shard["seen"]:
+            shard["seen"].add(place["place_id"])
+            shard["file"].write(json.dumps(place) + "\n")
+            written = written + 1
+    return written
+
+# Finish a shard and publish it under its final name. Returns its number of places.
+def close_shard(shard):
+    shard["file"].close()
+    os.replace(shard["tmp"], shard["path"])
+    return len(shard["seen"])
+
+# Abandon an unfinished shard, deleting its temporary file.
+def discard_shard(shard):
+    shard["file"].close()
+    if os.path.isfile(shard["tmp"]):
+        os.remove(shard["tmp"])
+
+# Return the path of the places file of an OA, in any format, or None if the OA
+# was never mined.
+def find_shard(dir, oa):
+    for suffix in SUFFIXES:
+        if os.path.isfile(dir + oa + suffix):
+            return dir + oa + suffix
+    return None
+
+# Yield the place records of a places file one by one.
+def read_places(path):
+    if path.endswith(LEGACY_SUFFIX):
+        with open(path) as f:
+            data = json.load(f)
+        for oa in data.keys():
+            for place in data[oa].values():
+                yield place
+        return
+
+    if path.endswith(".gz"):
+        f = gzip.open(path, "rt", encoding="utf-8")
+    else:
+        f = open(path, encoding="utf-8")
+
+    with f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+# Open a part shard, holding the places of a share of an OA's circles. Part shards
+# are never mistaken for the places file of a finished OA.
+def open_part(dir, oa, part):
+    return open_path(dir + f"{oa}.part{part}.ndjson", oa)
+
+# Merge the finished part shards of an OA into its shard, dropping repeated places,
+# and delete them. Returns the number of places of the OA. Merging again an OA that
+# was already merged only deletes the part shards left behind.
+def merge_parts(dir, oa, parts, compress=False):
+    path = find_shard(dir, oa)
+    if path is not None:
+        place_count = len(set([x["place_id"] for x in read_places(path)]))
+    else:
+        shard = open_shard(dir, oa, compress)
+        for part in range(parts):
+            write_places(shard, read_places(dir + f"{oa}.part{part}.ndjson"))
+        place_count = close_shard(shard)
+
+    for part in range(parts):
+        if os.path.isfile(dir + f"{oa}.part{part}.ndjson"):
+            os.remove(dir + f"{oa}.part{part}.ndjson")
+    return place_count
+
+# Delete the places files of an OA in any format other than the given one, e.g. the
+# legacy file of an OA whose places were rewritten as a shard.
+def remove_other_formats(dir, oa, path):
+    for suffix in SUFFIXES:
+        if dir + oa + suffix != path and os.path.isfile(dir + oa + suffix):
+            os.remove(dir + oa + suffix)
@@ -0,0 +1,197 @@
+"""Columnar places store.
+
+Binary, columnar counterpart of OA_places.json. The store is a directory holding one
+".npy" file per column, so that each column can be memory-mapped and only the
+columns needed are ever read. Places are sorted by OA, and the type lists are
+encoded in CSR form (offsets into a flat array of type codes).
+
+Columns:
+- place_id: fixed-width bytes.
+- oa_index: int32 index into "oa_codes".
+- lat, lng: float64.
+- rating: float32, NaN if unknown.
+- user_ratings_total: int32, -1 if unknown.
+- type_offsets: int64, the types of place i are type_indices[type_offsets[i]:type_offsets[i+1]].
+- type_indices: int32 indexes into "type_codes". The writer is seeded with the place
+type vocabulary (see "place_vocabulary.py"), so these are its codes.
+- oa_offsets: int64, the places of OA j are the rows oa_offsets[j]:oa_offsets[j+1].
+- oa_codes, type_codes: the vocabularies.
+
+Input datasets:
+- None
+
+Output datasets:
+- OA_places_store (directory)
+"""
+
+import os
+import shutil
+from array import array
+import numpy as np
+
+# Numeric columns of the store and their array type codes.
+COLUMN_TYPES = {
+    "oa_index": "i",
+    "lat": "d",
+    "lng": "d",
+    "rating": "f",
+    "user_ratings_total": "i",
+    "type_offsets": "q",
+    "type_indices": "i",
+    "oa_offsets": "q"
+}
+
+# Create a store writer, with the type codes of a vocabulary, writing to a temporary
+# directory next to the store. OAs are added one at a time, with all of their places,
+# and each is flushed to raw column files straight away, so only one OA is ever held
+# in memory.
+def create_writer(vocabulary, out_dir, name):
+    tmp_dir = out_dir + name + ".tmp/"
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    writer = {
+        "out_dir": out_dir,
+        "name": name,
+        "tmp_dir": tmp_dir,
+        "files": {c:open(tmp_dir + c + ".bin", "wb") for c in list(COLUMN_TYPES.keys()) + ["place_id"]},
+        "places": 0,
+        "types": 0,
+        "place_id_width": 1,
+        "oa_codes": [],
+        "type_codes": dict(vocabulary["codes"])     # Type -> index.
+    }
+    array("q", [0]).tofile(writer["files"]["type_offsets"])
+    array("q", [0]).tofile(writer["files"]["oa_offsets"])
+    return writer
+
+# Add an OA and its places to a store writer, appending them to the column files.
+def add_oa(writer, oa, places):
+    oa_index = len(writer["oa_codes"])
+    writer["oa_codes"].append(oa)
+    columns = {c:array(t) for c, t in COLUMN_TYPES.items()}
+    place_ids = []
+
+    for place in places:
+        location = place["geometry"]["location"]
+        place_ids.append(place["place_id"].encode("utf-8"))
+        columns["oa_index"].append(oa_index)
+        columns["lat"].append(location["lat"])
+        columns["lng"].append(location["lng"])
+        columns["rating"].append(place.get("rating", np.nan))
+        columns["user_ratings_total"].append(place.get("user_ratings_total", -1))
+
+        for t in place["types"]:
+            if t not in writer["type_codes"]:
+                writer["type_codes"][t] = len(writer["type_codes"])
+            columns["type_indices"].append(writer["type_codes"][t])
+        columns["type_offsets"].append(writer["types"] + len(columns["type_indices"]))
+
+    writer["places"] = writer["places"] + len(place_ids)
+    writer["types"] = writer["types"] + len(columns["type_indices"])
+    columns["oa_offsets"].append(writer["places"])
+
+    for c, values in columns.items():
+        values.tofile(writer["files"][c])
+    for place_id in place_ids:
+        writer["files"]["place_id"].write(place_id + b"\n")
+        writer["place_id_width"] = max(writer["place_id_width"], len(place_id))
+
+# Write a raw column file as a ".npy" file of the given array type, a chunk at a time.
+def write_column(raw_path, npy_path, typecode, length):
+    with open(raw_path, "rb") as raw, open(npy_path, "wb") as out:
+        header = {"descr":np.lib.format.dtype_to_descr(np.dtype(typecode)), "fortran_order":False, "shape":(length,)}
+        np.lib.format.write_array_header_1_0(out, header)
+        shutil.copyfileobj(raw, out)
+    os.remove(raw_path)
+
+# Write the place ids as a ".npy" file of fixed-width bytes, a chunk at a time.
+def write_place_ids(raw_path, npy_path, width, length, chunk_size=100000):
+    dtype = np.dtype(f"S{width}")
+    with open(raw_path, "rb") as raw, open(npy_path, "wb") as out:
+        header = {"descr":np.lib.format.dtype_to_descr(dtype), "fortran_order":False, "shape":(length,)}
+        np.lib.format.write_array_header_1_0(out, header)
+        chunk = []
+        for line in raw:
+            chunk.append(line[:-1])
+            if len(chunk) == chunk_size:
+                out.write(np.array(chunk, dtype=dtype).tobytes())
+                chunk = []
+        out.write(np.array(chunk, dtype=dtype).tobytes())
+    os.remove(raw_path)
+
+# Write the columns of a store writer to the store directory, replacing any previous
+# store once every column is written.
+def write_store(writer):
+    for f in writer["files"].values():
+        f.close()
+
+    tmp_dir = writer["tmp_dir"]
+    lengths = {
+        "oa_index": writer["places"],
+        "lat": writer["places"],
+        "lng": writer["places"],
+        "rating": writer["places"],
+        "user_ratings_total": writer["places"],
+        "type_offsets": writer["places"] + 1,
+        "type_indices": writer["types"],
+        "oa_offsets": len(writer["oa_codes"]) + 1
+    }
+    for c, t in COLUMN_TYPES.items():
+        write_column(tmp_dir + c + ".bin", tmp_dir + c + ".npy", t, lengths[c])
+    write_place_ids(tmp_dir + "place_id.bin", tmp_dir + "place_id.npy", writer["place_id_width"], writer["places"])
+    np.save(tmp_dir + "oa_codes.npy", np.array(writer["oa_codes"], dtype=str))
+    np.save(tmp_dir + "type_codes.npy", np.array(list(writer["type_codes"].keys()), dtype=str))
+
+    path = writer["out_dir"] + writer["name"]
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tmp_dir, path)
+
+# Load the given columns of a store (all of them by default). Columns are memory-mapped
+# unless "mmap" is False, so loading is immediate and only the pages read are loaded.
+def load_store(path, columns=None, mmap=True):
+    if columns is None:
+        columns = [f[:-4] for f in os.listdir(path) if f.endswith(".npy")]
+
+    store = {}
+    for column in columns:
+        store[column] = np.load(path + "/" + column + ".npy", mmap_mode="r" if mmap else None)
+
+    if "oa_codes" in store:
+        store["oa_lookup"] = {oa:i for i, oa in enumerate(store["oa_codes"].tolist())}
+    return store
+
+# Return the range of rows of the places of an OA. Requires "oa_codes" and "oa_offsets".
+def get_oa_rows(store, oa):
+    i = store["oa_lookup"].get(oa)
+    if i is None:
+        return (0, 0)
+    return (int(store["oa_offsets"][i]), int(store["oa_offsets"][i + 1]))
+
+# Yield the type codes of each place of an OA. Requires "oa_codes", "oa_offsets",
+# "type_offsets" and "type_indices".
+def iter_oa_type_codes(store, oa):
+    start, end = get_oa_rows(store, oa)
+    offsets = np.asarray(store["type_offsets"][start:end + 1])
+    indices = np.asarray(store["type_indices"][offsets[0]:offsets[-1]])
+    for i in range(end - start):
+        yield indices[offsets[i] - offsets[0]:offsets[i + 1] - offsets[0]]
+
+# Yield the list of types of each place of an OA. Also requires "type_codes".
+def iter_oa_types(store, oa):
+    for codes in iter_oa_type_codes(store, oa):
+        yield store["type_codes"][codes].tolist()
+
+# Return the unique type codes of the places of the given OAs.
+def get_type_codes_in_oas(store, oas):
+    present = np.zeros(len(store["type_codes"]), dtype=bool)
+    for oa in oas:
+        start, end = get_oa_rows(store, oa)
+        present[store["type_indices"][store["type_offsets"][start]:store["type_offsets"][end]]] = True
+    return np.nonzero(present)[0]
+
+# Return the set of types of the places of the given OAs.
+def get_types_in_oas(store, oas):
+    return set(store["type_codes"][get_type_codes_in_oas(store, oas)].tolist())
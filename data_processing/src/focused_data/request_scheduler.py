@@ -0,0 +1,118 @@
+"""Asynchronous request scheduler.
+
+Grants the right to submit a request to the coroutines of an asyncio mining mode.
+Requests are parked with the time at which they become ready (a "next_page_token"
+only becomes valid a couple of seconds after it is issued) and, once ready, are
+released by priority at the pace of a global token bucket sized to the project's
+queries per second quota. Page token requests take priority over fresh circles so
+that circles are completed, and their tokens used, as soon as possible.
+
+When the API answers OVER_QUERY_LIMIT, the rate is halved and the request is parked
+again after an exponential backoff with jitter. Successful requests slowly bring the
+rate back up to the quota.
+
+Input datasets:
+- None
+
+Output datasets:
+- None
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+# Priorities. Lower values are released first.
+PAGE_TOKEN = 0
+FRESH = 1
+
+# Backoff parameters.
+BASE_BACKOFF = 1        # Seconds.
+MAX_BACKOFF = 60        # Seconds.
+MIN_RATE_FRACTION = 0.05
+RECOVERY_FRACTION = 0.01
+
+# Create a scheduler state. "burst" is the capacity of the token bucket.
+def create_scheduler(queries_per_second, burst=None):
+    if burst is None:
+        burst = queries_per_second
+
+    return {
+        "max_rate": queries_per_second,
+        "rate": queries_per_second,
+        "burst": burst,
+        "tokens": burst,
+        "last_refill": time.monotonic(),
+        "last_throttle": 0,
+        "parked": [],   # Heap of (ready time, sequence, priority, future).
+        "ready": [],    # Heap of (priority, sequence, future).
+        "sequence": itertools.count(),
+        "wakeup": asyncio.Event()
+    }
+
+# Wait until the caller is allowed to submit a request, at least "delay" seconds
+# from now.
+async def wait_turn(scheduler, delay=0, priority=FRESH):
+    future = asyncio.get_running_loop().create_future()
+    heapq.heappush(scheduler["parked"], (time.monotonic() + delay, next(scheduler["sequence"]), priority, future))
+    scheduler["wakeup"].set()
+    await future
+
+# Add the tokens accumulated since the last refill to the bucket.
+def refill(scheduler, now):
+    elapsed = now - scheduler["last_refill"]
+    scheduler["tokens"] = min(scheduler["burst"], scheduler["tokens"] + elapsed * scheduler["rate"])
+    scheduler["last_refill"] = now
+
+# Dispatcher loop. Must run as a task for as long as the scheduler is in use.
+async def run_scheduler(scheduler):
+    parked = scheduler["parked"]
+    ready = scheduler["ready"]
+
+    while True:
+        now = time.monotonic()
+
+        # Move the requests that have become ready.
+        while len(parked) > 0 and parked[0][0] <= now:
+            ready_time, sequence, priority, future = heapq.heappop(parked)
+            heapq.heappush(ready, (priority, sequence, future))
+
+        refill(scheduler, now)
+
+        if len(ready) > 0 and scheduler["tokens"] >= 1:
+            priority, sequence, future = heapq.heappop(ready)
+            if not future.done():
+                scheduler["tokens"] = scheduler["tokens"] - 1
+                future.set_result(None)
+            continue
+
+        # Sleep until a token is available, a parked request is ready or a new one arrives.
+        timeout = None
+        if len(ready) > 0:
+            timeout = (1 - scheduler["tokens"]) / scheduler["rate"]
+        elif len(parked) > 0:
+            timeout = parked[0][0] - now
+
+        scheduler["wakeup"].clear()
+        try:
+            await asyncio.wait_for(scheduler["wakeup"].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+# Register an OVER_QUERY_LIMIT response. Halves the rate (at most once per second,
+# since many requests in flight are throttled at once) and returns the delay after
+# which the request should be retried.
+def report_throttled(scheduler, attempt):
+    now = time.monotonic()
+    if now - scheduler["last_throttle"] > 1:
+        scheduler["rate"] = max(scheduler["max_rate"] * MIN_RATE_FRACTION, scheduler["rate"] / 2)
+        scheduler["last_throttle"] = now
+
+    backoff = min(MAX_BACKOFF, BASE_BACKOFF * (2 ** attempt))
+    return backoff * random.uniform(0.5, 1.5)
+
+# Register a successful response. The rate recovers additively up to the quota.
+def report_success(scheduler):
+    scheduler["rate"] = min(scheduler["max_rate"], scheduler["rate"] + scheduler["max_rate"] * RECOVERY_FRACTION)
@@ -0,0 +1,139 @@
+"""Google Maps Place Details enrichment.
+
+Optional stage, run after the Places API mine. Nearby Search responses lack the
+attributes needed by the supply and demand model (price level, opening hours and
+business status), so the details of every unique mined place are fetched from the
+Place Details endpoint and stored in a columnar side table (see "place_details.py"),
+joined to the places by "place_id".
+
+Requests are submitted concurrently over a pool of reusable connections, at the pace
+of the request scheduler (see "request_scheduler.py"). Every response is cached by
+"place_id" (see "places_cache.py") before it is used, so reruns only request the
+places never enriched before.
+
+Input datasets:
+- 783 files stored in "raw_data/places"
+
+Output datasets:
+- place_details.npz
+
+IMPORTANT, MUST READ!
+- Like the mine, this stage requires manual triggering and results in monetary
+charges by Google Developer Console. Set "emulator_url" to run it against the Places
+API emulator (see "places_emulator.py") instead, e.g. to benchmark it.
+"""
+
+import sys
+import os
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(PROJECT_ROOT)
+from api import api_key
+from os import listdir
+import time
+import asyncio
+import aiohttp
+import src.common as common
+import src.focused_data.places_cache as places_cache
+import src.focused_data.places_shards as places_shards
+import src.focused_data.place_details as place_details
+import src.focused_data.request_scheduler as request_scheduler
+
+################################################################################
+# Globals.
+################################################################################
+
+emulator_url = None     # e.g. "http://localhost:8765" to enrich against "places_emulator.py".
+
+INPUT_DATA_DIR = common.CWD + "/data/raw_data/" + "places/"
+OUTPUT_DATA_DIR = common.CWD + "/data/raw_data/" + "place_details/"
+CACHE_DIR = common.CWD + "/data/raw_data/" + "places_cache/"
+if emulator_url is not None:
+    OUTPUT_DATA_DIR = common.CWD + "/data/raw_data/" + "place_details_emulated/"
+    CACHE_DIR = common.CWD + "/data/raw_data/" + "places_cache_emulated/"
+cache_file = "places_responses.sqlite"
+details_file = "place_details.npz"
+
+PLACE_DETAILS_URL = (emulator_url or "https://maps.googleapis.com") + "/maps/api/place/details/json"
+details_fields = ["place_id", "price_level", "opening_hours", "business_status"]
+max_in_flight_requests = 50
+quota_queries_per_second = 50
+throttle_retries = 8
+cost_per_request = 0.017    # Dollars. Place Details costs $17 per 1000 requests.
+
+################################################################################
+# Functions.
+################################################################################
+
+# Executer method.
+def enrich_places():
+    start = time.time()
+    place_ids = get_place_ids()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache = places_cache.open_cache(CACHE_DIR + cache_file)
+    missing_ids = sorted(place_ids - places_cache.get_cached_detail_ids(cache))
+    print(f"Places: {len(place_ids)} - Details to fetch: {len(missing_ids)} (${round(len(missing_ids) * cost_per_request, 2)})")
+
+    asyncio.run(fetch_details_async(cache, missing_ids))
+
+    responses = places_cache.get_details(cache, sorted(place_ids))
+    results = [x["result"] for x in responses if x.get("status") == "OK"]
+    table = place_details.build_details_table(results)
+    os.makedirs(OUTPUT_DATA_DIR, exist_ok=True)
+    place_details.save_details_table(OUTPUT_DATA_DIR, table, details_file)
+
+    print(f"Details saved for {len(results)} places")
+    end = time.time()
+    print(end - start)
+
+# Return the unique place ids of every mined OA.
+def get_place_ids():
+    place_ids = set()
+    for f in listdir(INPUT_DATA_DIR):
+        if f.endswith(places_shards.SUFFIXES):
+            place_ids.update([x["place_id"] for x in places_shards.read_places(INPUT_DATA_DIR + f)])
+    return place_ids
+
+# Fetch the details of every given place concurrently, caching each response.
+async def fetch_details_async(cache, place_ids):
+    semaphore = asyncio.Semaphore(max_in_flight_requests)
+    connector = aiohttp.TCPConnector(limit=max_in_flight_requests)
+    scheduler = request_scheduler.create_scheduler(quota_queries_per_second)
+    scheduler_task = asyncio.create_task(request_scheduler.run_scheduler(scheduler))
+    fetched = [0]
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[
+            fetch_place_details_async(session, semaphore, scheduler, cache, place_id, fetched, len(place_ids)) for place_id in place_ids
+        ])
+
+    scheduler_task.cancel()
+
+# Fetch the details of a single place once the scheduler allows it, retrying after a
+# backoff when the quota is exceeded. Only final answers are cached.
+async def fetch_place_details_async(session, semaphore, scheduler, cache, place_id, fetched, total):
+    params = {"key": api_key, "place_id": place_id, "fields": ",".join(details_fields)}
+    delay = 0
+
+    for attempt in range(throttle_retries):
+        await request_scheduler.wait_turn(scheduler, delay)
+        async with semaphore:
+            async with session.get(PLACE_DETAILS_URL, params=params) as response:
+                details = await response.json()
+
+        if details.get("status") != "OVER_QUERY_LIMIT":
+            request_scheduler.report_success(scheduler)
+            break
+        delay = request_scheduler.report_throttled(scheduler, attempt)
+
+    status = details.get("status")
+    if status in ["OK", "NOT_FOUND"]:
+        places_cache.put_details(cache, place_id, details)
+    else:
+        print(f"{place_id} - {status}")
+
+    fetched[0] = fetched[0] + 1
+    if fetched[0] % 1000 == 0:
+        print(f"{fetched[0]}/{total}")
+
+# Script executer.
+enrich_places()
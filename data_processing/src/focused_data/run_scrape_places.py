@@ -3,25 +3,97 @@
 Scrapes Google Maps Places data by OA from the Place API. Due to the restrictions
 on the API limiting response size, the search area for each OA is broken down into
 many small searchable units. The responses are also filtered to only retain desired
-information. The result of each OA query is stored in a separate file in the /raw
-data subdirectory to enforce an implicit backup progress system.
+information. The result of each OA query is streamed to a separate NDJSON shard in
+the /raw data subdirectory to enforce an implicit backup progress system.
 
 Input datasets:
 - None (Google Maps Places API)
+- OAs_influence_area.csv
+- OAs_geojson_wgs84.json (only for the "hex" search unit strategy)
 
 Output datasets:
-- 783 files stored in "raw_data/places"
+- 783 files stored in "raw_data/places" (see "places_shards.py")
 
 IMPORTANT, MUST READ!
 - Due to API response time restrictions, the mining process is very lengthy if done
 sequentially. To alleviate this issue, the handling of the 783 OAs is split accross
 threads (in this case 100). This reduces mining time from days to around 40 minutes.
+- In the multi-threaded approach, OAs are cut into jobs of at most "circles_per_job"
+circles and placed in a shared work queue, largest OAs first. Each thread takes the
+next job as soon as it is idle, so the circles of the largest OAs are spread across
+threads and every thread finishes at around the same time. The places of each job
+are written to a part shard, merged into the OA's shard by its last job.
 - When the multi-threaded approach is run, a large volume of requests is submitted
-to the Places API. Their frequency decreases as the execution nears the end. This
-mining method consumes API resources rapidly and this results in monetary charges
-by Google Developer Console.
+to the Places API. This mining method consumes API resources rapidly and this
+results in monetary charges by Google Developer Console.
 - A full 783 OA mine costs around $300 (taking into account the other mining parameters
 used in this script).
+- The asynchronous mining mode runs every OA in a single event loop. The number of
+requests in flight is capped by "max_in_flight_requests" and connections are pooled
+and reused. A circle waiting on its "next_page_token" suspends only itself, so the
+throughput is bound by the API quota rather than by the number of processes.
+- Every response is stored in an on-disk cache (see "places_cache.py") before it is
+used. Reruns, resumed mines and re-filtering only pay for the requests never made
+before. The cache only mode ("replay_mine") rebuilds the places files offline.
+- With the "adaptive" search unit strategy, each OA is first covered by a few coarse
+cells aligned to a global grid. A cell is only split in 4 when its response is
+saturated (3 full pages, i.e. 60 results), down to the regular unit size. The result
+count of every cell is recorded in the cache database and used as a density prior
+by the next mine, which splits known saturated cells without requesting them.
+- The shared lattice mode ("shared_grid_mine") takes the circles of every OA from a
+single lattice aligned to a global grid. Circles shared by neighbouring OAs are only
+mined once and each result is assigned, through a spatial index, to every OA whose
+search area contains it. The circles are mined in batches of OAs, so that only a
+bounded number of OA shards are open at once.
+- In the asynchronous modes, every request goes through a scheduler (see
+"request_scheduler.py"). Page tokens are parked until they become valid while other
+circles' requests are sent, a global token bucket keeps requests within the quota
+and OVER_QUERY_LIMIT responses are retried after a backoff with jitter.
+- Every finished circle and OA is recorded in a crash-safe journal (see
+"mine_journal.py"). A mine can be killed at any point and restarted: the finished
+circles of a partially mined OA are read back instead of being mined again. The
+progress counter is shared by all worker processes and reports an ETA.
+- The planning mode ("plan_mine") reports the circles, expected requests and cost of
+a mine per OA and in total, without any network access. Set "budget_dollars" to cap
+the spend of the real mine: it stops cleanly once the budget is reached, leaving a
+state that the next run resumes from.
+- Places are written to their OA's shard as each circle is mined, never accumulated
+in memory. Set "compress_shards" to gzip them.
+- Set "emulator_url" to mine against the local Places API emulator (see
+"places_emulator.py") instead of the paid API, e.g. to benchmark changes to this
+script. Emulated mines use their own output, cache and journal directories.
+- Every worker process records telemetry (see "mine_telemetry.py"): request latency,
+pages per circle, saturated circles, results kept and dropped by "filterFields",
+duplicate places, requests and cost. The aggregate of all the workers is rewritten
+every "telemetry_interval" seconds in CACHE_DIR, as JSON and as Prometheus text.
+- With the "hex" search unit strategy, circles only cover the OA polygon extended by
+the buffer, rather than its whole bounding box, with a hexagonal packing that needs
+fewer circles per square meter than the grid. Offsets are computed in meters for the
+latitude of each row. "report_hex_savings" reports the circles saved per OA.
+- The distributed mode ("distributed_mine") spreads the jobs of the multi-threaded
+approach over any number of machines through a work queue on a shared filesystem
+(see "work_queue.py"). Each machine runs it with CACHE_DIR and OUTPUT_DATA_DIR on
+that filesystem and "sqlite_journal_mode" set to "DELETE". Workers lease jobs,
+heartbeat while mining them and pick up the jobs of crashed workers once their lease
+expires, the journal and cache sparing the circles already paid for. It can be tried
+on a single machine, e.g. with several processes against the Places API emulator.
+Note that "budget_dollars" applies to each machine separately.
+- The progressive mode ("progressive_mine") visits the circles in a stratified random
+order: every OA is a stratum, and each round mines one more random circle of every
+OA. Every "progressive_interval" seconds, it publishes provisional place type counts
+per OA with confidence intervals, estimated from the share of the OA's circles (i.e.
+of its area) mined so far. Each place is attributed to its nearest circle, so that
+every circle stands for its own share of the area. The provisional tally is saved
+next to the final one, as "[Places]_counts_provisional.npz" and ".csv", with a row
+per OA of the mine and a column per documented place type, zero-filled. Set
+"provisional" in "processed_data/places.py" to run the processed stages on it. The
+mine stops once the estimates converge within "progressive_tolerance", and any later
+mine reuses the journaled circles.
+- The delta mode ("delta_mine") refreshes already mined OAs. It only requests the
+circles fetched more than "refresh_ttl_days" ago, or more than "volatile_ttl_days"
+ago if their results changed by more than "volatility_threshold" when last refreshed.
+New results are merged into the OA's places, and the added, removed and changed
+places are listed in "place_deltas.csv".
 """
 
 import sys
@@ -38,43 +110,158 @@ import json
 import math
 import multiprocessing
 import time
+import random
+import asyncio
+import aiohttp
+import socket
+import threading
+from googlemaps.exceptions import ApiError
+import shapely
+from shapely.geometry import box, shape
 import src.common as common
+import src.focused_data.places_cache as places_cache
+import src.focused_data.request_scheduler as request_scheduler
+import src.focused_data.mine_journal as mine_journal
+import src.focused_data.places_shards as places_shards
+import src.focused_data.mine_telemetry as mine_telemetry
+import src.focused_data.work_queue as work_queue
+import src.focused_data.places as focused_places
+import src.place_vocabulary as place_vocabulary
+import src.processed_data.place_counts as place_counts
 
 ################################################################################
 # Globals.
 ################################################################################
 
+emulator_url = None     # e.g. "http://localhost:8765" to mine against "places_emulator.py".
+
 INPUT_DATA_DIR = common.CWD + "/data/focused_data/" + "geodata/"
 OUTPUT_DATA_DIR =  common.CWD + "/data/focused_data/" + "places/"
-GMAPS = googlemaps.Client(key=api_key)
+if emulator_url is None:
+    GMAPS = googlemaps.Client(key=api_key)
+else:
+    OUTPUT_DATA_DIR = common.CWD + "/data/focused_data/" + "places_emulated/"
+    GMAPS = googlemaps.Client(key=api_key, base_url=emulator_url)
 geo_file = "OAs_influence_area.csv"
+polygons_file = "OAs_geojson_wgs84.json"
+OA_POLYGONS = None
 
 fieldsToKeep = ["geometry", "name", "place_id", "types", "rating", "user_ratings_total"]
 files_dir = OUTPUT_DATA_DIR[:len(OUTPUT_DATA_DIR)-1]
-onlyfiles = [f for f in listdir(files_dir) if isfile(join(files_dir, f))]
-existingOAs = [x[:9] for x in onlyfiles] # Skip mining existing OAs.
-OAs_counter = 1
+os.makedirs(files_dir, exist_ok=True)
+onlyfiles = [f for f in listdir(files_dir) if isfile(join(files_dir, f)) and f.endswith(places_shards.SUFFIXES)]
+existingOAs = set([x[:9] for x in onlyfiles]) # Skip mining existing OAs. Shards are only renamed into place once finished.
+
+# Progress counters shared by all the worker processes.
+OAs_counter = multiprocessing.Value("i", 0)
+OAs_mined = multiprocessing.Value("i", 0)
+OAs_total = 783
+compress_shards = False
+circles_per_job = 20    # Largest share of an OA's circles mined by a single job.
+NEXT_JOB = multiprocessing.Value("i", 0)    # Work queue cursor shared by all the worker processes.
+queue_file = "mine_queue.sqlite"
+lease_seconds = 300         # A job not heartbeated for this long is leased again.
+lease_poll_interval = 10    # Seconds between two attempts when every job is leased.
+places_shards.stale_seconds = lease_seconds     # Temporary shards of other machines outlive their lease.
+LEASE_LOST = None           # Set by the heartbeat of the current job of the process.
+MINE_START = time.time()
 
 lat_unit_length = 0.0010810912550027751
 lng_unit_length = 0.0017325629696289258
 unit_radius_meters = 60
 buffer_size = 1
 
+PLACES_NEARBY_URL = (emulator_url or "https://maps.googleapis.com") + "/maps/api/place/nearbysearch/json"
+max_in_flight_requests = 50 # Requests open at once in the asynchronous mode.
+max_in_flight_oas = 100     # OAs held in memory at once in the asynchronous modes.
+page_token_delay = 2        # Seconds before a "next_page_token" becomes valid.
+page_token_retry_delay = 0.5
+page_token_retries = 5
+quota_queries_per_second = 50
+throttle_retries = 8
+SCHEDULER = None
+MINE_ERRORS = (ApiError, aiohttp.ClientError, asyncio.TimeoutError)    # Fail a single OA or circle, not the mine.
+
+CACHE_DIR = common.CWD + "/data/raw_data/" + "places_cache/"
+if emulator_url is not None:
+    CACHE_DIR = common.CWD + "/data/raw_data/" + "places_cache_emulated/"
+cache_file = "places_responses.sqlite"
+cache_only = False  # Never submit requests, only read the cache.
+CACHE = None
+CACHE_PID = None
+
+journal_file = "mine_journal.sqlite"
+sqlite_journal_mode = "WAL"     # "DELETE" if CACHE_DIR is on a shared filesystem.
+JOURNAL = None
+JOURNAL_PID = None
+
+cost_per_request = 0.032        # Dollars. Nearby Search costs $32 per 1000 requests.
+default_pages_per_circle = 1    # Used by the planner until the cache knows better.
+budget_dollars = None           # Stop the mine once this is spent. None for no limit.
+REQUESTS_MADE = multiprocessing.Value("i", 0)   # Shared by all the worker processes.
+plan_file = "mine_plan.csv"
+
+telemetry_interval = 10     # Seconds between two rewrites of the telemetry files.
+TELEMETRY = None
+TELEMETRY_PID = None
+
+search_unit_strategy = "grid"   # "grid", "adaptive" or "hex".
+adaptive_levels = 3             # Root cells of the adaptive strategy span 2^3 units.
+saturation_results = 60         # 3 full pages. The API never returns more.
+EARTH_RADIUS_METERS = 6371008.8
+
+progressive_seed = 0
+progressive_interval = 60       # Seconds between two publications of the estimates.
+progressive_tolerance = None    # Stop once every OA's CI half-width is within this fraction of its estimate.
+confidence_z = 1.96             # 95% confidence intervals.
+estimates_file = "provisional_counts.csv"
+PROVISIONAL_DIR = common.CWD + "/data/processed_data/places/"
+provisional_tally_file = "[Places]_counts_provisional"
+
+refresh_ttl_days = 90
+volatile_ttl_days = 30
+volatility_threshold = 0.2      # Fraction of a circle's results changed at its last refresh.
+deltas_file = "place_deltas.csv"
+hex_savings_file = "hex_covering_savings.csv"
+
 ################################################################################
 # Functions.
 ################################################################################
 
+# Raised when a request would exceed "budget_dollars".
+class BudgetExhausted(Exception):
+    pass
+
+# Raised when the lease of the current job of the distributed mine is lost.
+class LeaseLost(Exception):
+    pass
+
 # Executer method. As a precaution, the single threaded mine mode is default.
 def scrape_places():
+    global OAs_total
     gdf = pd.read_csv(INPUT_DATA_DIR + geo_file)
+    OAs_total = len(gdf)
     no_threads = 100
     gdfs = np.array_split(gdf, no_threads)
     single_thread_mine(gdfs) # runs in TOO MANY seconds.
-    # multi_thread_mine(gdfs, no_threads) # runs in around 40 minutes.
+    # multi_thread_mine(gdf, no_threads) # runs in around 40 minutes.
+    # distributed_mine(gdf, no_threads) # run on every machine of the mine.
+    # async_mine(gdf) # bound by the API quota.
+    # replay_mine(gdf) # no requests, cached responses only.
+    # shared_grid_mine(gdf) # each lattice circle mined once for all OAs.
+    # progressive_mine(gdf) # provisional estimates within minutes.
+    # delta_mine(gdf) # refreshes the stale circles of mined OAs.
+    # plan_mine(gdf) # no requests, reports the expected requests and cost.
+    # report_hex_savings(gdf) # no requests, compares the hex and grid circles.
 
 # A single threadable operation.
 def do_work(gdf):
-    gdf.apply(lambda x: getNearbyPlaces(x), axis=1)
+    try:
+        gdf.apply(lambda x: getNearbyPlaces(x), axis=1)
+    except BudgetExhausted as e:
+        print(f"\n{e}")
+    finally:
+        mine_telemetry.flush(getTelemetry(), True)
 
 # Filters results by containment in the OA influence area and also results fields
 # by their name (desired fields specified in a global variable)
@@ -96,23 +283,77 @@ def filterResults(places_nearby, search_area):
     response_json = json.dumps(places_nearby)    
     response_results = json.loads(response_json)["results"]
     filtered_results = [filterFields(x, search_area) for x in response_results if filterFields(x, search_area)]
+    telemetry = getTelemetry()
+    mine_telemetry.count(telemetry, "results_kept", len(filtered_results))
+    mine_telemetry.count(telemetry, "results_dropped", len(response_results) - len(filtered_results))
     return filtered_results
 
-# Given the "polygon_bounds" field of an OA, it segments it into searchable units
-# of roughly 100 meters squared. These units are computed as squares and later converted
-# to a collection of overlapping circles. The Google Maps Places API for Python is
-# only capable of submitting radius requests, not square bound requests.
-def generateSearchableUnits(row):
+# Returns the true search area of an OA: its "polygon_bounds" extended by the buffer.
+def getSearchArea(row):
     poly_bounds = json.loads(row["polygon_bounds"])
     lat_buffer = lat_unit_length * buffer_size
     lng_buffer = lng_unit_length * buffer_size
 
-    # True search area.
     lat_max = poly_bounds["lat_max"] + lat_buffer
     lat_min = poly_bounds["lat_min"] - lat_buffer
     lng_max = poly_bounds["lng_max"] + lng_buffer
     lng_min = poly_bounds["lng_min"] - lng_buffer
-    search_area = {"lng_min":lng_min, "lat_min":lat_min, "lng_max":lng_max, "lat_max":lat_max}
+    return {"lng_min":lng_min, "lat_min":lat_min, "lng_max":lng_max, "lat_max":lat_max}
+
+# Covers the search area of an OA with the root cells of the adaptive strategy. A
+# cell of level L is a square of 2^L by 2^L units. Cells are aligned to a global
+# grid so that neighbouring OAs and consecutive mines share them.
+def generateAdaptiveRootCells(search_area):
+    size = 2 ** adaptive_levels
+    i_min = math.floor(search_area["lat_min"] / (lat_unit_length * size))
+    i_max = math.floor(search_area["lat_max"] / (lat_unit_length * size))
+    j_min = math.floor(search_area["lng_min"] / (lng_unit_length * size))
+    j_max = math.floor(search_area["lng_max"] / (lng_unit_length * size))
+
+    cells = []
+    for i in range(i_min, i_max + 1):
+        for j in range(j_min, j_max + 1):
+            cells.append({"level":adaptive_levels, "i":i, "j":j})
+    return cells
+
+# Returns the circle (centre and radius in meters) circumscribing a cell.
+def getCellCircle(cell):
+    size = 2 ** cell["level"]
+    lat = (cell["i"] + 0.5) * lat_unit_length * size
+    lng = (cell["j"] + 0.5) * lng_unit_length * size
+    radius = math.ceil(unit_radius_meters * math.sqrt(2) * size)
+    return ((lat, lng), radius)
+
+# Splits a cell into its 4 children, discarding those outside the search area.
+def splitCell(cell, search_area):
+    children = []
+    level = cell["level"] - 1
+    size = 2 ** level
+
+    for i in [cell["i"] * 2, cell["i"] * 2 + 1]:
+        for j in [cell["j"] * 2, cell["j"] * 2 + 1]:
+            lat_min = i * lat_unit_length * size
+            lng_min = j * lng_unit_length * size
+            lat_max = lat_min + lat_unit_length * size
+            lng_max = lng_min + lng_unit_length * size
+            if lat_max >= search_area["lat_min"] and lat_min <= search_area["lat_max"]:
+                if lng_max >= search_area["lng_min"] and lng_min <= search_area["lng_max"]:
+                    children.append({"level":level, "i":i, "j":j})
+
+    return children
+
+# Given the "polygon_bounds" field of an OA, it segments it into searchable units
+# of roughly 100 meters squared. These units are computed as squares and later converted
+# to a collection of overlapping circles. The Google Maps Places API for Python is
+# only capable of submitting radius requests, not square bound requests.
+def generateSearchableUnits(row):
+    search_area = getSearchArea(row)
+    lat_buffer = lat_unit_length * buffer_size
+    lng_buffer = lng_unit_length * buffer_size
+    lat_max = search_area["lat_max"]
+    lat_min = search_area["lat_min"]
+    lng_max = search_area["lng_max"]
+    lng_min = search_area["lng_min"]
 
     lat_range = lat_max - lat_min
     lng_range = lng_max - lng_min
@@ -145,67 +386,1202 @@ def generateSearchableUnits(row):
     circles = in_square_circles + in_between_square_circles
     return (search_area, circles)
 
-# For each OA: generate searchable units, mine each one, and combine the results
-# in a JSON file (ensuring no repeated entries are present).
+# Returns the polygon of every OA, read once from the geojson in wgs84.
+def getOAPolygons():
+    global OA_POLYGONS
+    if OA_POLYGONS is None:
+        f = open(INPUT_DATA_DIR + polygons_file)
+        features = json.load(f)["features"]
+        OA_POLYGONS = {x["properties"]["geo_code"]:shape(x["geometry"]) for x in features}
+    return OA_POLYGONS
+
+# Returns the search area and the circles of an OA under the "grid" or the "hex"
+# search unit strategy.
+def getSearchUnits(row):
+    if search_unit_strategy == "hex":
+        return generateHexUnits(row)
+    return generateSearchableUnits(row)
+
+# Returns the search area and the circles (centre and radius in meters) an OA was
+# mined with. Under the adaptive strategy these are the cells recorded in the cache,
+# descending into the children of the saturated ones, as mineAdaptive does.
+def getMinedUnits(row):
+    if search_unit_strategy != "adaptive":
+        search_area, circles = getSearchUnits(row)
+        return (search_area, [((c["lat"], c["lng"]), unit_radius_meters) for c in circles])
+
+    search_area = getSearchArea(row)
+    cells = generateAdaptiveRootCells(search_area)
+    cache = getCache()
+    units = []
+
+    while len(cells) > 0:
+        cell = cells.pop()
+        saturated = places_cache.get_cell_saturated(cache, cell)
+        # Never mined.
+        if saturated is None:
+            continue
+        units.append(getCellCircle(cell))
+        if saturated and cell["level"] > 0:
+            cells.extend(splitCell(cell, search_area))
+
+    return (search_area, units)
+
+# Covers the polygon of an OA, extended by the buffer, with a hexagonal packing of
+# circles. Rows are 1.5 radii apart and the circles of a row sqrt(3) radii apart, the
+# longitude offset being computed from the haversine formula at the row's latitude.
+# Only the circles reaching the buffered polygon are kept. Distances are measured
+# on a plane tangent to the OA's centroid, accurate to centimeters at this scale.
+def generateHexUnits(row):
+    search_area = getSearchArea(row)
+    polygon = getOAPolygons()[row["geo_code"]]
+    origin = polygon.centroid
+    meters_per_lng = math.radians(1) * EARTH_RADIUS_METERS * math.cos(math.radians(origin.y))
+    meters_per_lat = math.radians(1) * EARTH_RADIUS_METERS
+
+    def to_meters(coords):
+        return np.column_stack([(coords[:, 0] - origin.x) * meters_per_lng, (coords[:, 1] - origin.y) * meters_per_lat])
+
+    region = shapely.transform(polygon, to_meters).buffer(buffer_size * 2 * unit_radius_meters)
+    x_min, y_min, x_max, y_max = region.bounds
+
+    # Rows of circles, from the bottom of the region to its top.
+    row_spacing = 1.5 * unit_radius_meters
+    row_count = math.ceil((y_max - y_min) / row_spacing) + 1
+    lats = origin.y + np.degrees((y_min + np.arange(row_count) * row_spacing) / EARTH_RADIUS_METERS)
+
+    # Circles of each row. Odd rows are shifted by half a spacing.
+    spacing = math.sqrt(3) * unit_radius_meters
+    lng_spacings = np.degrees(2 * np.arcsin(np.sin(spacing / (2 * EARTH_RADIUS_METERS)) / np.cos(np.radians(lats))))
+    column_count = math.ceil((x_max - x_min) / spacing) + 2
+    lng_min = origin.x + x_min / meters_per_lng
+    lngs = lng_min + (np.arange(column_count)[None, :] - 0.5 * (np.arange(row_count)[:, None] % 2)) * lng_spacings[:, None]
+    lats = np.broadcast_to(lats[:, None], lngs.shape)
+
+    centres = np.column_stack([lngs.ravel(), lats.ravel()])
+    distances = shapely.distance(shapely.points(to_meters(centres)), region)
+    centres = centres[distances <= unit_radius_meters]
+
+    circles = [{"lat":lat, "lng":lng} for lng, lat in centres.tolist()]
+    return (search_area, circles)
+
+# Reports, without any request, the circles saved per OA by the "hex" search unit
+# strategy over the "grid" one. Every circle saved saves at least one request.
+def report_hex_savings(gdf):
+    savings = []
+    for _, row in gdf.iterrows():
+        grid_circles = len(generateSearchableUnits(row)[1])
+        hex_circles = len(generateHexUnits(row)[1])
+        savings.append([row["geo_code"], grid_circles, hex_circles, grid_circles - hex_circles])
+
+    savings_df = pd.DataFrame(savings, columns=["OA", "grid_circles", "hex_circles", "saved_circles"])
+    savings_df["saved_percentage"] = savings_df.apply(lambda x: round(x["saved_circles"] / x["grid_circles"] * 100, common.DPs), axis=1)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    common.save_dataframe_to_csv(CACHE_DIR, savings_df, hex_savings_file)
+
+    print(savings_df.sort_values("saved_circles", ascending=False))
+    grid_total = savings_df["grid_circles"].sum()
+    hex_total = savings_df["hex_circles"].sum()
+    print(f"Circles: {hex_total} hex instead of {grid_total} grid ({round((grid_total - hex_total) / grid_total * 100, 2)}% saved)")
+
+# Covers a search area with the circles of the global lattice. The lattice follows
+# the same pattern as "generateSearchableUnits" (one circle in each unit square and
+# one on each of its vertices) but is aligned to a global grid. Circles are returned
+# as (kind, i, j) keys, "c" being square centres and "v" square vertices.
+def generateLatticeCircles(search_area):
+    i_min = math.floor(search_area["lat_min"] / lat_unit_length)
+    i_max = math.floor(search_area["lat_max"] / lat_unit_length)
+    j_min = math.floor(search_area["lng_min"] / lng_unit_length)
+    j_max = math.floor(search_area["lng_max"] / lng_unit_length)
+
+    circles = []
+    for i in range(i_min, i_max + 1):
+        for j in range(j_min, j_max + 1):
+            circles.append(("c", i, j))
+    for i in range(i_min, i_max + 2):
+        for j in range(j_min, j_max + 2):
+            circles.append(("v", i, j))
+    return circles
+
+# Returns the location of a lattice circle.
+def getLatticeCircleLocation(key):
+    kind, i, j = key
+    offset = 0.5 if kind == "c" else 0
+    return ((i + offset) * lat_unit_length, (j + offset) * lng_unit_length)
+
+# For each OA: generate searchable units, mine each one, and stream the results to
+# the OA's shard (ensuring no repeated entries are present).
 def getNearbyPlaces(row):
     oa_name = row["geo_code"]
 
-    global OAs_counter
     print(f"Working on: {oa_name}")
 
     # Avoid mining already mined OAs.
     if oa_name in existingOAs:
-        print(f"- Already explored - {OAs_counter}/782 - {round((OAs_counter/782) * 100, 2)}%")
-        print(f"Total number of unique results = ## - {OAs_counter}/782 - {round((OAs_counter/782) * 100, 2)}%")
-        OAs_counter = OAs_counter + 1
+        print(f"- Already explored - {countOA(False)}")
         return
 
     print("- ", end="")
-    existingOAs.append(oa_name)
+    existingOAs.add(oa_name)
 
     # Generate and mine searchable units.
-    search_area, circles = generateSearchableUnits(row)
-    oa_results = {oa_name:[]}
+    shard = places_shards.open_shard(OUTPUT_DATA_DIR, oa_name, compress_shards)
+    if search_unit_strategy == "adaptive":
+        mineAdaptive(row, shard)
+    else:
+        mineGrid(row, shard)
+
+    print()
+    saveOAShard(oa_name, shard)
+
+# Mines every circle of the regular grid (or hex covering) of an OA into its shard.
+# A job only mines its share of the circles, one every "parts" circles from "part".
+def mineGrid(row, shard, part=0, parts=1):
+    search_area, circles = getSearchUnits(row)
+    circles = circles[part::parts]
+    missing_circles = 0
     
     for ci in range(len(circles)):
+        checkLease()
         c = circles[ci]
         location = (c["lat"], c["lng"])
+        filtered_results, result_count = mineJournaledCircle(row["geo_code"], location, search_area)
+
+        # Only happens in cache only mode, when the circle was never mined.
+        if filtered_results is None:
+            print(f"{ci}-X", end=" ", flush=True)
+            missing_circles = missing_circles + 1
+            continue
+
+        print(f"{ci}-{len(filtered_results)}", end=" ", flush=True)
+        writePlaces(shard, filtered_results)
+
+    if missing_circles > 0:
+        print(f"- {missing_circles}/{len(circles)} circles missing from the cache", end=" ")
+
+# Mines the cells of an OA into its shard, splitting only the saturated ones. Cells
+# recorded as saturated by a previous mine are split without being requested. A job
+# only mines its share of the root cells.
+def mineAdaptive(row, shard, part=0, parts=1):
+    search_area = getSearchArea(row)
+    cells = generateAdaptiveRootCells(search_area)[part::parts]
+    cache = getCache()
+
+    while len(cells) > 0:
+        checkLease()
+        cell = cells.pop()
+        saturated = places_cache.get_cell_saturated(cache, cell)
+
+        if saturated != True or cell["level"] == 0:
+            location, radius = getCellCircle(cell)
+            filtered_results, result_count = mineJournaledCircle(row["geo_code"], location, search_area, radius)
+
+            # Only happens in cache only mode, when the cell was never mined.
+            if filtered_results is None:
+                print(f"{cell['level']}-X", end=" ", flush=True)
+                continue
 
+            print(f"{cell['level']}-{len(filtered_results)}", end=" ", flush=True)
+            writePlaces(shard, filtered_results)
+            saturated = result_count >= saturation_results
+            places_cache.put_cell_count(cache, cell, result_count, saturated)
+
+        if saturated and cell["level"] > 0:
+            cells.extend(splitCell(cell, search_area))
+
+# Returns the cache connection of the current process. SQLite connections can not
+# be shared across processes, so each worker opens its own.
+def getCache():
+    global CACHE, CACHE_PID
+    if CACHE is None or CACHE_PID != os.getpid():
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        CACHE = places_cache.open_cache(CACHE_DIR + cache_file, sqlite_journal_mode)
+        CACHE_PID = os.getpid()
+    return CACHE
+
+# Returns a page of a circle and whether it came from the cache. The API is only
+# requested on a cache miss, or to refresh the page, and its response is cached
+# straight away.
+def fetchPage(location, page, page_token=None, radius=unit_radius_meters, refresh=False):
+    cache = getCache()
+    places_nearby = None
+    if not refresh:
+        places_nearby = places_cache.get_response(cache, location, radius, page)
+    if places_nearby is not None or cache_only:
+        if places_nearby is not None:
+            mine_telemetry.count(getTelemetry(), "cache_hits")
+        return (places_nearby, True)
+
+    chargeRequest()
+    request_start = time.monotonic()
+    if page_token is None:
         places_nearby = GMAPS.places_nearby(
             location = location,    # (lat,lng)
-            radius = unit_radius_meters
+            radius = radius
         )
+    else:
+        time.sleep(2) # it does not work with 1 second!!!
+        places_nearby = GMAPS.places_nearby(
+            location = location,
+            radius = radius,
+            page_token = page_token
+        )
+    mine_telemetry.observe(getTelemetry(), "request_latency_seconds", time.monotonic() - request_start, mine_telemetry.LATENCY_BUCKETS)
 
-        filtered_results = filterResults(places_nearby, search_area)
+    places_cache.put_response(cache, location, radius, page, places_nearby)
+    return (places_nearby, False)
 
-        while "next_page_token" in places_nearby:
-            time.sleep(2) # it does not work with 1 second!!!
-            next_page_token = places_nearby["next_page_token"]
-            places_nearby = GMAPS.places_nearby(
-                location = location,
-                radius = unit_radius_meters,
-                page_token = next_page_token
-            )
-            new_filtered_results = filterResults(places_nearby, search_area)
-            filtered_results = filtered_results + new_filtered_results
+# Mines every page of a single circle. Returns its filtered results and the number
+# of raw results across all pages. The filtered results are None if the circle is
+# not fully cached in cache only mode. A refreshed circle ignores the cache.
+def mineCircle(location, search_area, radius=unit_radius_meters, refresh=False):
+    places_nearby, from_cache = fetchPage(location, 0, radius=radius, refresh=refresh)
+    filtered_results = []
+    result_count = 0
+    page = 0
 
-        print(f"{ci}-{len(filtered_results)}", end=" ", flush=True)
-        oa_results[oa_name] = oa_results[oa_name] + filtered_results
+    while places_nearby is not None:
+        filtered_results.extend(filterResults(places_nearby, search_area))
+        result_count = result_count + len(places_nearby["results"])
+
+        if "next_page_token" not in places_nearby:
+            observeCircle(page + 1, result_count)
+            if refresh:
+                places_cache.delete_pages_after(getCache(), location, radius, page)
+            return (filtered_results, result_count)
+
+        page = page + 1
+        try:
+            places_nearby, from_cache = fetchPage(location, page, places_nearby["next_page_token"], radius, refresh)
+        except ApiError as e:
+            if not from_cache or e.status != "INVALID_REQUEST":
+                raise
+            # The token belongs to a cached page and has expired. Mine the circle again.
+            places_cache.delete_circle(getCache(), location, radius)
+            return mineCircle(location, search_area, radius, refresh)
+
+    return (None, result_count)
+
+# Returns the journal connection of the current process.
+def getJournal():
+    global JOURNAL, JOURNAL_PID
+    if JOURNAL is None or JOURNAL_PID != os.getpid():
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        JOURNAL = mine_journal.open_journal(CACHE_DIR + journal_file, sqlite_journal_mode)
+        JOURNAL_PID = os.getpid()
+    return JOURNAL
+
+# Journaled counterpart of "mineCircle". A circle finished before the mine was
+# stopped is read back from the journal. In cache only mode the journal is ignored
+# so that the cached responses are filtered again.
+def mineJournaledCircle(oa_name, location, search_area, radius=unit_radius_meters):
+    if cache_only:
+        return mineCircle(location, search_area, radius)
+
+    journal = getJournal()
+    circle = mine_journal.get_circle_key(location, radius)
+    finished = mine_journal.get_circle(journal, oa_name, circle)
+    if finished is not None:
+        return finished
+
+    filtered_results, result_count = mineCircle(location, search_area, radius)
+    mine_journal.finish_circle(journal, oa_name, circle, filtered_results, result_count)
+    return (filtered_results, result_count)
+
+# Returns the weight of an OA (its number of circles) and the number of jobs of at
+# most "circles_per_job" circles it is cut into.
+def weighOA(row):
+    search_area, circles = getSearchUnits(row)
+    units = len(circles)
+    if search_unit_strategy == "adaptive":
+        units = len(generateAdaptiveRootCells(search_area))
+    parts = max(1, min(units, math.ceil(len(circles) / circles_per_job)))
+    return (len(circles), parts)
+
+# Builds the work queue of the multi-threaded mine. The OAs left to mine are cut
+# into jobs (see "weighOA"). Jobs are sorted largest OA first and the jobs of an OA
+# are kept together so that OAs are finished progressively. Returns (row position,
+# part, parts) jobs.
+def queueJobs(rows):
+    weighted_jobs = []
+    for position in range(len(rows)):
+        row = rows[position]
+        if row["geo_code"] in existingOAs:
+            continue
 
-    # Ensure all places results associated with an OA are unique.
+        weight, parts = weighOA(row)
+        for part in range(parts):
+            weighted_jobs.append((weight, position, part, parts))
+
+    weighted_jobs.sort(key=lambda x: (-x[0], x[1], x[2]))
+    return [x[1:] for x in weighted_jobs]
+
+# Mines a single job of the work queue into a part shard. The job finishing the last
+# part of an OA merges its part shards and saves the OA.
+def mineJob(row, part, parts, parts_left, position):
+    minePart(row, part, parts)
+
+    with parts_left.get_lock():
+        parts_left[position] = parts_left[position] - 1
+        last = parts_left[position] == 0
+
+    if last:
+        mergeOA(row["geo_code"], parts)
+
+# Mines a share of the circles of an OA into a part shard. The part shard is
+# discarded if the mine of the part is stopped.
+def minePart(row, part, parts):
+    oa_name = row["geo_code"]
+    shard = places_shards.open_part(OUTPUT_DATA_DIR, oa_name, part)
+
+    print(f"Working on: {oa_name} ({part + 1}/{parts})")
+    try:
+        if search_unit_strategy == "adaptive":
+            mineAdaptive(row, shard, part, parts)
+        else:
+            mineGrid(row, shard, part, parts)
+    except BaseException:
+        places_shards.discard_shard(shard)
+        raise
     print()
-    temp_dict = {}
-    for place in oa_results[oa_name]:
-        if place:
-            id = place["place_id"]
-            temp_dict[id] = place
-    oa_results[oa_name] = temp_dict
-
-    # Write results to file. Out of 783 OAs but since count starts at 0 max is 782.
-    print(f"Total number of unique results = {len(oa_results[oa_name])} - {OAs_counter}/782 - {round((OAs_counter/782) * 100, 2)}%")
-    output_json = json.dumps(oa_results)
-    common.save_json_to_file(OUTPUT_DATA_DIR, output_json, f"{oa_name}_places.json")
-    OAs_counter = OAs_counter + 1
+    observeShard(shard)
+    places_shards.close_shard(shard)
+
+# Merges the part shards of an OA into its shard and saves the OA.
+def mergeOA(oa_name, parts):
+    place_count = places_shards.merge_parts(OUTPUT_DATA_DIR, oa_name, parts, compress_shards)
+    mine_journal.finish_oa(getJournal(), oa_name, place_count)
+    print(f"{oa_name} - Total number of unique results = {place_count} - {countOA(True)}")
+
+# Adds the jobs of every OA left to mine to the distributed work queue. Jobs already
+# queued, e.g. by another machine, are left untouched.
+def enqueueDistributed(rows):
+    queue = work_queue.open_queue(CACHE_DIR + queue_file)
+    for row in rows:
+        if row["geo_code"] not in existingOAs:
+            weight, parts = weighOA(row)
+            work_queue.put_oa_jobs(queue, row["geo_code"], parts, weight)
+    print(f"Jobs: {work_queue.count_jobs(queue)}")
+    queue.close()
+
+# Renews the lease of a job from a background thread until the returned event is set.
+# A lost lease sets "LEASE_LOST", so that the job stops at its next circle.
+def startHeartbeat(job, worker):
+    global LEASE_LOST
+    stop = threading.Event()
+    lost = threading.Event()
+    LEASE_LOST = lost
+
+    def beat():
+        queue = work_queue.open_queue(CACHE_DIR + queue_file)
+        while not stop.wait(lease_seconds / 3):
+            if not work_queue.renew_lease(queue, job, worker, lease_seconds):
+                print(f"{job['job']} - Lease lost to another worker")
+                lost.set()
+                break
+        queue.close()
+
+    threading.Thread(target=beat, daemon=True).start()
+    return stop
+
+# Raises LeaseLost if the lease of the current job was lost to another worker.
+def checkLease():
+    if LEASE_LOST is not None and LEASE_LOST.is_set():
+        raise LeaseLost()
+
+# A single threadable operation of the distributed mine. Leases jobs from the shared
+# work queue until every job is done. Mining a single OA or merging its part shards
+# is idempotent, so a job mined twice after a lost lease yields the same files.
+def lease_work(rows_by_oa):
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    queue = work_queue.open_queue(CACHE_DIR + queue_file)
+
+    try:
+        while True:
+            job = work_queue.lease_job(queue, worker, lease_seconds)
+            if job is None:
+                if work_queue.count_unfinished(queue) == 0:
+                    return
+                # Every job left is leased. Wait for them to finish or expire.
+                time.sleep(lease_poll_interval)
+                continue
+
+            heartbeat = startHeartbeat(job, worker)
+            try:
+                row = rows_by_oa[job["oa"]]
+                if job["part"] == work_queue.MERGE:
+                    mergeOA(job["oa"], job["parts"])
+                elif job["parts"] == 1:
+                    minePart(row, 0, 1)
+                    mergeOA(job["oa"], 1)
+                else:
+                    minePart(row, job["part"], job["parts"])
+            except LeaseLost:
+                # The job is left to its new leaseholder.
+                print(f"\n{job['job']} - Stopped")
+                continue
+            finally:
+                heartbeat.set()
+            work_queue.complete_job(queue, job)
+    except BudgetExhausted as e:
+        print(f"\n{e}")
+    finally:
+        queue.close()
+        mine_telemetry.flush(getTelemetry(), True)
+
+# A single threadable operation of the multi-threaded mine. Takes the next job of
+# the shared work queue until there are none left.
+def steal_work(rows, jobs, parts_left):
+    try:
+        while True:
+            with NEXT_JOB.get_lock():
+                j = NEXT_JOB.value
+                NEXT_JOB.value = NEXT_JOB.value + 1
+
+            if j >= len(jobs):
+                return
+
+            position, part, parts = jobs[j]
+            mineJob(rows[position], part, parts, parts_left, position)
+    except BudgetExhausted as e:
+        print(f"\n{e}")
+    finally:
+        mine_telemetry.flush(getTelemetry(), True)
+
+# Counts a request about to be submitted against the budget. The count is shared by
+# all the worker processes. Raises BudgetExhausted instead of exceeding the budget.
+def chargeRequest():
+    with REQUESTS_MADE.get_lock():
+        if budget_dollars is not None and (REQUESTS_MADE.value + 1) * cost_per_request > budget_dollars:
+            raise BudgetExhausted(f"Budget of ${budget_dollars} reached after {REQUESTS_MADE.value} requests. Rerun to resume.")
+        REQUESTS_MADE.value = REQUESTS_MADE.value + 1
+
+    telemetry = getTelemetry()
+    mine_telemetry.count(telemetry, "requests")
+    mine_telemetry.count(telemetry, "cost_dollars", cost_per_request)
+
+# Returns the telemetry of the current process. The snapshots of a run are kept
+# apart from those of previous runs.
+def getTelemetry():
+    global TELEMETRY, TELEMETRY_PID
+    if TELEMETRY is None or TELEMETRY_PID != os.getpid():
+        run_dir = CACHE_DIR + "telemetry/" + f"{int(MINE_START)}/"
+        TELEMETRY = mine_telemetry.create_telemetry(run_dir, CACHE_DIR, telemetry_interval)
+        TELEMETRY_PID = os.getpid()
+    return TELEMETRY
+
+# Records a mined circle in the telemetry.
+def observeCircle(pages, result_count):
+    telemetry = getTelemetry()
+    mine_telemetry.count(telemetry, "circles")
+    if result_count >= saturation_results:
+        mine_telemetry.count(telemetry, "circles_saturated")
+    mine_telemetry.observe(telemetry, "pages_per_circle", pages, mine_telemetry.PAGES_BUCKETS)
+    mine_telemetry.flush(telemetry)
+
+# Records the duplicate places of a shard (an OA or a job) in the telemetry.
+def observeShard(shard):
+    duplicates = shard["received"] - len(shard["seen"])
+    mine_telemetry.observe(getTelemetry(), "shard_duplicate_fraction", mine_telemetry.ratio(duplicates, shard["received"]), mine_telemetry.RATE_BUCKETS)
+
+# Writes places to a shard, counting the duplicates in the telemetry.
+def writePlaces(shard, places):
+    received = shard["received"]
+    written = places_shards.write_places(shard, places)
+    telemetry = getTelemetry()
+    mine_telemetry.count(telemetry, "places_received", shard["received"] - received)
+    mine_telemetry.count(telemetry, "places_duplicate", shard["received"] - received - written)
+    return written
+
+# Counts an OA as processed in the counters shared by all the worker processes and
+# returns a progress line. The ETA is based on the OAs actually mined in this run.
+def countOA(mined):
+    with OAs_counter.get_lock():
+        OAs_counter.value = OAs_counter.value + 1
+        done = OAs_counter.value
+
+    with OAs_mined.get_lock():
+        if mined:
+            OAs_mined.value = OAs_mined.value + 1
+        mined_count = OAs_mined.value
+
+    progress = f"{done}/{OAs_total} - {round((done/OAs_total) * 100, 2)}%"
+    if mined_count > 0:
+        eta = ((time.time() - MINE_START) / mined_count) * (OAs_total - done)
+        progress = progress + f" - ETA {round(eta / 60, 1)} minutes"
+    return progress
+
+# Publish the shard of a finished OA and record it in the journal. Until then the
+# shard only exists under a temporary name, so a killed mine never leaves a
+# truncated file behind.
+def saveOAShard(oa_name, shard):
+    observeShard(shard)
+    place_count = places_shards.close_shard(shard)
+    mine_journal.finish_oa(getJournal(), oa_name, place_count)
+    print(f"{oa_name} - Total number of unique results = {place_count} - {countOA(True)}")
+
+# Submits a single Nearby Search request without blocking the event loop, once the
+# scheduler allows it and no earlier than "delay" seconds from now. The semaphore is
+# only held while the request is in flight. Throttled requests are parked again. The
+# request is only charged against the budget if "charge" is set.
+async def placesNearbyAsync(session, semaphore, location, page_token=None, radius=unit_radius_meters, delay=0, charge=True):
+    params = {"key": api_key}
+    if page_token is None:
+        params["location"] = f"{location[0]},{location[1]}"
+        params["radius"] = radius
+        priority = request_scheduler.FRESH
+    else:
+        params["pagetoken"] = page_token
+        priority = request_scheduler.PAGE_TOKEN
+
+    for attempt in range(throttle_retries):
+        await request_scheduler.wait_turn(SCHEDULER, delay, priority)
+        if charge:
+            chargeRequest()
+
+        async with semaphore:
+            request_start = time.monotonic()
+            async with session.get(PLACES_NEARBY_URL, params=params) as response:
+                places_nearby = await response.json()
+            mine_telemetry.observe(getTelemetry(), "request_latency_seconds", time.monotonic() - request_start, mine_telemetry.LATENCY_BUCKETS)
+
+        if places_nearby.get("status") != "OVER_QUERY_LIMIT":
+            request_scheduler.report_success(SCHEDULER)
+            return places_nearby
+
+        mine_telemetry.count(getTelemetry(), "throttled")
+        delay = request_scheduler.report_throttled(SCHEDULER, attempt)
+
+    return places_nearby
+
+# Starts the request scheduler of the asynchronous modes.
+def startScheduler():
+    global SCHEDULER
+    SCHEDULER = request_scheduler.create_scheduler(quota_queries_per_second)
+    return asyncio.create_task(request_scheduler.run_scheduler(SCHEDULER))
+
+# Asynchronous counterpart of "fetchPage". While waiting for a "next_page_token"
+# to become valid, only the calling circle is suspended. The polls of a token are
+# charged once, as a single page.
+async def fetchPageAsync(session, semaphore, location, page, page_token=None, radius=unit_radius_meters):
+    cache = getCache()
+    places_nearby = places_cache.get_response(cache, location, radius, page)
+    if places_nearby is not None or cache_only:
+        if places_nearby is not None:
+            mine_telemetry.count(getTelemetry(), "cache_hits")
+        return (places_nearby, True)
+
+    if page_token is None:
+        places_nearby = await placesNearbyAsync(session, semaphore, location, radius=radius)
+    else:
+        delay = page_token_delay
+        for attempt in range(page_token_retries):
+            places_nearby = await placesNearbyAsync(session, semaphore, location, page_token, delay=delay, charge=attempt == 0)
+            # The token is not valid yet. Park it a little longer.
+            if places_nearby.get("status") != "INVALID_REQUEST":
+                break
+            delay = page_token_retry_delay
+
+    status = places_nearby.get("status")
+    if status not in ["OK", "ZERO_RESULTS"]:
+        raise ApiError(status, places_nearby.get("error_message"))
+
+    places_cache.put_response(cache, location, radius, page, places_nearby)
+    return (places_nearby, False)
+
+# Asynchronous counterpart of "mineCircle".
+async def mineCircleAsync(session, semaphore, location, search_area, radius=unit_radius_meters):
+    places_nearby, from_cache = await fetchPageAsync(session, semaphore, location, 0, radius=radius)
+    filtered_results = []
+    result_count = 0
+    page = 0
+
+    while places_nearby is not None:
+        filtered_results.extend(filterResults(places_nearby, search_area))
+        result_count = result_count + len(places_nearby["results"])
+
+        if "next_page_token" not in places_nearby:
+            observeCircle(page + 1, result_count)
+            return (filtered_results, result_count)
+
+        page = page + 1
+        try:
+            places_nearby, from_cache = await fetchPageAsync(session, semaphore, location, page, places_nearby["next_page_token"], radius)
+        except ApiError as e:
+            if not from_cache or e.status != "INVALID_REQUEST":
+                raise
+            # The token belongs to a cached page and was still rejected after
+            # "page_token_retries" polls, i.e. it has expired. Mine the circle again.
+            places_cache.delete_circle(getCache(), location, radius)
+            return await mineCircleAsync(session, semaphore, location, search_area, radius)
+
+    return (None, result_count)
+
+# Asynchronous counterpart of "mineJournaledCircle".
+async def mineJournaledCircleAsync(session, semaphore, oa_name, location, search_area, radius=unit_radius_meters):
+    if cache_only:
+        return await mineCircleAsync(session, semaphore, location, search_area, radius)
+
+    journal = getJournal()
+    circle = mine_journal.get_circle_key(location, radius)
+    finished = mine_journal.get_circle(journal, oa_name, circle)
+    if finished is not None:
+        return finished
+
+    filtered_results, result_count = await mineCircleAsync(session, semaphore, location, search_area, radius)
+    mine_journal.finish_circle(journal, oa_name, circle, filtered_results, result_count)
+    return (filtered_results, result_count)
+
+# Asynchronous counterpart of "mineAdaptive" for a single cell and its children.
+# The 4 children of a saturated cell are mined concurrently.
+async def mineCellAsync(session, semaphore, shard, cell, search_area):
+    cache = getCache()
+    saturated = places_cache.get_cell_saturated(cache, cell)
+
+    if saturated != True or cell["level"] == 0:
+        location, radius = getCellCircle(cell)
+        filtered_results, result_count = await mineJournaledCircleAsync(session, semaphore, shard["oa"], location, search_area, radius)
+
+        # Only happens in cache only mode, when the cell was never mined.
+        if filtered_results is None:
+            return
+
+        writePlaces(shard, filtered_results)
+        saturated = result_count >= saturation_results
+        places_cache.put_cell_count(cache, cell, result_count, saturated)
+
+    if saturated and cell["level"] > 0:
+        await gatherAll([
+            mineCellAsync(session, semaphore, shard, child, search_area) for child in splitCell(cell, search_area)
+        ])
+
+# Mines a circle of the regular grid of an OA into its shard.
+async def mineGridCircleAsync(session, semaphore, shard, location, search_area):
+    filtered_results, result_count = await mineJournaledCircleAsync(session, semaphore, shard["oa"], location, search_area)
+    if filtered_results is not None:
+        writePlaces(shard, filtered_results)
+
+# Runs coroutines concurrently and waits for all of them, even if some fail, so that
+# none is left writing to a shard. Then raises the first error, if any.
+async def gatherAll(coroutines):
+    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+# Asynchronous counterpart of "getNearbyPlaces". All the circles of the OA are
+# mined concurrently. An OA failing on an API or connection error is reported and
+# left unfinished in the journal, without stopping the other OAs.
+async def getNearbyPlacesAsync(session, semaphore, oa_semaphore, row):
+    oa_name = row["geo_code"]
+
+    if oa_name in existingOAs:
+        print(f"{oa_name} - Already explored - {countOA(False)}")
+        return
+
+    existingOAs.add(oa_name)
+
+    async with oa_semaphore:
+        shard = places_shards.open_shard(OUTPUT_DATA_DIR, oa_name, compress_shards)
+
+        try:
+            if search_unit_strategy == "adaptive":
+                search_area = getSearchArea(row)
+                await gatherAll([
+                    mineCellAsync(session, semaphore, shard, cell, search_area) for cell in generateAdaptiveRootCells(search_area)
+                ])
+            else:
+                search_area, circles = getSearchUnits(row)
+                await gatherAll([
+                    mineGridCircleAsync(session, semaphore, shard, (c["lat"], c["lng"]), search_area) for c in circles
+                ])
+        except MINE_ERRORS as e:
+            places_shards.discard_shard(shard)
+            mine_telemetry.count(getTelemetry(), "failed_oas")
+            print(f"{oa_name} - Failed, left for the next mine - {type(e).__name__}: {e}")
+            return
+        except BaseException:
+            places_shards.discard_shard(shard)
+            raise
+
+        saveOAShard(oa_name, shard)
+
+# Runs every OA in a single event loop over a pool of reusable connections.
+async def mine_oas_async(gdf):
+    semaphore = asyncio.Semaphore(max_in_flight_requests)
+    oa_semaphore = asyncio.Semaphore(max_in_flight_oas)
+    connector = aiohttp.TCPConnector(limit=max_in_flight_requests)
+
+    scheduler_task = startScheduler()
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        try:
+            await gatherAll([
+                getNearbyPlacesAsync(session, semaphore, oa_semaphore, row) for _, row in gdf.iterrows()
+            ])
+        except BudgetExhausted as e:
+            print(e)
+
+    scheduler_task.cancel()
+    mine_telemetry.flush(getTelemetry(), True)
+
+# Mines a lattice circle and hands its results to every pending OA whose search area
+# contains them. An OA's shard is opened with its first result, and published as soon
+# as its last circle is mined.
+async def mineLatticeCircleAsync(session, semaphore, key, lattice):
+    location = getLatticeCircleLocation(key)
+    try:
+        filtered_results, result_count = await mineJournaledCircleAsync(session, semaphore, "lattice", location, lattice["search_area"])
+    except MINE_ERRORS as e:
+        # The OAs of the circle stay pending, and are left for the next mine.
+        lattice["failed"].append(key)
+        mine_telemetry.count(getTelemetry(), "failed_circles")
+        print(f"Lattice circle {key} - Failed - {type(e).__name__}: {e}")
+        return
+
+    if filtered_results:
+        points = shapely.points([(x["geometry"]["location"]["lng"], x["geometry"]["location"]["lat"]) for x in filtered_results])
+        place_indexes, oa_indexes = lattice["tree"].query(points, predicate="intersects")
+        for place_index, oa_index in zip(place_indexes, oa_indexes):
+            oa_name = lattice["oas"][oa_index]
+            if len(lattice["pending"][oa_name]) > 0:
+                writePlaces(getLatticeShard(lattice, oa_name), [filtered_results[place_index]])
+
+    for oa_name in lattice["circle_oas"][key]:
+        lattice["pending"][oa_name].discard(key)
+        if len(lattice["pending"][oa_name]) == 0:
+            saveOAShard(oa_name, getLatticeShard(lattice, oa_name))
+            lattice["shards"].pop(oa_name)
+
+# Returns the open shard of a pending OA of the shared lattice, opening it if needed.
+def getLatticeShard(lattice, oa_name):
+    if oa_name not in lattice["shards"]:
+        lattice["shards"][oa_name] = places_shards.open_shard(OUTPUT_DATA_DIR, oa_name, compress_shards)
+    return lattice["shards"][oa_name]
+
+# Mines the union of the OAs' lattice circles, each circle exactly once. Circles are
+# scheduled in batches of "max_in_flight_oas" OAs, each batch mining the circles of its
+# OAs not mined yet, so that OAs are completed (and freed) progressively. Only the
+# shards of the batch's OAs and of their neighbours sharing its circles are open at
+# once.
+async def mine_shared_async(gdf):
+    rows = [row for _, row in gdf.iterrows() if row["geo_code"] not in existingOAs]
+    oas = [row["geo_code"] for row in rows]
+    search_areas = [getSearchArea(row) for row in rows]
+
+    lattice = {
+        "oas": oas,
+        "tree": shapely.STRtree([box(a["lng_min"], a["lat_min"], a["lng_max"], a["lat_max"]) for a in search_areas]),
+        "search_area": {
+            "lng_min": min([a["lng_min"] for a in search_areas]),
+            "lat_min": min([a["lat_min"] for a in search_areas]),
+            "lng_max": max([a["lng_max"] for a in search_areas]),
+            "lat_max": max([a["lat_max"] for a in search_areas])
+        },
+        "shards": {},
+        "pending": {},
+        "circle_oas": {},
+        "failed": []
+    }
+
+    # Circles of each batch of OAs, each circle in the batch of its first OA.
+    batches = []
+    for i, (oa_name, search_area) in enumerate(zip(oas, search_areas)):
+        if i % max_in_flight_oas == 0:
+            batches.append([])
+        lattice["pending"][oa_name] = set(generateLatticeCircles(search_area))
+        for key in lattice["pending"][oa_name]:
+            if key not in lattice["circle_oas"]:
+                lattice["circle_oas"][key] = []
+                batches[-1].append(key)
+            lattice["circle_oas"][key].append(oa_name)
+
+    circles_per_oa = sum([len(x) for x in lattice["pending"].values()])
+    print(f"Circles: {len(lattice['circle_oas'])} shared lattice circles instead of {circles_per_oa} per OA circles")
+
+    semaphore = asyncio.Semaphore(max_in_flight_requests)
+    connector = aiohttp.TCPConnector(limit=max_in_flight_requests)
+
+    scheduler_task = startScheduler()
+
+    exhausted = False
+    async with aiohttp.ClientSession(connector=connector) as session:
+        try:
+            for batch in batches:
+                await gatherAll([
+                    mineLatticeCircleAsync(session, semaphore, key, lattice) for key in batch
+                ])
+        except BudgetExhausted as e:
+            print(e)
+            exhausted = True
+
+    # OAs left pending by a failed circle or by the budget are not published.
+    for shard in lattice["shards"].values():
+        places_shards.discard_shard(shard)
+    unfinished = len([x for x in lattice["pending"].values() if len(x) > 0])
+    if unfinished > 0:
+        print(f"Unfinished OAs: {unfinished} - Failed circles: {len(lattice['failed'])}")
+
+    scheduler_task.cancel()
+    mine_telemetry.flush(getTelemetry(), True)
+    # The finished lattice circles are kept in the journal for the next mine.
+    if not exhausted and len(lattice["failed"]) == 0:
+        mine_journal.discard_circles(getJournal(), "lattice")
+
+# Builds the stratum of an OA for the progressive mode: its circles in a random order
+# and their centres, scaled so that distances are isotropic.
+def createStratum(row, rng):
+    search_area, circles = getSearchUnits(row)
+    order = list(range(len(circles)))
+    rng.shuffle(order)
+    lng_scale = math.cos(math.radians((search_area["lat_min"] + search_area["lat_max"]) / 2))
+
+    return {
+        "oa": row["geo_code"],
+        "search_area": search_area,
+        "circles": circles,
+        "centres": np.array([[c["lat"], c["lng"] * lng_scale] for c in circles]),
+        "lng_scale": lng_scale,
+        "order": order,
+        "samples": {}   # Circle index -> (places, type counts) attributed to the circle.
+    }
+
+# Mines a circle of a stratum and records the places whose nearest circle it is.
+# A circle failing on an API or connection error is reported and left unsampled.
+async def mineSampleAsync(session, semaphore, stratum, ci):
+    c = stratum["circles"][ci]
+    try:
+        filtered_results, result_count = await mineJournaledCircleAsync(session, semaphore, stratum["oa"], (c["lat"], c["lng"]), stratum["search_area"])
+    except MINE_ERRORS as e:
+        mine_telemetry.count(getTelemetry(), "failed_circles")
+        print(f"{stratum['oa']} - Circle {ci} failed - {type(e).__name__}: {e}")
+        return
+    if filtered_results is None:
+        return
+
+    places = 0
+    type_counts = {}
+    for place in filtered_results:
+        location = place["geometry"]["location"]
+        distances = np.sum((stratum["centres"] - [location["lat"], location["lng"] * stratum["lng_scale"]]) ** 2, axis=1)
+        if np.argmin(distances) != ci:
+            continue
+
+        places = places + 1
+        for t in place["types"]:
+            if focused_places.filter_func(t):
+                type_counts[t] = type_counts.get(t, 0) + 1
+
+    stratum["samples"][ci] = (places, type_counts)
+
+# Estimates the total of a stratum from the values of its sampled circles, with the
+# expansion estimator of a simple random sample without replacement. Returns the
+# estimate and the half-width of its confidence interval (NaN with a single sample).
+def estimateTotal(values, circle_count):
+    m = len(values)
+    estimate = circle_count * np.mean(values)
+    if m < 2:
+        return (estimate, np.nan)
+    variance = circle_count ** 2 * (1 - m / circle_count) * np.var(values, ddof=1) / m
+    return (estimate, confidence_z * math.sqrt(variance))
+
+# Publishes the provisional estimates of every stratum: a long table with confidence
+# intervals and a tally in the format of the final one. Returns the largest relative
+# half-width of the OAs' place count intervals.
+def publishEstimates(strata):
+    estimates = []
+    worst = 0
+
+    for stratum in strata:
+        samples = list(stratum["samples"].values())
+        if len(samples) == 0:
+            continue
+        circle_count = len(stratum["circles"])
+        coverage = len(samples) / circle_count
+
+        types = set()
+        for places, type_counts in samples:
+            types.update(type_counts.keys())
+
+        series = {"all": [x[0] for x in samples]}
+        for t in types:
+            series[t] = [x[1].get(t, 0) for x in samples]
+
+        for t, values in series.items():
+            estimate, half_width = estimateTotal(values, circle_count)
+            observed = sum(values)
+            estimates.append([stratum["oa"], t, len(samples), circle_count, coverage, observed, estimate, max(observed, estimate - half_width), estimate + half_width])
+            if t == "all":
+                if np.isnan(half_width):
+                    worst = np.inf
+                elif estimate > 0:
+                    worst = max(worst, half_width / estimate)
+
+    estimates_df = pd.DataFrame(estimates, columns=["OA", "place_type", "mined_circles", "circles", "coverage", "observed", "estimate", "ci_low", "ci_high"])
+    estimates_df = estimates_df.round(common.DPs)
+    common.save_dataframe_to_csv(CACHE_DIR, estimates_df, estimates_file)
+    saveProvisionalTally(strata, estimates_df)
+
+    return worst
+
+# Saves the estimated counts as a places counts dataset (see "place_counts.py"): a
+# row per OA of the mine, sampled or not, and a column per documented place type.
+def saveProvisionalTally(strata, estimates_df):
+    oas = sorted([x["oa"] for x in strata])
+    vocabulary = place_vocabulary.load_vocabulary(common.CWD + "/data/")
+    types = sorted([x for x in vocabulary["names"] if focused_places.filter_func(x)])
+
+    counts = estimates_df[estimates_df["place_type"].isin(types)]
+    rows = np.searchsorted(oas, counts["OA"].to_numpy())
+    columns = np.searchsorted(types, counts["place_type"].to_numpy())
+    tally = place_counts.create_matrix(rows, columns, counts["estimate"].to_numpy(dtype=np.float64), oas, types)
+
+    os.makedirs(PROVISIONAL_DIR, exist_ok=True)
+    place_counts.save_matrix(PROVISIONAL_DIR, tally, provisional_tally_file + ".npz")
+    common.save_dataframe_to_csv(PROVISIONAL_DIR, place_counts.to_dataframe(tally), provisional_tally_file + ".csv")
+
+# Mines the circles of every OA in stratified random order, one round at a time, and
+# periodically publishes the provisional estimates.
+async def mine_progressive_async(gdf):
+    rng = random.Random(progressive_seed)
+    strata = [createStratum(row, rng) for _, row in gdf.iterrows() if row["geo_code"] not in existingOAs]
+    rounds = max([len(x["order"]) for x in strata] + [0])
+
+    semaphore = asyncio.Semaphore(max_in_flight_requests)
+    connector = aiohttp.TCPConnector(limit=max_in_flight_requests)
+    scheduler_task = startScheduler()
+    last_publish = time.monotonic()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        try:
+            for k in range(rounds):
+                await gatherAll([
+                    mineSampleAsync(session, semaphore, x, x["order"][k]) for x in strata if k < len(x["order"])
+                ])
+
+                if time.monotonic() - last_publish >= progressive_interval or k == rounds - 1:
+                    last_publish = time.monotonic()
+                    worst = publishEstimates(strata)
+                    print(f"Round {k + 1}/{rounds} - Largest relative CI half-width = {round(worst, 3)}")
+                    if progressive_tolerance is not None and worst <= progressive_tolerance:
+                        print("Estimates converged")
+                        break
+        except BudgetExhausted as e:
+            print(e)
+            publishEstimates(strata)
+
+    scheduler_task.cancel()
+    mine_telemetry.flush(getTelemetry(), True)
+
+# Returns whether a circle is due a refresh: never fetched, fetched before the TTL,
+# or before the shorter TTL of the circles that changed a lot when last refreshed.
+def isCircleStale(location, radius=unit_radius_meters):
+    cache = getCache()
+    fetched_at = places_cache.get_fetched_at(cache, location, radius)
+    if fetched_at is None:
+        return True
+
+    age_days = (time.time() - fetched_at) / (24 * 60 * 60)
+    change_fraction = places_cache.get_circle_change(cache, location, radius)
+    if change_fraction is not None and change_fraction > volatility_threshold:
+        return age_days > volatile_ttl_days
+    return age_days > refresh_ttl_days
+
+# Returns whether a place record changed between two mines.
+def isPlaceChanged(old, new):
+    return any([old.get(f) != new.get(f) for f in fieldsToKeep if f != "geometry"]) or \
+        old["geometry"]["location"] != new["geometry"]["location"]
+
+# Refreshes the stale circles of a mined OA and merges their results into its places.
+# The previous results of a circle are journaled before it is requested again, so a
+# refresh stopped halfway still sees what changed. Returns the place deltas and the
+# number of circles refreshed out of all the OA's circles.
+def refreshOA(row):
+    oa_name = row["geo_code"]
+    journal = getJournal()
+    journal_oa = f"delta:{oa_name}"
+    search_area, circles = getMinedUnits(row)
+
+    old_ids = set()         # Returned by the refreshed circles before.
+    new_places = {}         # Returned by the refreshed circles now.
+    kept_ids = set()        # Returned by the circles not refreshed.
+    refreshed = 0
+
+    for location, radius in circles:
+        circle = mine_journal.get_circle_key(location, radius)
+        journaled = mine_journal.get_circle(journal, journal_oa, circle)
+
+        if journaled is None and not isCircleStale(location, radius):
+            filtered_results, result_count = mineCircle(location, search_area, radius)
+            kept_ids.update([x["place_id"] for x in filtered_results])
+            continue
+
+        if journaled is None:
+            # Previous results (free, from the cache, if the circle was ever cached),
+            # then the live ones.
+            old_results, old_count = ([], 0)
+            if places_cache.get_fetched_at(getCache(), location, radius) is not None:
+                old_results, old_count = mineCircle(location, search_area, radius)
+            mine_journal.finish_circle(journal, journal_oa, circle, old_results, old_count)
+            new_results, new_count = mineCircle(location, search_area, radius, refresh=True)
+        else:
+            # Refreshed before the previous run was stopped.
+            old_results = journaled[0]
+            new_results, new_count = mineCircle(location, search_area, radius)
+
+        refreshed = refreshed + 1
+        old_by_id = {x["place_id"]:x for x in old_results}
+        new_by_id = {x["place_id"]:x for x in new_results}
+        old_ids.update(old_by_id.keys())
+        new_places.update(new_by_id)
+
+        changes = len(set(old_by_id.keys()) ^ set(new_by_id.keys()))
+        changes = changes + len([k for k in new_by_id.keys() if k in old_by_id and isPlaceChanged(old_by_id[k], new_by_id[k])])
+        change_fraction = changes / max(1, len(set(old_by_id.keys()) | set(new_by_id.keys())))
+        places_cache.put_circle_change(getCache(), location, radius, change_fraction)
+
+    # Merge into the OA's places.
+    path = places_shards.find_shard(OUTPUT_DATA_DIR, oa_name)
+    places = {x["place_id"]:x for x in places_shards.read_places(path)} if path is not None else {}
+    deltas = []
+    for place_id in old_ids - set(new_places.keys()) - kept_ids:
+        if place_id in places:
+            places.pop(place_id)
+            deltas.append([oa_name, place_id, "removed"])
+    for place_id, place in new_places.items():
+        if place_id not in places:
+            deltas.append([oa_name, place_id, "added"])
+        elif isPlaceChanged(places[place_id], place):
+            deltas.append([oa_name, place_id, "changed"])
+        places[place_id] = place
+
+    if refreshed > 0:
+        shard = places_shards.open_shard(OUTPUT_DATA_DIR, oa_name, compress_shards)
+        writePlaces(shard, places.values())
+        places_shards.close_shard(shard)
+        places_shards.remove_other_formats(OUTPUT_DATA_DIR, oa_name, shard["path"])
+    mine_journal.discard_circles(journal, journal_oa)
+    return (deltas, refreshed, len(circles))
+
+# Delta mining procedure. Refreshes every mined OA and lists the place deltas.
+def delta_mine(gdf):
+    start = time.time()
+    requests_before = REQUESTS_MADE.value
+    deltas = []
+    refreshed_total = 0
+    circles_total = 0
+
+    try:
+        for _, row in gdf.iterrows():
+            if row["geo_code"] not in existingOAs:
+                continue
+            oa_deltas, refreshed, circle_count = refreshOA(row)
+            deltas.extend(oa_deltas)
+            refreshed_total = refreshed_total + refreshed
+            circles_total = circles_total + circle_count
+            print(f"{row['geo_code']} - {refreshed}/{circle_count} circles refreshed - {len(oa_deltas)} deltas")
+    except BudgetExhausted as e:
+        print(f"\n{e}")
+
+    deltas_df = pd.DataFrame(deltas, columns=["OA", "place_id", "change"])
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    common.save_dataframe_to_csv(CACHE_DIR, deltas_df, deltas_file)
+
+    print(deltas_df["change"].value_counts())
+    print(f"Circles refreshed: {refreshed_total}/{circles_total} - Requests: {REQUESTS_MADE.value - requests_before}")
+    mine_telemetry.flush(getTelemetry(), True)
+    end = time.time()
+    print(end - start)
+
+# Plans the circles of an OA under the grid (or hex) strategy. Returns the number of
+# circles, how many of them are cached and the expected number of requests.
+def planGrid(row, pages_per_circle):
+    search_area, circles = getSearchUnits(row)
+    cache = getCache()
+    cached = len([c for c in circles if places_cache.has_response(cache, (c["lat"], c["lng"]), unit_radius_meters, 0)])
+    return (len(circles), cached, (len(circles) - cached) * pages_per_circle)
+
+# Plans the cells of an OA under the adaptive strategy, following the density prior
+# as "mineAdaptive" does. Cells never mined are expected to be unsaturated.
+def planAdaptive(row, pages_per_circle):
+    search_area = getSearchArea(row)
+    cells = generateAdaptiveRootCells(search_area)
+    cache = getCache()
+    circles = 0
+    cached = 0
+    requests = 0
+
+    while len(cells) > 0:
+        cell = cells.pop()
+        result_count = places_cache.get_cell_count(cache, cell)
+        saturated = result_count is not None and result_count >= saturation_results
+
+        if not saturated or cell["level"] == 0:
+            location, radius = getCellCircle(cell)
+            circles = circles + 1
+            if places_cache.has_response(cache, location, radius, 0):
+                cached = cached + 1
+            elif result_count is not None:
+                requests = requests + max(1, math.ceil(result_count / 20))
+            else:
+                requests = requests + pages_per_circle
+
+        if saturated and cell["level"] > 0:
+            cells.extend(splitCell(cell, search_area))
+
+    return (circles, cached, requests)
+
+# Plans the shared lattice mode. Each lattice circle is charged to the first OA that
+# uses it, as it is mined only once.
+def planShared(rows, pages_per_circle):
+    cache = getCache()
+    claimed = set()
+    plans = []
+
+    for row in rows:
+        keys = [k for k in generateLatticeCircles(getSearchArea(row)) if k not in claimed]
+        claimed.update(keys)
+        cached = len([k for k in keys if places_cache.has_response(cache, getLatticeCircleLocation(k), unit_radius_meters, 0)])
+        plans.append((len(keys), cached, (len(keys) - cached) * pages_per_circle))
+
+    return plans
+
+# Planning procedure. Without submitting any request, reports the circles, expected
+# requests and estimated cost of mining the OAs not mined yet with the configured
+# search unit strategy. Cached circles are free. The average number of pages per
+# circle is taken from the cache when possible.
+def plan_mine(gdf, shared=False):
+    cache = getCache()
+    pages_per_circle = places_cache.get_pages_per_circle(cache, unit_radius_meters)
+    if pages_per_circle is None:
+        pages_per_circle = default_pages_per_circle
+
+    rows = [row for _, row in gdf.iterrows() if row["geo_code"] not in existingOAs]
+
+    if shared:
+        plans = planShared(rows, pages_per_circle)
+    elif search_unit_strategy == "adaptive":
+        plans = [planAdaptive(row, pages_per_circle) for row in rows]
+    else:
+        plans = [planGrid(row, pages_per_circle) for row in rows]
+
+    plan_df = pd.DataFrame(plans, columns=["circles", "cached_circles", "expected_requests"])
+    plan_df.insert(0, "OA", [row["geo_code"] for row in rows])
+    plan_df["expected_requests"] = plan_df["expected_requests"].apply(lambda x: round(x, common.DPs))
+    plan_df["estimated_cost"] = plan_df["expected_requests"].apply(lambda x: round(x * cost_per_request, common.DPs))
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    common.save_dataframe_to_csv(CACHE_DIR, plan_df, plan_file)
+
+    print(plan_df)
+    print(f"OAs to mine: {len(rows)} ({len(gdf) - len(rows)} already mined)")
+    print(f"Circles: {plan_df['circles'].sum()} ({plan_df['cached_circles'].sum()} cached)")
+    print(f"Expected requests: {round(plan_df['expected_requests'].sum())} ({round(pages_per_circle, 2)} pages per circle)")
+    print(f"Estimated cost: ${round(plan_df['estimated_cost'].sum(), 2)}")
+    if budget_dollars is not None:
+        print(f"Budget: ${budget_dollars}")
 
 # Single threaded mining procedure. 
 def single_thread_mine(gdfs):
@@ -215,14 +1591,21 @@ def single_thread_mine(gdfs):
     end = time.time()
     print(end - start)
 
-# Multi threaded mining procedure.
-def multi_thread_mine(gdfs, no_threads):
+# Multi threaded mining procedure. The threads share a work queue (see "queueJobs").
+def multi_thread_mine(gdf, no_threads):
     start = time.time()
     threads = no_threads
 
+    rows = [row for _, row in gdf.iterrows()]
+    job_queue = queueJobs(rows)
+    parts_left = multiprocessing.Array("i", len(rows))
+    for position, part, parts in job_queue:
+        parts_left[position] = parts
+    print(f"Jobs: {len(job_queue)} for {len(set([x[0] for x in job_queue]))} OAs")
+
     jobs = []
     for i in range(0, threads):
-        thread = multiprocessing.Process(target=do_work, args=(gdfs[i],))
+        thread = multiprocessing.Process(target=steal_work, args=(rows, job_queue, parts_left))
         jobs.append(thread)
 
     print("Threads: ",len(jobs))
@@ -239,5 +1622,59 @@ def multi_thread_mine(gdfs, no_threads):
     end = time.time()
     print(end - start)
 
+# Distributed mining procedure, run on every machine taking part in the mine. The
+# threads of all the machines share a work queue (see "lease_work").
+def distributed_mine(gdf, no_threads):
+    start = time.time()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    rows_by_oa = {row["geo_code"]:row for _, row in gdf.iterrows()}
+    enqueueDistributed(rows_by_oa.values())
+
+    jobs = []
+    for i in range(0, no_threads):
+        thread = multiprocessing.Process(target=lease_work, args=(rows_by_oa,))
+        jobs.append(thread)
+
+    for j in jobs:
+        j.start()
+
+    for j in jobs:
+        j.join()
+
+    end = time.time()
+    print(end - start)
+
+# Asynchronous mining procedure.
+def async_mine(gdf):
+    start = time.time()
+    asyncio.run(mine_oas_async(gdf))
+    end = time.time()
+    print(end - start)
+
+# Cache only mining procedure. Rebuilds every places file from the cached responses
+# without submitting a single request, e.g. after changing "fieldsToKeep".
+def replay_mine(gdf):
+    global cache_only
+    cache_only = True
+    existingOAs.clear()
+    start = time.time()
+    do_work(gdf)
+    end = time.time()
+    print(end - start)
+
+# Shared lattice mining procedure.
+def shared_grid_mine(gdf):
+    start = time.time()
+    asyncio.run(mine_shared_async(gdf))
+    end = time.time()
+    print(end - start)
+
+# Progressive mining procedure.
+def progressive_mine(gdf):
+    start = time.time()
+    asyncio.run(mine_progressive_async(gdf))
+    end = time.time()
+    print(end - start)
+
 # Script executer.
 scrape_places()
@@ -0,0 +1,120 @@
+"""Distributed mine work queue.
+
+Coordinator-free work queue shared by the worker processes of any number of
+machines, stored in a SQLite database on a shared filesystem. A job is a share of
+the circles of an OA, or the merge of the finished shares of an OA into its shard.
+
+Workers lease a job for a limited time and renew the lease with heartbeats while
+they work on it. The lease of a crashed worker expires and the job is leased again
+by another worker. Since every finished circle is journaled and every response is
+cached (both next to the queue), the circles already paid for by the crashed worker
+are not requested again. Completing a job is idempotent, so a worker that loses its
+lease can not corrupt the queue.
+
+The database is kept in rollback journal mode, as WAL mode requires shared memory
+and does not work on network filesystems. Lease expiries use the wall clock, which
+must be synchronised across machines.
+
+Input datasets:
+- None
+
+Output datasets:
+- mine_queue.sqlite
+"""
+
+import sqlite3
+import time
+
+# Part number of the job merging the shares of an OA.
+MERGE = -1
+
+# Open (and create if necessary) a queue database. Connections must not be shared
+# across processes or threads, each opens its own.
+def open_queue(path):
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            job TEXT PRIMARY KEY,
+            oa TEXT NOT NULL,
+            part INTEGER NOT NULL,
+            parts INTEGER NOT NULL,
+            weight REAL NOT NULL,
+            state TEXT NOT NULL,
+            worker TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL,
+            finished_at REAL
+        )""")
+    return conn
+
+# Return the key of a job.
+def get_job_key(oa, part):
+    return f"{oa}:{part}"
+
+# Add the jobs of an OA split in "parts" shares, and its merge job if it has more than
+# one. Adding jobs already in the queue has no effect, so every machine can enqueue.
+def put_oa_jobs(conn, oa, parts, weight):
+    jobs = [(get_job_key(oa, part), oa, part, parts, weight) for part in range(parts)]
+    if parts > 1:
+        jobs.append((get_job_key(oa, MERGE), oa, MERGE, parts, weight))
+
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "INSERT OR IGNORE INTO jobs (job, oa, part, parts, weight, state, attempts) VALUES (?, ?, ?, ?, ?, 'pending', 0)",
+        jobs
+    )
+    conn.execute("COMMIT")
+
+# Lease the next job: pending or with an expired lease, merges first and then the
+# heaviest OAs. A merge job is only leased once every share of its OA is done.
+# Returns None if no job can be leased at the moment.
+def lease_job(conn, worker, lease_seconds):
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute("""
+        SELECT job, oa, part, parts FROM jobs AS j
+        WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?))
+        AND (part != ? OR NOT EXISTS (
+            SELECT 1 FROM jobs AS p WHERE p.oa = j.oa AND p.part != ? AND p.state != 'done'
+        ))
+        ORDER BY part = ? DESC, weight DESC, oa, part
+        LIMIT 1""",
+        (now, MERGE, MERGE, MERGE)
+    ).fetchone()
+
+    if row is None:
+        conn.execute("COMMIT")
+        return None
+
+    conn.execute(
+        "UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE job = ?",
+        (worker, now + lease_seconds, row[0])
+    )
+    conn.execute("COMMIT")
+    return {"job": row[0], "oa": row[1], "part": row[2], "parts": row[3]}
+
+# Extend the lease of a job. Returns False if the lease was lost to another worker.
+def renew_lease(conn, job, worker, lease_seconds):
+    cursor = conn.execute(
+        "UPDATE jobs SET lease_expires = ? WHERE job = ? AND worker = ? AND state = 'leased'",
+        (time.time() + lease_seconds, job["job"], worker)
+    )
+    return cursor.rowcount == 1
+
+# Mark a job as done. Returns False if it was already done, e.g. by a worker that
+# leased it after this worker's lease expired.
+def complete_job(conn, job):
+    cursor = conn.execute(
+        "UPDATE jobs SET state = 'done', lease_expires = NULL, finished_at = ? WHERE job = ? AND state != 'done'",
+        (time.time(), job["job"])
+    )
+    return cursor.rowcount == 1
+
+# Return the number of jobs in each state.
+def count_jobs(conn):
+    return dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+# Return the number of jobs not done yet.
+def count_unfinished(conn):
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE state != 'done'").fetchone()[0]
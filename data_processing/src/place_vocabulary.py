@@ -0,0 +1,69 @@
+"""Place type vocabulary.
+
+Shared integer coding of the place types, used throughout the places stages of the
+data processing component instead of type name strings. Codes follow the order of
+the place types of the Places API docs, and any undocumented type met along the way
+is appended after them. Sets of types are represented as boolean masks indexed by
+code (membership bitsets), so that filtering, discovering and tallying types are
+vectorized integer operations over arrays of codes.
+
+Input datasets:
+- place_types.csv
+"""
+
+import numpy as np
+import pandas as pd
+
+# Labels of the Places API that describe the address of a place rather than what it
+# is. They are filtered out of the types of every place.
+FILTERED_TYPES = frozenset(["route", "locality", "sublocality", "sublocality_level_1", "neighborhood", "political"])
+
+# Load the vocabulary of the place types documented in the Places API docs.
+def load_vocabulary(DATA_DIR):
+    dataset = pd.read_csv(DATA_DIR + "raw_data/place_types/" + "place_types.csv")
+    return create_vocabulary(dataset["place_types"].to_list())
+
+# Create a vocabulary from a list of type names, coded in order.
+def create_vocabulary(names):
+    vocabulary = {"names": [], "codes": {}}
+    for name in names:
+        get_code(vocabulary, name)
+    return vocabulary
+
+# Return the code of a type, appending it to the vocabulary if it is unknown.
+def get_code(vocabulary, name):
+    code = vocabulary["codes"].get(name)
+    if code is None:
+        code = len(vocabulary["names"])
+        vocabulary["codes"][name] = code
+        vocabulary["names"].append(name)
+    return code
+
+# Return the codes of a list of types.
+def encode(vocabulary, names):
+    return np.array([get_code(vocabulary, x) for x in names], dtype=np.int32)
+
+# Return the types of an array of codes.
+def decode(vocabulary, codes):
+    return [vocabulary["names"][x] for x in codes.tolist()]
+
+# Encode the type lists of several places at once. Returns the flat codes and the
+# offsets of each place into them (CSR form).
+def encode_lists(vocabulary, type_lists):
+    offsets = np.zeros(len(type_lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(x) for x in type_lists])
+    codes = encode(vocabulary, [x for types_list in type_lists for x in types_list])
+    return (codes, offsets)
+
+# Return the membership mask of a set of types, indexed by code. It must be created
+# after every code it is applied to.
+def get_mask(vocabulary, names):
+    codes = encode(vocabulary, list(names))
+    mask = np.zeros(len(vocabulary["names"]), dtype=bool)
+    mask[codes] = True
+    return mask
+
+# Return the codes of a vocabulary of another origin (e.g. the type codes of the
+# places store) translated to this vocabulary, indexed by the foreign code.
+def translate(vocabulary, names):
+    return encode(vocabulary, list(names))
@@ -0,0 +1,116 @@
+"""Fused places pipeline.
+
+Single pass alternative to running, one after the other, the places consolidation
+("focused_data/places.py"), the place types discovery ("focused_data/place_types.py")
+and the place type tally ("processed_data/places.py"). Each of them reads the whole
+places dataset from disk again. Here the raw OA places files are read once, and each
+OA flows through a single chain of generators that filters the type labels, encodes
+the types with the place type vocabulary (see "place_vocabulary.py"), collects the
+types present and accumulates the counts of each type. The intermediate places store
+and "OA_places.json" are only written if requested.
+
+Input datasets:
+- Postcodes_OAs_classifications.csv
+- place_types.csv
+- 783 files stored in "raw_data/places"
+- OAs_geojson_wgs84.json (only if deduplication is set in "focused_data/places.py")
+
+Output datasets:
+- place_types.csv
+- place_types_supertypes.csv
+- place_types_supertypes_attractors.csv
+- place_types_supertypes_discriminant.csv
+- [Places]_counts_no_shared_scale.csv
+- [Places]_counts.csv
+- OA_places_store (if "write_store" is set)
+- OA_places.json (if "write_json" is set)
+"""
+
+import sys
+import os
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(PROJECT_ROOT)
+import multiprocessing
+import time
+import numpy as np
+import src.common as common
+import src.place_vocabulary as place_vocabulary
+import src.focused_data.places as focused_places
+import src.focused_data.place_types as place_types
+import src.processed_data.places as processed_places
+import src.processed_data.place_counts as place_counts
+
+################################################################################
+# Globals.
+################################################################################
+
+DATA_DIR = "/data/"
+write_store = False
+write_json = False
+
+################################################################################
+# Functions.
+################################################################################
+
+# Executer method.
+def run_places_pipeline(in_DATA_DIR):
+    start = time.time()
+    data_dir = common.CWD + in_DATA_DIR
+    focused_places.DATA_DIR = data_dir
+    place_types.DATA_DIR = data_dir
+    processed_places.DATA_DIR = data_dir
+
+    vocabulary = place_vocabulary.load_vocabulary(data_dir)
+    documented_count = len(vocabulary["names"])
+    oas = sorted(focused_places.get_oas())
+
+    with multiprocessing.Pool(focused_places.processes) as pool:
+        oa_maps = focused_places.iter_oa_places(pool, oas, vocabulary)
+        oa_maps = focused_places.save_places(oa_maps, vocabulary, write_store, write_json)
+        oa_codes = encode_places(oa_maps, vocabulary)
+        rows, codes, counts = accumulate_counts(oa_codes, oas)
+
+    # Place types present in the OAs, among the documented ones.
+    present = np.bincount(codes, weights=counts, minlength=len(vocabulary["names"])) > 0
+    present[documented_count:] = False
+    oa_place_types = set(place_vocabulary.decode(vocabulary, np.nonzero(present)[0]))
+
+    place_types.generate_place_types_dataset(oa_place_types)
+    place_types.generate_place_types_dataset_supertypes(oa_place_types)
+    place_types.generate_place_types_dataset_supertypes_attractors(oa_place_types)
+    place_types.generate_place_types_dataset_supertype_discriminant(oa_place_types)
+
+    types = sorted(oa_place_types)
+    columns = place_vocabulary.translate(place_vocabulary.create_vocabulary(types), vocabulary["names"])[codes]
+    kept = columns < len(types)
+    matrix = place_counts.create_matrix(rows[kept], columns[kept], counts[kept], oas, types)
+    processed_places.save_place_tally(place_counts.to_dataframe(matrix))
+
+    print(f"Places pipeline: {len(oas)} OAs - {len(types)} place types - {round(time.time() - start, 2)}s")
+
+# Yield the type codes of the places of each OA, with the offsets of each place.
+def encode_places(oa_maps, vocabulary):
+    for oa, oa_map in oa_maps:
+        codes, offsets = place_vocabulary.encode_lists(vocabulary, [x["types"] for x in oa_map.values()])
+        yield (oa, codes, offsets)
+
+# Accumulate the count of each type code in each OA, in coordinate form. Returns the
+# OA rows, the type codes and the counts.
+def accumulate_counts(oa_codes, oas):
+    row_of_oa = {oa:i for i, oa in enumerate(oas)}
+    rows = []
+    codes = []
+    counts = []
+    for oa, oa_type_codes, offsets in oa_codes:
+        unique_codes, unique_counts = np.unique(oa_type_codes, return_counts=True)
+        rows.append(np.full(len(unique_codes), row_of_oa[oa], dtype=np.int64))
+        codes.append(unique_codes)
+        counts.append(unique_counts)
+
+    if len(rows) == 0:
+        return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0))
+    return (np.concatenate(rows), np.concatenate(codes).astype(np.int32), np.concatenate(counts).astype(np.float64))
+
+# Script executer.
+if __name__ == "__main__":
+    run_places_pipeline(DATA_DIR)
@@ -30,6 +30,7 @@ Output datasets:
 """
 
 import src.common as common
+import src.processed_data.normalization as normalization
 import pandas as pd
 import numpy as np
 from pandas.api.types import is_numeric_dtype
@@ -296,11 +297,9 @@ def oa_coicop_directory():
     # for col in COLS: 
     #     coicop_directory_df[col + "_percentage_in_OA_shared_scale"] = coicop_directory_df[col + "_norm_pop"]
 
-    for col in COLS:
-        coicop_directory_df["[average_per_person_in_OA] - " + col] = coicop_directory_df[col] / coicop_directory_df["Total Population 2019"]
-
-    for col in COLS:
-        coicop_directory_df["[shared_scale] - [average_per_person_in_OA] - " + col] = coicop_directory_df["[average_per_person_in_OA] - " + col]
+    coicop_directory_df = normalization.apply_specs(coicop_directory_df, [
+        {"columns": COLS, "prefix": "[average_per_person_in_OA] - ", "divisor": "Total Population 2019"}
+    ])
 
     # temp = []
     # for col in coicop_directory_df.columns:
@@ -308,8 +307,7 @@ def oa_coicop_directory():
 
     # print(temp)
 
-    for col in COLS:
-        coicop_directory_df = coicop_directory_df.rename(columns={col: "[sum_in_OA] - " + col})
+    coicop_directory_df = coicop_directory_df.rename(columns={col: "[sum_in_OA] - " + col for col in COLS})
 
     coicop_directory_df = coicop_directory_df.drop(columns=["Total Households 2019", "Total Population 2019"])
     coicop_directory_df = coicop_directory_df.fillna(0)
@@ -379,10 +377,10 @@ def oa_paycheck_directory(postcode_oa_df):
     normalizers = pd.read_csv(DATA_DIR + "processed_data/normalizers/" + "[OA]_Normalizing_properties.csv")
     normalizers = normalizers[["OA", "OA_area_meters", "OA_area_meters_sqrt", "OA_area_meters_sqrt_or_limit"]]
     merged = pd.merge(normalizers, grouped_df, on="OA")
-    for c in ["Total Households"]:
-        # Eliminates a little bit of the outliers and brightens the plot.
-        merged[c+"_per_sq_meter"] = round(merged[c] / merged["OA_area_meters_sqrt_or_limit"],common.DPs)
-    grouped_df = merged
+    # Eliminates a little bit of the outliers and brightens the plot.
+    grouped_df = normalization.apply_specs(merged, [
+        {"columns": ["Total Households"], "names": ["Total Households_per_sq_meter"], "divisor": "OA_area_meters_sqrt_or_limit", "decimals": common.DPs}
+    ])
 
     # Normalize by households.
     COLS = []
@@ -390,14 +388,11 @@ def oa_paycheck_directory(postcode_oa_df):
         if i not in dist_cols + non_numeric_cols + ["Total Households", "Total Households_per_sq_meter", "OA_area_meters", "OA_area_meters_sqrt", "OA_area_meters_sqrt_or_limit", "Lower Quartile"]:
             COLS.append(i)
 
-    for col in COLS:
-        grouped_df["[%_in_OA] - " + col] = (grouped_df[col] / grouped_df["Total Households"]) * 100
-    
-    for col in COLS:
-        grouped_df["[shared_scale] - [%_in_OA] - " + col] = grouped_df["[%_in_OA] - " + col]
+    grouped_df = normalization.apply_specs(grouped_df, [
+        {"columns": COLS, "prefix": "[%_in_OA] - ", "divisor": "Total Households", "scale": 100}
+    ])
 
-    for col in COLS:
-        grouped_df = grouped_df.rename(columns={col: "[count_in_OA] - " + col})
+    grouped_df = grouped_df.rename(columns={col: "[count_in_OA] - " + col for col in COLS})
 
     grouped_df = grouped_df.drop(columns=["Total Households", "Total Households_per_sq_meter", "OA_area_meters", "OA_area_meters_sqrt", "OA_area_meters_sqrt_or_limit"])
 
@@ -516,27 +511,20 @@ def oa_age_gender_distribution(postcode_oa_df):
     new_df["Males total"] = grouped_df["Males"]
 
     COLS = []
+    counts = {}
     # Use the AGE_GROUPED_COLUMNS map to compute new columns.
     for gender in AGE_GROUPED_COLUMNS.keys():
         for group in AGE_GROUPED_COLUMNS[gender].keys():
             c = f"{gender} - {group}"
             COLS.append(c)
             cols_to_sum = AGE_GROUPED_COLUMNS[gender][group]
-            new_df[f"[count] - {c}"] = grouped_df.loc[:, cols_to_sum].sum(axis=1)
+            counts[f"[count] - {c}"] = grouped_df.loc[:, cols_to_sum].sum(axis=1)
+    new_df = pd.concat([new_df, pd.DataFrame(counts)], axis=1)
 
     # Normalizing by population works better than by households.
-    for col in COLS:
-        new_df["[%_in_OA] - " + col] = (new_df["[count] - " + col] / new_df["Total population"]) * 100
-
-    temp = []
-
-    # Compute derived columns.
-    for gender in AGE_GROUPED_COLUMNS.keys():
-        for group in AGE_GROUPED_COLUMNS[gender].keys():
-            if gender == "Total":
-                c = f"{gender} - {group}"
-                temp.append(f"[shared_scale] - [%_in_OA] - {c}")
-                new_df[f"[shared_scale] - [%_in_OA] - {c}"] = new_df["[%_in_OA] - " + c]
+    new_df = normalization.apply_specs(new_df, [
+        {"columns": ["[count] - " + col for col in COLS], "names": ["[%_in_OA] - " + col for col in COLS], "divisor": "Total population", "scale": 100}
+    ])
 
     new_df = new_df.drop(columns=["Total households", "Total population"])
 
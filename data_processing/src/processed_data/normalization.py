@@ -0,0 +1,81 @@
+"""Declarative column normalization.
+
+Normalization variants are declared as specs instead of per-column loops. A spec is
+a dictionary describing a block of new columns computed from a block of numeric
+columns of a dataframe:
+- "columns": the numerator columns.
+- "names": the names of the new columns, or "prefix" to prepend to the numerator names.
+- "divisor" / "multiplier": a column dividing / multiplying every numerator column.
+- "of_total": whether to divide each numerator column by its own total.
+- "scale": a constant multiplying the result.
+- "sqrt": whether to take the square root of the result.
+- "clip": (lower, upper) limits of the result, None for no limit.
+- "cap": (threshold, value) replacing the results above the threshold by the value.
+- "decimals": the number of decimal places to round the result to.
+Every key but "columns" is optional. A spec is compiled into a few broadcast NumPy
+operations over the whole block, and the blocks of many specs are joined to the
+dataframe at once, so no dataframe is grown column by column. A spec can use the
+columns of the specs before it.
+
+Input datasets:
+- None
+
+Output datasets:
+- None
+"""
+
+import numpy as np
+import pandas as pd
+
+# Return the names of the columns of a spec.
+def get_names(spec):
+    if "names" in spec:
+        return list(spec["names"])
+    return [spec.get("prefix", "") + x for x in spec["columns"]]
+
+# Return columns as a float block, looking first at the columns already computed.
+def get_values(df, computed, columns):
+    if not any(x in computed for x in columns):
+        return df[columns].to_numpy(dtype=np.float64)
+    return np.column_stack([computed[x] if x in computed else df[x].to_numpy(dtype=np.float64) for x in columns])
+
+# Compute the block of columns of a spec. Returns an array with a column per name.
+def compute_block(df, spec, computed=None):
+    computed = computed or {}
+    block = get_values(df, computed, spec["columns"])
+
+    if "divisor" in spec:
+        block = block / get_values(df, computed, [spec["divisor"]])
+    if "multiplier" in spec:
+        block = block * get_values(df, computed, [spec["multiplier"]])
+    if spec.get("of_total", False):
+        block = block / np.nansum(block, axis=0)
+    if "scale" in spec:
+        block = block * spec["scale"]
+    if spec.get("sqrt", False):
+        block = np.sqrt(block)
+    if "clip" in spec:
+        block = np.clip(block, spec["clip"][0], spec["clip"][1])
+    if "cap" in spec:
+        block = np.where(block > spec["cap"][0], spec["cap"][1], block)
+    if "decimals" in spec:
+        block = np.round(block, spec["decimals"])
+
+    return block
+
+# Compute the columns of several specs, in order. Returns them as a dataframe with the
+# index of the input dataframe.
+def compute_specs(df, specs):
+    computed = {}
+    for spec in specs:
+        block = compute_block(df, spec, computed)
+        for i, name in enumerate(get_names(spec)):
+            computed[name] = block[:, i]
+    return pd.DataFrame(computed, index=df.index)
+
+# Return the dataframe joined with the columns of several specs. Columns of the
+# dataframe with the name of a new column are replaced.
+def apply_specs(df, specs):
+    new_columns = compute_specs(df, specs)
+    kept = df.drop(columns=[x for x in new_columns.columns if x in df.columns])
+    return pd.concat([kept, new_columns], axis=1)
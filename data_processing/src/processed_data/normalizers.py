@@ -13,12 +13,37 @@ Output datasets:
 """
 
 import src.common as common
+import src.processed_data.normalization as normalization
 import pandas as pd
 import numpy as np
-import math
 
 DATA_DIR = ""
 
+# Derived normalizer columns (see "normalization.py").
+NORMALIZER_SPECS = [
+    {"columns": ["OA_area_meters"], "names": ["OA_area_meters_sqrt"], "sqrt": True},
+    # Limit of the area per meter column.
+    {"columns": ["OA_area_meters_sqrt"], "names": ["OA_area_meters_sqrt_or_limit"], "clip": (100, None)},
+    {"columns": ["OA_households"], "names": ["OA_households_per_meter"], "divisor": "OA_area_meters"},
+    # Limit of the households per meter column. Alternatives: halving or square root.
+    {"columns": ["OA_households_per_meter"], "names": ["OA_households_per_meter_or_limit"], "cap": (0.031, 0.02)},
+    {"columns": ["OA_population"], "names": ["OA_population_per_meter"], "divisor": "OA_area_meters"},
+    {"columns": ["OA_population"], "names": ["OA_population_per_meter_sqrt"], "divisor": "OA_area_meters_sqrt"}
+]
+
+NORMALIZER_COLUMNS = [
+    "OA",
+    "OA_area_meters",
+    "OA_area_meters_sqrt",
+    "OA_area_meters_sqrt_or_limit",
+    "OA_households",
+    "OA_households_per_meter",
+    "OA_households_per_meter_or_limit",
+    "OA_population",
+    "OA_population_per_meter",
+    "OA_population_per_meter_sqrt"
+]
+
 # Executer method.
 def process_normalizers(in_DATA_DIR):
     global DATA_DIR
@@ -28,22 +53,6 @@ def process_normalizers(in_DATA_DIR):
     # Previous name: OA_normalizers.csv
     common.save_dataframe_to_csv(DATA_DIR + "processed_data/normalizers/", normalizers_df, "[OA]_Normalizing_properties.csv")
 
-# Dataframe function defining what the "limit" is for the area per meter column.
-def area_limit(x):
-    result = max(x, 100)
-    # if x < 4000:
-    #     result = (x * 2)
-    return result
-
-# Dataframe function defining what the "limit" is for the households per meter column.
-def house_limit(x):
-    if x > 0.031:
-        # return x / 2
-        return 0.02
-        # return math.sqrt(x)
-    else:
-        return x
-
 # Defines groupby aggregation functions for columns based on their type.
 def generate_aggregation_map_age(column_types):
     dict = {}
@@ -86,13 +95,8 @@ def generate_dataset(OA_age_dist):
 
     normalizers["OA"] = merged["OA"]
     normalizers["OA_area_meters"] = merged["polygon_area_meters"]
-    normalizers["OA_area_meters_sqrt"] = normalizers["OA_area_meters"].apply(lambda x: math.sqrt(x))
-    normalizers["OA_area_meters_sqrt_or_limit"] = normalizers["OA_area_meters_sqrt"].apply(lambda x: area_limit(x))
     normalizers["OA_households"] = merged["Total households"]
-    normalizers["OA_households_per_meter"] = normalizers["OA_households"] / normalizers["OA_area_meters"]
-    normalizers["OA_households_per_meter_or_limit"] = normalizers["OA_households_per_meter"].apply(lambda x: house_limit(x))
     normalizers["OA_population"] = merged["Total population"]
-    normalizers["OA_population_per_meter"] = normalizers["OA_population"] / normalizers["OA_area_meters"]
-    normalizers["OA_population_per_meter_sqrt"] = normalizers["OA_population"] / normalizers["OA_area_meters_sqrt"]
+    normalizers = normalization.apply_specs(normalizers, NORMALIZER_SPECS)
 
-    return normalizers
+    return normalizers[NORMALIZER_COLUMNS]
@@ -0,0 +1,148 @@
+"""Sparse OA by place type counts.
+
+Builds the OA by place type count matrix from the places store (see
+"focused_data/places_store.py") in a single vectorized pass over its columns. Each
+type occurrence of each place is mapped to an integer OA row and an integer type
+column, and the occurrences are summed into a sparse matrix in CSR form. Most OAs
+only hold a few of the place types, so the matrix stays small at any scale, and it
+is only made dense to produce the tabular outputs.
+
+A matrix is a dictionary holding the CSR arrays ("indptr", "indices" and "data"),
+the OA of each row ("oas") and the place type of each column ("types"). It is saved
+as an uncompressed ".npz" archive of those arrays, the sparse on-disk counterpart of
+the mostly-zero "[Places]_counts*.csv" datasets. The loaders below only densify the
+columns and rows a downstream stage asks for.
+
+Input datasets:
+- None
+
+Output datasets:
+- None
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import src.place_vocabulary as place_vocabulary
+
+# Create a matrix from coordinate triplets, summing the values of repeated cells.
+def create_matrix(rows, columns, values, oas, types):
+    keys = rows.astype(np.int64) * len(types) + columns
+    cells, inverse = np.unique(keys, return_inverse=True)
+    data = np.bincount(inverse.ravel(), weights=values, minlength=len(cells))
+    indptr = np.zeros(len(oas) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(cells // len(types), minlength=len(oas)))
+
+    return {
+        "indptr": indptr,
+        "indices": (cells % len(types)).astype(np.int32),
+        "data": data,
+        "oas": list(oas),
+        "types": list(types)
+    }
+
+# Count the places of each of the given types in each of the given OAs. Requires the
+# "oa_codes", "oa_offsets", "type_offsets", "type_indices" and "type_codes" columns
+# of the store. OAs without places are kept as empty rows.
+def tally(store, oas, types):
+    oas = list(oas)
+    types = list(types)
+    columns = place_vocabulary.translate(place_vocabulary.create_vocabulary(types), store["type_codes"])
+
+    rows = np.full(len(store["oa_codes"]), -1, dtype=np.int64)
+    for i, oa in enumerate(oas):
+        j = store["oa_lookup"].get(oa)
+        if j is not None:
+            rows[j] = i
+
+    place_rows = np.repeat(rows, np.diff(store["oa_offsets"]))
+    entry_rows = np.repeat(place_rows, np.diff(store["type_offsets"]))
+    entry_columns = columns[store["type_indices"]]
+    kept = (entry_rows >= 0) & (entry_columns < len(types))
+
+    return create_matrix(entry_rows[kept], entry_columns[kept], np.ones(np.count_nonzero(kept)), oas, types)
+
+# Return the dense dataframe of a matrix, with an "OA" column followed by a column per
+# place type.
+def to_dataframe(matrix):
+    dense = np.zeros((len(matrix["oas"]), len(matrix["types"])))
+    dense[get_rows(matrix), matrix["indices"]] = matrix["data"]
+
+    df = pd.DataFrame(dense, columns=matrix["types"])
+    df.insert(0, "OA", matrix["oas"])
+    return df
+
+# Create a matrix from the type columns of a dense dataframe with an "OA" column,
+# keeping only its non zero cells.
+def from_dataframe(df, types):
+    values = df[types].to_numpy(dtype=np.float64)
+    rows, columns = np.nonzero(values)
+    return create_matrix(rows, columns, values[rows, columns], df["OA"].to_list(), types)
+
+# Save a matrix.
+def save_matrix(out_dir, matrix, name):
+    np.savez(out_dir + name, indptr=matrix["indptr"], indices=matrix["indices"], data=matrix["data"], oas=np.array(matrix["oas"], dtype=str), types=np.array(matrix["types"], dtype=str))
+
+# Load a matrix.
+def load_matrix(path):
+    archive = np.load(path)
+    return {
+        "indptr": archive["indptr"],
+        "indices": archive["indices"],
+        "data": archive["data"],
+        "oas": archive["oas"].tolist(),
+        "types": archive["types"].tolist()
+    }
+
+# Return the row of each stored value of a matrix.
+def get_rows(matrix):
+    return np.repeat(np.arange(len(matrix["oas"])), np.diff(matrix["indptr"]))
+
+# Return the matrix restricted to the given types, in their order, without densifying
+# it. Unknown types are empty columns.
+def select_types(matrix, types):
+    types = list(types)
+    columns = place_vocabulary.translate(place_vocabulary.create_vocabulary(types), matrix["types"])[matrix["indices"]]
+    kept = columns < len(types)
+    return create_matrix(get_rows(matrix)[kept], columns[kept], matrix["data"][kept], matrix["oas"], types)
+
+# Return the dense values of a single type column.
+def get_column(matrix, t):
+    column = np.zeros(len(matrix["oas"]))
+    stored = matrix["indices"] == matrix["types"].index(t)
+    column[get_rows(matrix)[stored]] = matrix["data"][stored]
+    return column
+
+# Return the sum of each type column.
+def get_column_sums(matrix):
+    return np.bincount(matrix["indices"], weights=matrix["data"], minlength=len(matrix["types"]))
+
+# Return the matrix with each type column multiplied by a factor.
+def scale_columns(matrix, factors):
+    scaled = dict(matrix)
+    scaled["data"] = matrix["data"] * factors[matrix["indices"]]
+    return scaled
+
+# Return the dense product of a matrix by a weights array with a row per type, i.e.
+# the weighted sum of the type columns of each OA.
+def dot(matrix, weights):
+    rows = get_rows(matrix)
+    products = matrix["data"][:, None] * weights[matrix["indices"]]
+    result = np.zeros((len(matrix["oas"]), weights.shape[1]))
+    for j in range(weights.shape[1]):
+        result[:, j] = np.bincount(rows, weights=products[:, j], minlength=len(matrix["oas"]))
+    return result
+
+# Create the matrix of a places counts CSV file, ignoring any column other than the
+# place types.
+def read_counts_csv(path):
+    df = pd.read_csv(path)
+    types = [x for x in df.columns[1:] if x != "OA" and not x.startswith("[shared_scale]")]
+    return from_dataframe(df, types)
+
+# Load the matrix of a places counts dataset, named without extension. A dataset only
+# saved as a CSV file so far is read from it, without writing its sparse version.
+def load_counts(places_dir, name):
+    if not os.path.isfile(places_dir + name + ".npz"):
+        return read_counts_csv(places_dir + name + ".csv")
+    return load_matrix(places_dir + name + ".npz")
@@ -1,15 +1,22 @@
 """Place type by OA tally. 
 
-From the OA_places.json file, it reduces the complexity of the dataset by tabulating
+From the OA places store, it reduces the complexity of the dataset by tabulating
 the count of each place type per OA. Further normalization operations on the vanilla
-tally dataset are then applied.
+tally dataset are then applied. Every dataset is also saved in a sparse format (see
+"place_counts.py"), read by the downstream stages instead of the CSV files.
+
+If "provisional" is set, the provisional tally published by the progressive mine
+(see "focused_data/run_scrape_places.py") replaces the tally read by this and the
+downstream stages, which can then run on the partial data of an ongoing mine. The
+CSV tally is left untouched, and running again with "provisional" unset restores it.
 
 Input datasets:
 - place_types.csv
-- OA_places.json
+- OA_places_store
 - Postcodes_OAs_classifications.csv
 - [OA]_Normalizing_properties.csv
 - [Places]_counts.csv (requested after the script generates it)
+- [Places]_counts_provisional.npz (only if "provisional" is set)
 
 Output datasets:
 - [Places]_counts_normalized_by_OA_effective_area.csv
@@ -17,15 +24,22 @@ Output datasets:
 - [Places]_counts_normalized_by_household_per_meter_bound.csv
 - [Places]_counts_no_shared_scale.csv
 - [Places]_counts.csv
+- [Places]_counts_normalized_by_OA_effective_area.npz
+- [Places]_counts_normalized_by_household_per_meter.npz
+- [Places]_counts_normalized_by_household_per_meter_bound.npz
+- [Places]_counts.npz
 """
 
 import src.common as common
+import src.place_vocabulary as place_vocabulary
 import pandas as pd
-import json
-import numpy as np
+import src.focused_data.places_store as places_store
+import src.processed_data.place_counts as place_counts
+import src.processed_data.normalization as normalization
 from pandas.api.types import is_numeric_dtype
 
 DATA_DIR = ""
+provisional = False
 
 # Executer method. The time consuming operations are disabled by default.
 def process_places(in_DATA_DIR):
@@ -35,6 +49,7 @@ def process_places(in_DATA_DIR):
     # oas = get_oas()
     # oa_place_types = get_OA_place_types(possible_place_types, oas)
     # tally_place_types_in_OA(oa_place_types, oas)
+    convert_place_tally()
     normalise_oa_place_tally()
 
 ################################################################################
@@ -62,120 +77,85 @@ def get_oas():
 def get_OA_place_types(possible_place_types, oas):
     # Get place types present in the Westminster data.
     # Maybe get the frequency with which each subset appears in one entity?
-    types = set()
-
-    f = open(DATA_DIR + "focused_data/places/" + "OA_places.json")
-    data = json.load(f)
-
-    for oa in oas:
-        for k in data[oa].keys():
-            types_list = data[oa][k]["types"]
-            
-            for t in types_list:
-                if t in possible_place_types:
-                    types.add(t)
-                
+    columns = ["oa_codes", "oa_offsets", "type_offsets", "type_indices", "type_codes"]
+    store = places_store.load_store(DATA_DIR + "focused_data/places/" + "OA_places_store", columns)
+    vocabulary = place_vocabulary.load_vocabulary(DATA_DIR)
+    codes = place_vocabulary.translate(vocabulary, store["type_codes"])[places_store.get_type_codes_in_oas(store, oas)]
+    possible = place_vocabulary.get_mask(vocabulary, possible_place_types)
+    types = set(place_vocabulary.decode(vocabulary, codes[possible[codes]]))
     return types
 
 ################################################################################
 # Relevant dataset generation.
 ################################################################################
 
-# Generates the count of each place type by OA dataset.
+# Generates the count of each place type by OA dataset, as a sparse matrix built in
+# one pass over the places store (see "place_counts.py").
 def tally_place_types_in_OA(place_types_list, oas):
     sorted_places_types_list = list(place_types_list)
     sorted_places_types_list.sort()
 
-    OA_place_tally = pd.DataFrame(columns = (["OA"] + sorted_places_types_list))
-
-    f = open(DATA_DIR + "focused_data/places/" + "OA_places.json")
-    data = json.load(f)
-
-    counter = 1
-
-    for oa in oas:
-        print(f"{counter} - {oa}")
-        OA_place_tally = OA_place_tally.append({"OA":oa}, ignore_index=True)
-        OA_place_tally = OA_place_tally.replace(np.nan, 0)
-
-        for k in data[oa].keys():
-            types_list = data[oa][k]["types"]
-
-            for t in types_list:
-                if t in place_types_list:
-                    OA_place_tally.loc[OA_place_tally["OA"] == oa, t] = OA_place_tally.loc[OA_place_tally["OA"] == oa, t] + 1
-        
-        counter = counter + 1
+    columns = ["oa_codes", "oa_offsets", "type_offsets", "type_indices", "type_codes"]
+    store = places_store.load_store(DATA_DIR + "focused_data/places/" + "OA_places_store", columns)
+    counts = place_counts.tally(store, sorted(oas), sorted_places_types_list)
+    OA_place_tally = place_counts.to_dataframe(counts)
 
     print(OA_place_tally)
+    save_place_tally(OA_place_tally)
 
-    for col in sorted_places_types_list:
-        OA_place_tally = OA_place_tally.rename(columns={col: f"{col}"})
-
+# Saves the count of each place type by OA dataset. The shared scale columns are no
+# longer added (see "tabular_metadata.py"), so "[Places]_counts_no_shared_scale.csv"
+# is a copy of "[Places]_counts.csv", kept for the consumers not yet reading the latter.
+def save_place_tally(OA_place_tally):
     OA_place_tally = round_numeric_columns(OA_place_tally)
+    types = OA_place_tally.columns.to_list()[1:]
+    place_counts.save_matrix(DATA_DIR + "processed_data/places/", place_counts.from_dataframe(OA_place_tally, types), "[Places]_counts.npz")
     # Previous name: OA_place_tally.csv
     common.save_dataframe_to_csv(DATA_DIR + "processed_data/places/", OA_place_tally, "[Places]_counts_no_shared_scale.csv")
-    OA_place_tally = add_shared_scale_columns(OA_place_tally)
     common.save_dataframe_to_csv(DATA_DIR + "processed_data/places/", OA_place_tally, "[Places]_counts.csv")
 
+# Saves the sparse version of the count of each place type by OA dataset from its CSV
+# file, which is the tally when it is not generated by this run, or from the
+# provisional tally.
+def convert_place_tally():
+    if provisional:
+        counts = place_counts.load_matrix(DATA_DIR + "processed_data/places/" + "[Places]_counts_provisional.npz")
+    else:
+        counts = place_counts.read_counts_csv(DATA_DIR + "processed_data/places/" + "[Places]_counts.csv")
+    place_counts.save_matrix(DATA_DIR + "processed_data/places/", counts, "[Places]_counts.npz")
+
 # Generates 3 normalization variants on the original tally:
 # 1. Normalized by effective area.
 # 2. Normalized by households.
 # 3. Normalized by households with an applied limit.
 def normalise_oa_place_tally():
     normalizers = pd.read_csv(DATA_DIR + "processed_data/normalizers/" + "[OA]_Normalizing_properties.csv")
-    oa_type_tally = pd.read_csv(DATA_DIR + "processed_data/places/" + "[Places]_counts.csv")
-    oa_type_tally = oa_type_tally.drop(['Unnamed: 0'], axis=1)
+    oa_type_tally = place_counts.to_dataframe(place_counts.load_counts(DATA_DIR + "processed_data/places/", "[Places]_counts"))
     normalizers = normalizers[["OA", "OA_area_meters", "OA_area_meters_sqrt", "OA_households_per_meter", "OA_households_per_meter_or_limit"]]
 
     # print(normalizers)
     # print(oa_type_tally)
 
     merged = pd.merge(normalizers, oa_type_tally, on="OA")
-    
-    # Normalize by area.
-    normalized_by_effective_area = pd.DataFrame()
-    normalized_by_effective_area["OA"] = merged["OA"]
-    for c in merged.loc[:, "accounting":"zoo"]:
-        # Attempt at trying other normalization options.
-        # sum_col = merged[c].sum(axis=0)
-        # print(c, sum_col)
-        # merged[c+"_test"] = merged[c] / sum_col
+    types = oa_type_tally.columns.to_list()[1:]
 
+    # Normalization variants (see "normalization.py").
+    variants = {
         # Square root of area creates a much better estimate. Usable/buildable area of OAs in London is well estimated 
         # by the square root of the total area.
-
-        # merged[c+"_by_area_sqr"] = merged[c] / merged["OA_area_meters_sqrt"]
-        normalized_by_effective_area[c] = merged[c] / merged["OA_area_meters_sqrt"]
-    normalized_by_effective_area = add_shared_scale_columns(normalized_by_effective_area)
-    common.save_dataframe_to_csv(DATA_DIR + "processed_data/places/", normalized_by_effective_area, "[Places]_counts_normalized_by_OA_effective_area.csv")
-
-    # Normalize by households.
-    normalized_by_household_per_meter = pd.DataFrame()
-    normalized_by_household_per_meter["OA"] = merged["OA"]
-    for c in merged.loc[:, "accounting":"zoo"]:
+        "[Places]_counts_normalized_by_OA_effective_area": {"columns": types, "divisor": "OA_area_meters_sqrt"},
         # Accurate regarding number of homes but not indicative of much information.
-        # merged[c+"_by_house_per_meter"] = merged[c] * merged["OA_households_per_meter"]
-        normalized_by_household_per_meter[c] = merged[c] * merged["OA_households_per_meter"]
-    normalized_by_household_per_meter = add_shared_scale_columns(normalized_by_household_per_meter)
-    common.save_dataframe_to_csv(DATA_DIR + "processed_data/places/", normalized_by_household_per_meter, "[Places]_counts_normalized_by_household_per_meter.csv")
-
-    # Normalize by households limit.
-    normalized_by_household_per_meter_bounded = pd.DataFrame()
-    normalized_by_household_per_meter_bounded["OA"] = merged["OA"]
-    for c in merged.loc[:, "accounting":"zoo"]:
+        "[Places]_counts_normalized_by_household_per_meter": {"columns": types, "multiplier": "OA_households_per_meter"},
         # Lightens up the map from above.
-        # merged[c+"_by_house_per_meter_or_limit"] = merged[c] * merged["OA_households_per_meter_or_limit"]
-        normalized_by_household_per_meter_bounded[c] = merged[c] * merged["OA_households_per_meter_or_limit"]
-    normalized_by_household_per_meter_bounded = add_shared_scale_columns(normalized_by_household_per_meter_bounded)
-    common.save_dataframe_to_csv(DATA_DIR + "processed_data/places/", normalized_by_household_per_meter_bounded, "[Places]_counts_normalized_by_household_per_meter_bound.csv")
-
-# Adds a selection of columns that contain a prefix that will cause visualizations
-# to render on a shared scale in the user interface.
-def add_shared_scale_columns(df):
-    exempt_columns = ["establishment", "point_of_interest", "health", "doctor", "food", "store"]
-    for col in df.loc[:, "accounting":"zoo"].columns:
-        if col not in exempt_columns:
-            df[f"[shared_scale] - {col}"] = df[col]
-        
-    return df
+        "[Places]_counts_normalized_by_household_per_meter_bound": {"columns": types, "multiplier": "OA_households_per_meter_or_limit"}
+    }
+
+    for name, spec in variants.items():
+        normalized = pd.concat([merged[["OA"]], normalization.compute_specs(merged, [spec])], axis=1)
+        save_sparse_variant(normalized, name + ".npz")
+        common.save_dataframe_to_csv(DATA_DIR + "processed_data/places/", normalized, name + ".csv")
+
+# Saves the sparse version of a normalized tally variant.
+def save_sparse_variant(df, name):
+    types = df.columns.to_list()[1:]
+    place_counts.save_matrix(DATA_DIR + "processed_data/places/", place_counts.from_dataframe(df, types), name)
@@ -3,9 +3,11 @@
 Taking as an input the place tally datasets and the demographic distribution models
 this file computes an estimate for the demographic distribution density per OA of
 the 6 defined demographic types. Intermediate steps to computation are applied.
+The place tally is kept in its sparse format (see "place_counts.py") until it is
+reduced to the 6 demographic types.
 
 Input datasets:
-- [Places]_counts_no_shared_scale.csv
+- [Places]_counts.npz
 - [OA]_Normalizing_properties.csv
 - place_types_granular.csv
 - place_types_supertypes.csv
@@ -27,9 +29,11 @@ Output datasets:
 """
 
 import src.common as common
+import src.processed_data.place_counts as place_counts
+import src.processed_data.normalization as normalization
 import pandas as pd
+import numpy as np
 from pandas.api.types import is_numeric_dtype
-import math
 
 DATA_DIR = ""
 TOTAL_DAYTIME_POPULATION = 1000000 # Estimate backed with evidence.
@@ -100,8 +104,7 @@ def process_places_demographic_densities(in_DATA_DIR):
     global DATA_DIR
     DATA_DIR = common.CWD + in_DATA_DIR
 
-    places_tally = pd.read_csv(DATA_DIR + "processed_data/places/" + "[Places]_counts_no_shared_scale.csv")
-    places_tally = places_tally.drop(columns=["Unnamed: 0"])
+    places_tally = place_counts.load_counts(DATA_DIR + "processed_data/places/", "[Places]_counts")
     
     # Not including this also generates very nice results.
     places_tally = normalize_place_tally_by_type_count(places_tally)
@@ -138,10 +141,10 @@ def process_places_demographic_densities(in_DATA_DIR):
 
         result = round_numeric_columns(result)
 
-        if poc: # If it is Prove Of Concept, don't clean it or add shared columns.
+        if poc: # If it is Prove Of Concept, don't clean it or split it.
             common.save_dataframe_to_csv(DATA_DIR + "processed_data/demographic_distributions/", result, filename_to_save)
         else:   
-            datasets_to_save = split_dataset_and_introduce_scale_sharing_and_save(result)
+            datasets_to_save = split_dataset_by_scope(result)
             # datasets_to_save[0] is OA scope
             # datasets_to_save[1] is borough scope
             common.save_dataframe_to_csv(DATA_DIR + "processed_data/demographic_distributions/", datasets_to_save[0], filename_to_save+"_OA_scope.csv")
@@ -168,15 +171,13 @@ def normalize_place_tally_by_type_count(tally):
     # Works well for countering the effects of supertypes like "establishment".
     # This simulates unique places attracting more people. E.g. museums vs art galleries.
     ##################################################################################
-    types_counts = tally.loc[:, "accounting":].sum()
+    types_counts = place_counts.get_column_sums(tally)
     
     # print(types_counts)
-    # print(tally["bar"])
 
     # Recalculate type counts, dividing each by a metric of their column total.
-    for c in tally.columns[1:]:
-        tally[c] = tally[c] / math.sqrt(types_counts[c])
-        # tally[c] = tally[c] / types_counts[c]
+    tally = place_counts.scale_columns(tally, 1 / np.sqrt(types_counts))
+    # tally = place_counts.scale_columns(tally, 1 / types_counts)
     
     # print(tally)
     # print(tally["bar"])
@@ -201,25 +202,14 @@ def apply_relevance_multiplier_to_demographic_distributions(dists):
     return dists    
 
 def multiply_demographic_distributions_by_place_tallies(tally, dists):
-    oas = tally["OA"].to_list()
+    # Sum of the place counts of each OA weighted by the demographic percentages of
+    # their type, computed over the non zero counts only.
     demo_types = dists.columns.to_list()[1:]
-    OA_demos = pd.DataFrame(columns=(["OA"] + demo_types))
-
-    for oa in oas:
-        oa_place_count = tally.loc[tally["OA"] == oa].values.tolist()[0][1:]
-        demo_type_summed_values = []
-
-        for demo_type in demo_types:
-            demo_place_percs = dists[demo_type].values.tolist()
-            multiplied = [a * b for a, b in zip(oa_place_count, demo_place_percs)]
-            summed = round(sum(multiplied), 3)
-            demo_type_summed_values.append(summed)
-    
-        new_row = [oa] + demo_type_summed_values
-        new_df = pd.DataFrame([new_row], columns=["OA"] + demo_types)
-        OA_demos = pd.concat([OA_demos, new_df])
+    demo_place_percs = dists.set_index("place_type").reindex(tally["types"]).fillna(0)[demo_types].to_numpy(dtype=np.float64)
+    summed = np.round(place_counts.dot(tally, demo_place_percs), 3)
 
-    OA_demos = OA_demos.reset_index(drop=True)
+    OA_demos = pd.DataFrame(summed, columns=demo_types)
+    OA_demos.insert(0, "OA", tally["oas"])
     OA_demos = OA_demos.rename(columns={"worker_perc": "worker_units", "student_perc": "student_units", "tourist_perc": "tourist_units", "shopper_perc": "shopper_units", "leisurer_perc": "leisurer_units", "chorer_perc": "chorer_units"})
     return OA_demos
 
@@ -227,9 +217,12 @@ def normalise_distributions_by_oa_effective_area(demographic_distributions, norm
     normalizers = normalizers[["OA", "OA_area_meters_sqrt", "OA_households", "OA_population"]]
     merged = pd.merge(normalizers, demographic_distributions, on="OA")
 
-    for c in merged.loc[:, merged.columns[4]:merged.columns[9]]:
+    unit_cols = merged.columns[4:10].to_list()
+    for c in unit_cols:
         RELEVANT_COLUMNS.append(f"[per_effective_area_square_meter] - {c}")
-        merged[f"[per_effective_area_square_meter] - {c}"] = round(merged[c] / merged["OA_area_meters_sqrt"], common.DPs)
+    merged = normalization.apply_specs(merged, [
+        {"columns": unit_cols, "prefix": "[per_effective_area_square_meter] - ", "divisor": "OA_area_meters_sqrt", "decimals": common.DPs}
+    ])
 
     merged = merged.drop(columns=["OA_area_meters_sqrt", "OA_households", "OA_population"])
     return merged
@@ -237,11 +230,10 @@ def normalise_distributions_by_oa_effective_area(demographic_distributions, norm
 def calculate_demographic_percentages_out_of_borough_demographic_total(normalized_by_effective_area):
     # Calculate the percentage the units of a type in an OA out of the total units of that type in the borough (all the OAs)
     
-    for focus_col in RELEVANT_COLUMNS:
-        col_sum = normalized_by_effective_area[focus_col].sum(axis = 0)
-        normalized_by_effective_area[f"[%_of_borough_total] - {focus_col}"] = (normalized_by_effective_area[focus_col] / col_sum) * 100
-
-    return normalized_by_effective_area
+    focus_cols = list(dict.fromkeys(RELEVANT_COLUMNS))
+    return normalization.apply_specs(normalized_by_effective_area, [
+        {"columns": focus_cols, "prefix": "[%_of_borough_total] - ", "of_total": True, "scale": 100}
+    ])
 
 def calculate_demographic_percentages_out_of_OA_demographic_total(normalized_by_effective_area):
     # Calculate the percentage the units of a type in an OA out of the total units of any types in that OA.
@@ -256,10 +248,9 @@ def calculate_demographic_percentages_out_of_OA_demographic_total(normalized_by_
 
     normalized_by_effective_area["[per_effective_area_square_meter] - total_units"] = normalized_by_effective_area[cols_to_sum].sum(axis = 1)
 
-    for col in cols_to_sum:
-        normalized_by_effective_area[f"[%_of_OA_total] - {col}"] = (normalized_by_effective_area[col] / normalized_by_effective_area["[per_effective_area_square_meter] - total_units"]) * 100
-
-    return normalized_by_effective_area
+    return normalization.apply_specs(normalized_by_effective_area, [
+        {"columns": cols_to_sum, "prefix": "[%_of_OA_total] - ", "divisor": "[per_effective_area_square_meter] - total_units", "scale": 100}
+    ])
 
 def calculate_demographic_values(in_df):
     type_map = {
@@ -303,11 +294,11 @@ def normalise_demographic_values_by_oa_effective_area(in_df, normalizers):
     normalizers = normalizers[["OA", "OA_area_meters_sqrt", "OA_households", "OA_population"]]
     merged = pd.merge(normalizers, in_df, on="OA")
 
-    cols_to_sum = []
-
-    for k in ["worker", "student", "tourist", "shopper", "leisurer", "chorer"]:
-        cols_to_sum.append(f"[per_effective_area_square_meter] - {k}_value")
-        merged[f"[per_effective_area_square_meter] - {k}_value"] = (merged[f"{k}_value"] / merged["OA_area_meters_sqrt"])
+    value_cols = [f"{k}_value" for k in ["worker", "student", "tourist", "shopper", "leisurer", "chorer"]]
+    cols_to_sum = [f"[per_effective_area_square_meter] - {c}" for c in value_cols]
+    merged = normalization.apply_specs(merged, [
+        {"columns": value_cols, "prefix": "[per_effective_area_square_meter] - ", "divisor": "OA_area_meters_sqrt"}
+    ])
 
     merged["[per_effective_area_square_meter] - total_value"] = merged[cols_to_sum].sum(axis = 1)
 
@@ -351,21 +342,16 @@ def column_cleaning(in_df):
     in_df = in_df.drop(columns=effective_cols_to_remove)
     return in_df
 
-def split_dataset_and_introduce_scale_sharing_and_save(in_df):
+def split_dataset_by_scope(in_df):
     oa_scope = pd.DataFrame()
     borough_scope = pd.DataFrame()
 
     # OA scope dataframe.
-    shared_scale_cols = []
     oa_scope["OA"] = in_df["OA"]
     for dt in DEMO_TYPES:
-        shared_scale_cols.append(f"[%_of_OA_total] - [per_effective_area_square_meter] - {dt}")
         oa_scope[f"[%_of_OA_total] - [per_effective_area_square_meter] - {dt}"] = in_df[f"[%_of_OA_total] - [per_effective_area_square_meter] - {dt}_units"]
-    for col in shared_scale_cols:
-        oa_scope[f"[shared_scale] - {col}"] = oa_scope[col]
 
     # Borough scope dataframe.
-    shared_scale_cols = []
     borough_scope["OA"] = in_df["OA"]
     for dt in DEMO_TYPES:
         borough_scope[f"[total] - {dt}_count"] = in_df[f"{dt}_value"]
@@ -374,9 +360,6 @@ def split_dataset_and_introduce_scale_sharing_and_save(in_df):
         borough_scope[f"[per_effective_area_square_meter] - {dt}_count"] = in_df[f"[per_effective_area_square_meter] - {dt}_value"]
     borough_scope[f"[per_effective_area_square_meter] - total_count"] = in_df[f"[per_effective_area_square_meter] - total_value"]
     for dt in DEMO_TYPES:
-        shared_scale_cols.append(f"[%_of_borough_total] - [per_effective_area_square_meter] - {dt}")
         borough_scope[f"[%_of_borough_total] - [per_effective_area_square_meter] - {dt}"] = in_df[f"[%_of_borough_total] - [per_effective_area_square_meter] - {dt}_units"]
-    for col in shared_scale_cols:
-        borough_scope[f"[shared_scale] - {col}"] = borough_scope[col]
 
     return [oa_scope, borough_scope]
@@ -4,7 +4,7 @@ Calculates supply & demand metrics for bars, cafes and restaurants in regards to
 all 6 demographic types throughout the borough.
 
 Input datasets:
-- [Places]_counts_normalized_by_OA_effective_area.csv
+- [Places]_counts_normalized_by_OA_effective_area.npz
 - [Population]_total_over_24_hour.csv
 
 Output datasets:
@@ -12,6 +12,7 @@ Output datasets:
 """
 
 import src.common as common
+import src.processed_data.place_counts as place_counts
 import pandas as pd
 from pandas.api.types import is_numeric_dtype
 import numpy as np
@@ -39,10 +40,9 @@ def round_numeric_columns(dataset):
 
 # Return a normalized version of the places dataset between 0 and 1.
 def get_places_per_effective_area():
-    df = pd.read_csv(DATA_DIR + "processed_data/places/" + "[Places]_counts_normalized_by_OA_effective_area.csv")
-    df = df.drop(columns=["Unnamed: 0"])
     cols_to_keep = ["OA", "bar", "cafe", "restaurant"]
-    df = df[cols_to_keep]
+    tally = place_counts.load_counts(DATA_DIR + "processed_data/places/", "[Places]_counts_normalized_by_OA_effective_area")
+    df = place_counts.to_dataframe(place_counts.select_types(tally, cols_to_keep[1:]))
 
     # Normalize them all out of 100:
     # for col in cols_to_keep:
@@ -103,9 +103,5 @@ def get_supply_demand_index(places, population):
     for type_col in ["bar", "cafe", "restaurant"]:
         df = df.drop(columns=[f"{type_col}_or_limit"])
 
-    for type_col in ["bar", "cafe", "restaurant"]:
-        for demo_col in DEMO_TYPES:
-            df[f"[shared_scale] - [supply_demand_index] - {type_col}_{demo_col}"] = df[f"[supply_demand_index] - {type_col}_{demo_col}"]
-
     df = df.replace([np.inf, -np.inf], 0)
     return df
@@ -59,7 +59,7 @@ def get_people_per_effective_area():
     # print(df)
     return df
 
-# Put together the necessary population information and create shared scale columns.
+# Put together the necessary population information.
 def compile_population_dataset(normalizers, people):
     df = pd.merge(people, normalizers , on="OA")
 
@@ -69,7 +69,4 @@ def compile_population_dataset(normalizers, people):
     df["[per_effective_area_square_meter] - visitors_total_count"] = df[visitors].sum(axis = 1)
     df["[per_effective_area_square_meter] - total_count"] = df[all].sum(axis = 1)
 
-    for c in all:
-        df[f"[shared_scale] - {c}"] = df[c]
-
     return df
@@ -2,7 +2,7 @@
 
 For each listed dataset, it generates metadata containing information about each
 column, including its name, type, range and range values. The script also assigns
-column colour mappings, ignores columns and implements shared scales.
+column colour mappings, ignores columns and records shared scales.
 
 The generated metadata entries have the following structure:
 "[OA]_Normalizing_properties.csv": {
@@ -16,13 +16,27 @@ The generated metadata entries have the following structure:
             "max": 1855902.5608250087
         },
     ...
+    ],
+    "shared_scale": {
+        "columns": [...],
+        "min": 0.0,
+        "max": 43.0
+    }
 ...
 
+A shared scale is an attribute of a group of columns of a dataset: the UI can render
+any of them on the range of the whole group. It is recorded once per dataset, and
+the columns themselves are only carried once by the datasets. Datasets without a
+shared scale have no "shared_scale" entry.
+
 The metadata file is used by the UI to decide how to interpret data and render DOM 
 elements. The idea is to avoid doing as much data processing as possible in the user
 interface to increase its performance. This work is delegated to the backend and 
 delivered through the "output_data_metadata.json" file.
 
+The places counts datasets are read from their sparse version (see "place_counts.py")
+one column at a time, instead of parsing their mostly-zero CSV files.
+
 Inputs datasets:
 - [OA]_Normalizing_properties.csv": "normalizers/",
 - [OA]_PTAL_directory.csv" : "acorn/",
@@ -59,6 +73,7 @@ Output datasets:
 """
 
 import src.common as common
+import src.processed_data.place_counts as place_counts
 import pandas as pd
 import json
 from pandas.api.types import is_numeric_dtype
@@ -185,21 +200,24 @@ DATASETS_P_TYPE = {
     "remaining.csv" : []
 }
 
-SHARED_SCALE_PAYCKECK_DIRECTORY = ['[shared_scale] - [%_in_OA] - 0-5K', '[shared_scale] - [%_in_OA] - 5-10K', '[shared_scale] - [%_in_OA] - 10-15K', '[shared_scale] - [%_in_OA] - 15-20K', '[shared_scale] - [%_in_OA] - 20-25K', '[shared_scale] - [%_in_OA] - 25-30K', '[shared_scale] - [%_in_OA] - 30-35K', '[shared_scale] - [%_in_OA] - 35-40K', '[shared_scale] - [%_in_OA] - 40-45K', '[shared_scale] - [%_in_OA] - 45-50K', '[shared_scale] - [%_in_OA] - 50-55K', '[shared_scale] - [%_in_OA] - 55-60K', '[shared_scale] - [%_in_OA] - 60-65K', '[shared_scale] - [%_in_OA] - 65-70K', '[shared_scale] - [%_in_OA] - 70-75K', '[shared_scale] - [%_in_OA] - 75-80K', '[shared_scale] - [%_in_OA] - 80-85K', '[shared_scale] - [%_in_OA] - 85-90K', '[shared_scale] - [%_in_OA] - 90-95K', '[shared_scale] - [%_in_OA] - 95-100K', '[shared_scale] - [%_in_OA] - 100-120K', '[shared_scale] - [%_in_OA] - 120-140K', '[shared_scale] - [%_in_OA] - 140-160K', '[shared_scale] - [%_in_OA] - 160-180K', '[shared_scale] - [%_in_OA] - 180-200K', '[shared_scale] - [%_in_OA] - 200K+']
+SHARED_SCALE_PAYCKECK_DIRECTORY = ['[%_in_OA] - 0-5K', '[%_in_OA] - 5-10K', '[%_in_OA] - 10-15K', '[%_in_OA] - 15-20K', '[%_in_OA] - 20-25K', '[%_in_OA] - 25-30K', '[%_in_OA] - 30-35K', '[%_in_OA] - 35-40K', '[%_in_OA] - 40-45K', '[%_in_OA] - 45-50K', '[%_in_OA] - 50-55K', '[%_in_OA] - 55-60K', '[%_in_OA] - 60-65K', '[%_in_OA] - 65-70K', '[%_in_OA] - 70-75K', '[%_in_OA] - 75-80K', '[%_in_OA] - 80-85K', '[%_in_OA] - 85-90K', '[%_in_OA] - 90-95K', '[%_in_OA] - 95-100K', '[%_in_OA] - 100-120K', '[%_in_OA] - 120-140K', '[%_in_OA] - 140-160K', '[%_in_OA] - 160-180K', '[%_in_OA] - 180-200K', '[%_in_OA] - 200K+']
 
-SHARED_SCALE_AGE_DISTRIBUTION_COLUMNS = ['[shared_scale] - [%_in_OA] - Total - Infant [0-4]', '[shared_scale] - [%_in_OA] - Total - Primary student [5-9]', '[shared_scale] - [%_in_OA] - Total - Secondary student [10-15]', '[shared_scale] - [%_in_OA] - Total - College student [16-17]', '[shared_scale] - [%_in_OA] - Total - Universitarian / apprentice [18-24]', '[shared_scale] - [%_in_OA] - Total - Young adult [25-39]', '[shared_scale] - [%_in_OA] - Total - Middle-aged adult [40-49]', '[shared_scale] - [%_in_OA] - Total - Senior adult [50-64]', '[shared_scale] - [%_in_OA] - Total - Senior [65+]']
+SHARED_SCALE_AGE_DISTRIBUTION_COLUMNS = ['[%_in_OA] - Total - Infant [0-4]', '[%_in_OA] - Total - Primary student [5-9]', '[%_in_OA] - Total - Secondary student [10-15]', '[%_in_OA] - Total - College student [16-17]', '[%_in_OA] - Total - Universitarian / apprentice [18-24]', '[%_in_OA] - Total - Young adult [25-39]', '[%_in_OA] - Total - Middle-aged adult [40-49]', '[%_in_OA] - Total - Senior adult [50-64]', '[%_in_OA] - Total - Senior [65+]']
 
-SHARED_SCALE_COICOP_COLUMNS = ['[shared_scale] - [average_per_person_in_OA] - Food', '[shared_scale] - [average_per_person_in_OA] - Non-alcoholic Drink', '[shared_scale] - [average_per_person_in_OA] - Alcoholic drink (off sales)', '[shared_scale] - [average_per_person_in_OA] - Tobacco', '[shared_scale] - [average_per_person_in_OA] - Clothing', '[shared_scale] - [average_per_person_in_OA] - Footwear', '[shared_scale] - [average_per_person_in_OA] - Actual rentals for housing', '[shared_scale] - [average_per_person_in_OA] - House Repair, Maintenance & Decoration', '[shared_scale] - [average_per_person_in_OA] - Water and miscellaneous services', '[shared_scale] - [average_per_person_in_OA] - Gas, Electricity & Other Fuel', '[shared_scale] - [average_per_person_in_OA] - Furniture, Furnishings & Floorcoverings', '[shared_scale] - [average_per_person_in_OA] - Household Textiles', '[shared_scale] - [average_per_person_in_OA] - Household Hardware', '[shared_scale] - [average_per_person_in_OA] - Glassware, Tableware and Household Utensils', '[shared_scale] - [average_per_person_in_OA] - Tools & Equipment for House & Garden', '[shared_scale] - [average_per_person_in_OA] - Goods & Services for Household Maintenance', '[shared_scale] - [average_per_person_in_OA] - Medical Products, Appliances & Equipment', '[shared_scale] - [average_per_person_in_OA] - Medical, Dental, Optical & Nursing Fees', '[shared_scale] - [average_per_person_in_OA] - Hospital services', '[shared_scale] - [average_per_person_in_OA] - Purchase of vehicles', '[shared_scale] - [average_per_person_in_OA] - Operation of Cars, Vans & Motorcycles', '[shared_scale] - [average_per_person_in_OA] - Transport Services', '[shared_scale] - [average_per_person_in_OA] - Postal Services', '[shared_scale] - [average_per_person_in_OA] - Telephone and Fax Equipment', '[shared_scale] - [average_per_person_in_OA] - Telephone and Fax Services', '[shared_scale] - [average_per_person_in_OA] - A/V, Photographic, Computing Equipment', '[shared_scale] - [average_per_person_in_OA] - Recreational Durables', '[shared_scale] - [average_per_person_in_OA] - Recreational Items', '[shared_scale] - [average_per_person_in_OA] - Recreational Services', '[shared_scale] - [average_per_person_in_OA] - Newspapers, Books and Stationery', '[shared_scale] - [average_per_person_in_OA] - Educational Services', '[shared_scale] - [average_per_person_in_OA] - Catering Services', '[shared_scale] - [average_per_person_in_OA] - Accommodation Services', '[shared_scale] - [average_per_person_in_OA] - Personal Care', '[shared_scale] - [average_per_person_in_OA] - Personal Goods', '[shared_scale] - [average_per_person_in_OA] - Social Protection', '[shared_scale] - [average_per_person_in_OA] - Insurance', '[shared_scale] - [average_per_person_in_OA] - Financial services not elsewhere classified', '[shared_scale] - [average_per_person_in_OA] - Other services not elsewhere classified']
+SHARED_SCALE_COICOP_COLUMNS = ['[average_per_person_in_OA] - Food', '[average_per_person_in_OA] - Non-alcoholic Drink', '[average_per_person_in_OA] - Alcoholic drink (off sales)', '[average_per_person_in_OA] - Tobacco', '[average_per_person_in_OA] - Clothing', '[average_per_person_in_OA] - Footwear', '[average_per_person_in_OA] - Actual rentals for housing', '[average_per_person_in_OA] - House Repair, Maintenance & Decoration', '[average_per_person_in_OA] - Water and miscellaneous services', '[average_per_person_in_OA] - Gas, Electricity & Other Fuel', '[average_per_person_in_OA] - Furniture, Furnishings & Floorcoverings', '[average_per_person_in_OA] - Household Textiles', '[average_per_person_in_OA] - Household Hardware', '[average_per_person_in_OA] - Glassware, Tableware and Household Utensils', '[average_per_person_in_OA] - Tools & Equipment for House & Garden', '[average_per_person_in_OA] - Goods & Services for Household Maintenance', '[average_per_person_in_OA] - Medical Products, Appliances & Equipment', '[average_per_person_in_OA] - Medical, Dental, Optical & Nursing Fees', '[average_per_person_in_OA] - Hospital services', '[average_per_person_in_OA] - Purchase of vehicles', '[average_per_person_in_OA] - Operation of Cars, Vans & Motorcycles', '[average_per_person_in_OA] - Transport Services', '[average_per_person_in_OA] - Postal Services', '[average_per_person_in_OA] - Telephone and Fax Equipment', '[average_per_person_in_OA] - Telephone and Fax Services', '[average_per_person_in_OA] - A/V, Photographic, Computing Equipment', '[average_per_person_in_OA] - Recreational Durables', '[average_per_person_in_OA] - Recreational Items', '[average_per_person_in_OA] - Recreational Services', '[average_per_person_in_OA] - Newspapers, Books and Stationery', '[average_per_person_in_OA] - Educational Services', '[average_per_person_in_OA] - Catering Services', '[average_per_person_in_OA] - Accommodation Services', '[average_per_person_in_OA] - Personal Care', '[average_per_person_in_OA] - Personal Goods', '[average_per_person_in_OA] - Social Protection', '[average_per_person_in_OA] - Insurance', '[average_per_person_in_OA] - Financial services not elsewhere classified', '[average_per_person_in_OA] - Other services not elsewhere classified']
 
-SHARED_SCALE_COLS_OA_SCOPE = ['[shared_scale] - [%_of_OA_total] - [per_effective_area_square_meter] - worker', '[shared_scale] - [%_of_OA_total] - [per_effective_area_square_meter] - student', '[shared_scale] - [%_of_OA_total] - [per_effective_area_square_meter] - tourist', '[shared_scale] - [%_of_OA_total] - [per_effective_area_square_meter] - shopper', '[shared_scale] - [%_of_OA_total] - [per_effective_area_square_meter] - leisurer', '[shared_scale] - [%_of_OA_total] - [per_effective_area_square_meter] - chorer']
+SHARED_SCALE_COLS_OA_SCOPE = ['[%_of_OA_total] - [per_effective_area_square_meter] - worker', '[%_of_OA_total] - [per_effective_area_square_meter] - student', '[%_of_OA_total] - [per_effective_area_square_meter] - tourist', '[%_of_OA_total] - [per_effective_area_square_meter] - shopper', '[%_of_OA_total] - [per_effective_area_square_meter] - leisurer', '[%_of_OA_total] - [per_effective_area_square_meter] - chorer']
 
-SHARED_SCALE_COLS_BOROUGH_SCOPE = ['[shared_scale] - [%_of_borough_total] - [per_effective_area_square_meter] - worker', '[shared_scale] - [%_of_borough_total] - [per_effective_area_square_meter] - student', '[shared_scale] - [%_of_borough_total] - [per_effective_area_square_meter] - tourist', '[shared_scale] - [%_of_borough_total] - [per_effective_area_square_meter] - shopper', '[shared_scale] - [%_of_borough_total] - [per_effective_area_square_meter] - leisurer', '[shared_scale] - [%_of_borough_total] - [per_effective_area_square_meter] - chorer']
+SHARED_SCALE_COLS_BOROUGH_SCOPE = ['[%_of_borough_total] - [per_effective_area_square_meter] - worker', '[%_of_borough_total] - [per_effective_area_square_meter] - student', '[%_of_borough_total] - [per_effective_area_square_meter] - tourist', '[%_of_borough_total] - [per_effective_area_square_meter] - shopper', '[%_of_borough_total] - [per_effective_area_square_meter] - leisurer', '[%_of_borough_total] - [per_effective_area_square_meter] - chorer']
 
-SHARED_SCALE_COLS_PLACES = ['[shared_scale] - accounting', '[shared_scale] - airport', '[shared_scale] - amusement_park', '[shared_scale] - aquarium', '[shared_scale] - art_gallery', '[shared_scale] - atm', '[shared_scale] - bakery', '[shared_scale] - bank', '[shared_scale] - bar', '[shared_scale] - beauty_salon', '[shared_scale] - bicycle_store', '[shared_scale] - book_store', '[shared_scale] - bowling_alley', '[shared_scale] - bus_station', '[shared_scale] - cafe', '[shared_scale] - campground', '[shared_scale] - car_dealer', '[shared_scale] - car_rental', '[shared_scale] - car_repair', '[shared_scale] - car_wash', '[shared_scale] - casino', '[shared_scale] - cemetery', '[shared_scale] - church', '[shared_scale] - city_hall', '[shared_scale] - clothing_store', '[shared_scale] - convenience_store', '[shared_scale] - courthouse', '[shared_scale] - dentist', '[shared_scale] - department_store', '[shared_scale] - doctor', '[shared_scale] - drugstore', '[shared_scale] - electrician', '[shared_scale] - electronics_store', '[shared_scale] - embassy', '[shared_scale] - establishment', '[shared_scale] - finance', '[shared_scale] - fire_station', '[shared_scale] - florist', '[shared_scale] - food', '[shared_scale] - funeral_home', '[shared_scale] - furniture_store', '[shared_scale] - gas_station', '[shared_scale] - general_contractor', '[shared_scale] - grocery_or_supermarket', '[shared_scale] - gym', '[shared_scale] - hair_care', '[shared_scale] - hardware_store', '[shared_scale] - health', '[shared_scale] - hindu_temple', '[shared_scale] - home_goods_store', '[shared_scale] - hospital', '[shared_scale] - insurance_agency', '[shared_scale] - jewelry_store', '[shared_scale] - laundry', '[shared_scale] - lawyer', '[shared_scale] - library', '[shared_scale] - liquor_store', '[shared_scale] - local_government_office', '[shared_scale] - locksmith', '[shared_scale] - lodging', '[shared_scale] - meal_delivery', '[shared_scale] - meal_takeaway', '[shared_scale] - mosque', '[shared_scale] - movie_rental', '[shared_scale] - movie_theater', '[shared_scale] - moving_company', '[shared_scale] - museum', '[shared_scale] - night_club', '[shared_scale] - painter', '[shared_scale] - park', '[shared_scale] - parking', '[shared_scale] - pet_store', '[shared_scale] - pharmacy', '[shared_scale] - physiotherapist', '[shared_scale] - place_of_worship', '[shared_scale] - plumber', '[shared_scale] - point_of_interest', '[shared_scale] - police', '[shared_scale] - post_office', '[shared_scale] - premise', '[shared_scale] - primary_school', '[shared_scale] - real_estate_agency', '[shared_scale] - restaurant', '[shared_scale] - roofing_contractor', '[shared_scale] - school', '[shared_scale] - secondary_school', '[shared_scale] - shoe_store', '[shared_scale] - shopping_mall', '[shared_scale] - spa', '[shared_scale] - stadium', '[shared_scale] - storage', '[shared_scale] - store', '[shared_scale] - subway_station', '[shared_scale] - supermarket', '[shared_scale] - synagogue', '[shared_scale] - taxi_stand', '[shared_scale] - tourist_attraction', '[shared_scale] - train_station', '[shared_scale] - transit_station', '[shared_scale] - travel_agency', '[shared_scale] - university', '[shared_scale] - veterinary_care', '[shared_scale] - zoo']
+# The umbrella place types (establishment, point_of_interest, health, doctor, food and
+# store) are left out, as their counts would flatten the scale of every other type.
+SHARED_SCALE_COLS_PLACES = ['accounting', 'airport', 'amusement_park', 'aquarium', 'art_gallery', 'atm', 'bakery', 'bank', 'bar', 'beauty_salon', 'bicycle_store', 'book_store', 'bowling_alley', 'bus_station', 'cafe', 'campground', 'car_dealer', 'car_rental', 'car_repair', 'car_wash', 'casino', 'cemetery', 'church', 'city_hall', 'clothing_store', 'convenience_store', 'courthouse', 'dentist', 'department_store', 'drugstore', 'electrician', 'electronics_store', 'embassy', 'finance', 'fire_station', 'florist', 'funeral_home', 'furniture_store', 'gas_station', 'general_contractor', 'grocery_or_supermarket', 'gym', 'hair_care', 'hardware_store', 'hindu_temple', 'home_goods_store', 'hospital', 'insurance_agency', 'jewelry_store', 'laundry', 'lawyer', 'library', 'liquor_store', 'local_government_office', 'locksmith', 'lodging', 'meal_delivery', 'meal_takeaway', 'mosque', 'movie_rental', 'movie_theater', 'moving_company', 'museum', 'night_club', 'painter', 'park', 'parking', 'pet_store', 'pharmacy', 'physiotherapist', 'place_of_worship', 'plumber', 'police', 'post_office', 'premise', 'primary_school', 'real_estate_agency', 'restaurant', 'roofing_contractor', 'school', 'secondary_school', 'shoe_store', 'shopping_mall', 'spa', 'stadium', 'storage', 'subway_station', 'supermarket', 'synagogue', 'taxi_stand', 'tourist_attraction', 'train_station', 'transit_station', 'travel_agency', 'university', 'veterinary_care', 'zoo']
 
-SHARED_SCALE_COLS_POPULATION = ['[shared_scale] - [per_effective_area_square_meter] - worker_count', '[shared_scale] - [per_effective_area_square_meter] - student_count', '[shared_scale] - [per_effective_area_square_meter] - tourist_count', '[shared_scale] - [per_effective_area_square_meter] - shopper_count', '[shared_scale] - [per_effective_area_square_meter] - leisurer_count', '[shared_scale] - [per_effective_area_square_meter] - chorer_count', '[shared_scale] - [per_effective_area_square_meter] - resident_count']
+SHARED_SCALE_COLS_POPULATION = ['[per_effective_area_square_meter] - worker_count', '[per_effective_area_square_meter] - student_count', '[per_effective_area_square_meter] - tourist_count', '[per_effective_area_square_meter] - shopper_count', '[per_effective_area_square_meter] - leisurer_count', '[per_effective_area_square_meter] - chorer_count', '[per_effective_area_square_meter] - resident_count']
 
-SHARED_SCALE_COLS_SUPPLY_DEMAND = ['[shared_scale] - [supply_demand_index] - bar_worker', '[shared_scale] - [supply_demand_index] - bar_student', '[shared_scale] - [supply_demand_index] - bar_tourist', '[shared_scale] - [supply_demand_index] - bar_shopper', '[shared_scale] - [supply_demand_index] - bar_leisurer', '[shared_scale] - [supply_demand_index] - bar_chorer', '[shared_scale] - [supply_demand_index] - bar_resident', '[shared_scale] - [supply_demand_index] - bar_visitors_total', '[shared_scale] - [supply_demand_index] - bar_total', '[shared_scale] - [supply_demand_index] - cafe_worker', '[shared_scale] - [supply_demand_index] - cafe_student', '[shared_scale] - [supply_demand_index] - cafe_tourist', '[shared_scale] - [supply_demand_index] - cafe_shopper', '[shared_scale] - [supply_demand_index] - cafe_leisurer', '[shared_scale] - [supply_demand_index] - cafe_chorer', '[shared_scale] - [supply_demand_index] - cafe_resident', '[shared_scale] - [supply_demand_index] - cafe_visitors_total', '[shared_scale] - [supply_demand_index] - cafe_total', '[shared_scale] - [supply_demand_index] - restaurant_worker', '[shared_scale] - [supply_demand_index] - restaurant_student', '[shared_scale] - [supply_demand_index] - restaurant_tourist', '[shared_scale] - [supply_demand_index] - restaurant_shopper', '[shared_scale] - [supply_demand_index] - restaurant_leisurer', '[shared_scale] - [supply_demand_index] - restaurant_chorer', '[shared_scale] - [supply_demand_index] - restaurant_resident', '[shared_scale] - [supply_demand_index] - restaurant_visitors_total', '[shared_scale] - [supply_demand_index] - restaurant_total']
+# Only the indexes of the single demographic types, not of the visitors and totals.
+SHARED_SCALE_COLS_SUPPLY_DEMAND = ['[supply_demand_index] - bar_worker', '[supply_demand_index] - bar_student', '[supply_demand_index] - bar_tourist', '[supply_demand_index] - bar_shopper', '[supply_demand_index] - bar_leisurer', '[supply_demand_index] - bar_chorer', '[supply_demand_index] - bar_resident', '[supply_demand_index] - cafe_worker', '[supply_demand_index] - cafe_student', '[supply_demand_index] - cafe_tourist', '[supply_demand_index] - cafe_shopper', '[supply_demand_index] - cafe_leisurer', '[supply_demand_index] - cafe_chorer', '[supply_demand_index] - cafe_resident', '[supply_demand_index] - restaurant_worker', '[supply_demand_index] - restaurant_student', '[supply_demand_index] - restaurant_tourist', '[supply_demand_index] - restaurant_shopper', '[supply_demand_index] - restaurant_leisurer', '[supply_demand_index] - restaurant_chorer', '[supply_demand_index] - restaurant_resident']
 
 DATASET_SHARE_RANGE = {
     "[OA]_Normalizing_properties.csv": [],
@@ -241,13 +259,48 @@ DATASET_SHARE_RANGE = {
 
 SKIP_COLUMNS = ["Unnamed: 0", "OA", "Unnamed: 0.1"]
 
+# Datasets read from their sparse version.
+SPARSE_DATASETS = [
+    "[Places]_counts.csv",
+    "[Places]_counts_normalized_by_OA_effective_area.csv",
+    "[Places]_counts_normalized_by_household_per_meter.csv",
+    "[Places]_counts_normalized_by_household_per_meter_bound.csv"
+]
+
+# Yield the name and values of each column of a dataset, except the skipped ones. The
+# columns of a sparse dataset are only made dense one at a time.
+def iter_dataset_columns(dataset_folder, dataset_name, skipable_columns):
+    if dataset_name in SPARSE_DATASETS:
+        matrix = place_counts.load_counts(DATA_DIR + "processed_data/" + dataset_folder, dataset_name[:-len(".csv")])
+        for i in matrix["types"]:
+            if str(i) not in skipable_columns:
+                yield (i, pd.Series(place_counts.get_column(matrix, i)))
+        return
+
+    dataset = pd.read_csv(DATA_DIR + "processed_data/" + dataset_folder + dataset_name)
+    for i in dataset.dtypes.index:
+        if str(i) not in skipable_columns:
+            yield (i, dataset[i])
+
+# Return the shared scale of the columns of a dataset in a group, or None if none of
+# them is numeric. Each column keeps its own range in its column data.
+def get_shared_scale(column_data, group):
+    columns = [c for c in column_data if c["name"] in group and c["min"] is not None]
+    if len(columns) == 0:
+        return None
+
+    return {
+        "columns": [c["name"] for c in columns],
+        "min": min(c["min"] for c in columns),
+        "max": max(c["max"] for c in columns)
+    }
+
 # Metadata file generation method.
 def generate_metadata(datasets, dataset_skip_columns, dataset_p_type, skip_columns):
     dict = {}
 
     for dataset_name in datasets.keys():
         dataset_folder = datasets[dataset_name]
-        dataset = pd.read_csv(DATA_DIR + "processed_data/" + dataset_folder + dataset_name)
         
         dict[dataset_name] = {}
         
@@ -256,83 +309,69 @@ def generate_metadata(datasets, dataset_skip_columns, dataset_p_type, skip_colum
 
         # for each column
         column_data = []
-        for i in dataset.dtypes.index:
-            if str(i) not in skipableColumns:
-                col_name = i
-                col_type = dataset.dtypes[i]
-                col_type_simplified = None
-                range = sorted(dataset[i].dropna().unique().tolist())
-                min_val = None
-                max_val = None
-
-                if "acorn" in col_name.lower():
-                    granularity = "category"
-                    if "group" in col_name.lower():
-                        granularity = "group"
-                    if "type" in col_name.lower():
-                        granularity = "type"
-                    if "wellbeing" in col_name.lower():
-                        col_type_simplified = ["wellbeing", granularity]
-                    else:
-                        col_type_simplified = ["household", granularity]
-                    range = [str(x) for x in range]
-                elif is_numeric_dtype(dataset[i]):
-                    if str(col_type) == "float64":
-                        is_float_column_integer = dataset[i].dropna().apply(float.is_integer).all()
-
-                        if is_float_column_integer: # float casted as int
-                            col_type_simplified = "number_int"
-                            min_val = min(range)
-                            max_val = max(range)
-                        else:   # actual float
-                            col_type_simplified = "number_float"
-                            min_val = min(range)
-                            max_val = max(range)
-                            range = None
-                    else:
+        for i, column in iter_dataset_columns(dataset_folder, dataset_name, skipableColumns):
+            col_name = i
+            col_type = column.dtype
+            col_type_simplified = None
+            range = sorted(column.dropna().unique().tolist())
+            min_val = None
+            max_val = None
+
+            if "acorn" in col_name.lower():
+                granularity = "category"
+                if "group" in col_name.lower():
+                    granularity = "group"
+                if "type" in col_name.lower():
+                    granularity = "type"
+                if "wellbeing" in col_name.lower():
+                    col_type_simplified = ["wellbeing", granularity]
+                else:
+                    col_type_simplified = ["household", granularity]
+                range = [str(x) for x in range]
+            elif is_numeric_dtype(column):
+                if str(col_type) == "float64":
+                    is_float_column_integer = column.dropna().apply(float.is_integer).all()
+
+                    if is_float_column_integer: # float casted as int
                         col_type_simplified = "number_int"
                         min_val = min(range)
                         max_val = max(range)
+                    else:   # actual float
+                        col_type_simplified = "number_float"
+                        min_val = min(range)
+                        max_val = max(range)
+                        range = None
                 else:
-                    col_type_simplified = "string"
-                    range = [str(x) for x in range]
-
-                    if len(dataset_p_type[dataset_name]) > 0:
-                        col_type_simplified = dataset_p_type[dataset_name]
-
-                if range is not None and len(range) > 70:
-                    range = None
-
-                column_data_summary = {
-                    "name": col_name,
-                    "type_registered": str(col_type),
-                    "type_practical": col_type_simplified,
-                    "range": range,
-                    "min": min_val,
-                    "max": max_val
-                }
-
-                column_data.append(column_data_summary)
+                    col_type_simplified = "number_int"
+                    min_val = min(range)
+                    max_val = max(range)
+            else:
+                col_type_simplified = "string"
+                range = [str(x) for x in range]
+
+                if len(dataset_p_type[dataset_name]) > 0:
+                    col_type_simplified = dataset_p_type[dataset_name]
+
+            if range is not None and len(range) > 70:
+                range = None
+
+            column_data_summary = {
+                "name": col_name,
+                "type_registered": str(col_type),
+                "type_practical": col_type_simplified,
+                "range": range,
+                "min": min_val,
+                "max": max_val
+            }
+
+            column_data.append(column_data_summary)
 
         dict[dataset_name]["column_data"] = column_data
 
         # Sharing ranges amongst columns.
-        if dataset_name in DATASET_SHARE_RANGE.keys() and len(DATASET_SHARE_RANGE[dataset_name]) > 0:
-            shared_min = 1111111111
-            shared_max = -1111111111
-
-            for c in dict[dataset_name]["column_data"]:
-                if c["name"] in DATASET_SHARE_RANGE[dataset_name]:
-                    if c["min"] < shared_min:
-                        shared_min = c["min"]
-
-                    if c["max"] > shared_max:
-                        shared_max = c["max"]
-
-            for c in dict[dataset_name]["column_data"]:
-                if c["name"] in DATASET_SHARE_RANGE[dataset_name]:
-                    c["min"] = shared_min
-                    c["max"] = shared_max
+        shared_scale = get_shared_scale(column_data, DATASET_SHARE_RANGE.get(dataset_name, []))
+        if shared_scale is not None:
+            dict[dataset_name]["shared_scale"] = shared_scale
 
     json_dict = json.dumps(dict)
     common.save_json_to_file(DATA_DIR + "processed_data/tabular_metadata/" ,json_dict, "output_data_metadata.json")
@@ -145,7 +145,7 @@ function applyToVisualizationMap(key) {
             populationDemographicTypeSelectedOAPieChart("[per_effective_area_square_meter] - ", "_count")
             break;
         case (key.match(/\[Population]_total_over_24_hour.csv#\[shared_scale].*#yes_oa/) || {}).input:
-            populationDemographicTypeSelectedOAColumnChart("[shared_scale] - [per_effective_area_square_meter] - ", "_count")
+            populationDemographicTypeSelectedOAColumnChart("[per_effective_area_square_meter] - ", "_count")
             break;
         // Supply/demand example.
         case (key.match(/\[Supply_demand]_example.csv#\[supply - demand].*#yes_oa/) || {}).input:
@@ -25,7 +25,6 @@ function dataTableSelectedOA() {
     let subtractive_columns = ["", "Unnamed: 0"]
     let selected_oa_dataset = SELECTED_OA.getProperty(SELECTED_DATASET)
     selected_oa_dataset = Object.fromEntries(Object.entries(selected_oa_dataset).filter(([key]) => !subtractive_columns.includes(key)))
-    selected_oa_dataset = Object.fromEntries(Object.entries(selected_oa_dataset).filter(([key]) => !key.includes(["shared_scale"])))
 
     var data = new google.visualization.DataTable();
 
@@ -66,7 +65,6 @@ function barChartPlacesSelectedOA() {
     let selected_oa_dataset = SELECTED_OA.getProperty(SELECTED_DATASET)
     let columns = Object.keys(selected_oa_dataset)
     let filtered_columns = columns.filter(x => !subtractive_columns.includes(x))
-    filtered_columns = filtered_columns.filter(x => !x.includes(["shared_scale"]))
     let sorted_columns = filtered_columns.sort()
 
     let rows = [["Place type", "Number of places in OA"]]
@@ -691,7 +689,7 @@ function numericColumnHistogram(columnName) {
     let rows = []
     for (const oa of DATA) {
         let properties = oa["properties"][SELECTED_DATASET]
-        let floatValue = parseFloat(properties[columnName])
+        let floatValue = parseFloat(properties[dataColumn(columnName)])
         rows.push([properties["OA"], floatValue])
         total = total + floatValue
     }
@@ -722,7 +720,7 @@ function numericColumnHistogram(columnName) {
     };
 
     // Set the length of the horizontal axis if the column has a shared scale.
-    if (columnName.includes("[shared_scale]")) {
+    if (columnName.startsWith(SHARED_SCALE_PREFIX)) {
         let dom = SCALES_MAP.get(SELECTED_DATASET).get(columnName)
         let max_value = dom.domain()[dom.domain().length - 1]
         options.histogram = {
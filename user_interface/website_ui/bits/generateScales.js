@@ -1,6 +1,7 @@
 /*
 This file reads the "output_data_metadata" file and: populates the datasets list, generates the scales map, and the scales
-labels map.
+labels map. The columns of a dataset's shared scale group are also listed a second time, under the shared scale prefix,
+with a scale spanning the range of the whole group. The datasets carry these columns only once.
  */
 
 const metadataPath = "data/output_data_metadata.json"
@@ -69,6 +70,19 @@ d3.json(metadataPath).then(data => {
             columnMap.set(c["name"], scale)
         })
 
+        // Shared scale columns.
+        let sharedScale = data[k]["shared_scale"]
+        if (sharedScale !== undefined) {
+            sharedScale["columns"].forEach(c => {
+                let scale = d3.scaleLinear()
+                    .domain([sharedScale["min"], sharedScale["max"]])
+                    .range([continuousLinearLow, continuousLinearHigh])
+                    .unknown(blankPathFill);
+                continuousColumns.push(SHARED_SCALE_PREFIX + c)
+                columnMap.set(SHARED_SCALE_PREFIX + c, scale)
+            })
+        }
+
         columnMap.set("blank", blankColorScale)
         SCALES_MAP.set(k, columnMap)
     })
@@ -81,4 +95,12 @@ d3.json(metadataPath).then(data => {
     console.log(SCALES_MAP)
     console.log("Labels map:")
     console.log(SCALES_LABEL_MAP)
-})
\ No newline at end of file
+})
+
+/*
+Returns the dataset column holding the values of a selected column. Shared scale columns read the values of the column
+they share the scale of.
+ */
+function dataColumn(column) {
+    return column.startsWith(SHARED_SCALE_PREFIX) ? column.slice(SHARED_SCALE_PREFIX.length) : column
+}
@@ -70,7 +70,7 @@ function styleContinuous(feature) {
     let low = continuousLinearLow;  // color of smallest datum
     let high = continuousLinearHigh;   // color of largest datum
 
-    let dataValue = feature.getProperty(SELECTED_DATASET)[SELECTED_COLUMN]
+    let dataValue = feature.getProperty(SELECTED_DATASET)[dataColumn(SELECTED_COLUMN)]
 
     // delta represents where the value sits between the min and max
     let delta = (dataValue - min_value) / (max_value - min_value);
@@ -113,7 +113,7 @@ color mappings.
  */
 function styleCategorical(feature) {
     let cat_col_scale = SCALES_MAP.get(SELECTED_DATASET).get(SELECTED_COLUMN)
-    let dataValue = feature.getProperty(SELECTED_DATASET)[SELECTED_COLUMN]
+    let dataValue = feature.getProperty(SELECTED_DATASET)[dataColumn(SELECTED_COLUMN)]
 
     let fill_col = cat_col_scale(dataValue)
 
@@ -224,7 +224,7 @@ function addMouseoverOaEvent(map) {
         if (SELECTED_DATASET !== "none" && SELECTED_COLUMN !== "blank") {
             let feat_dataset = feat.getProperty(SELECTED_DATASET)
             key = feat_dataset['OA'];
-            value = feat_dataset[SELECTED_COLUMN].toLocaleString();
+            value = feat_dataset[dataColumn(SELECTED_COLUMN)].toLocaleString();
 
             let dom = SCALES_MAP.get(SELECTED_DATASET).get(SELECTED_COLUMN).domain()
 
@@ -261,7 +261,7 @@ function addMouseoverOaEvent(map) {
 
                 document.getElementById('census-min').textContent = min_value;
                 document.getElementById('census-max').textContent = max_value;
-                let percent = (feat_dataset[SELECTED_COLUMN] - min_value) / (max_value - min_value) * 100;
+                let percent = (feat_dataset[dataColumn(SELECTED_COLUMN)] - min_value) / (max_value - min_value) * 100;
                 document.getElementById('data-caret').style.paddingLeft = percent + '%';
             }
         }
@@ -320,7 +320,7 @@ function addMouseclickOaEvent(map) {
             if (SELECTED_DATASET !== "none" && SELECTED_COLUMN !== "blank") {
                 let feat_dataset = newly_selected_oa.getProperty(SELECTED_DATASET)
                 key = feat_dataset['OA'];
-                value = feat_dataset[SELECTED_COLUMN].toLocaleString();
+                value = feat_dataset[dataColumn(SELECTED_COLUMN)].toLocaleString();
             }
         }
 
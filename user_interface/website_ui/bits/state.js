@@ -21,6 +21,9 @@ let SELECTED_OA = null
 let SCALES_MAP  = new Map()
 let SCALES_LABEL_MAP = new Map()
 
+// Prefix of the columns rendered on the shared scale of their group.
+const SHARED_SCALE_PREFIX = "[shared_scale] - "
+
 // Map
 let MAP_LABELS_ON = false
 let HIGH_OPACITY = 0.80